@@ -0,0 +1,64 @@
+import os
+
+import pytest
+
+from modules.utils import (
+    KDF_TARGET_TIME,
+    MIN_KDF_PARAMS,
+    SALT_SIZE,
+    calibrate_kdf,
+    decrypt_password,
+    derive_key,
+    encrypt_password,
+)
+
+
+def test_derive_key(benchmark, check_baseline):
+    salt = os.urandom(SALT_SIZE)
+
+    benchmark(derive_key, "correct horse battery staple", salt)
+    check_baseline()
+
+
+@pytest.mark.parametrize("algorithm", sorted(MIN_KDF_PARAMS))
+def test_derive_key_minimum_cost(benchmark, check_baseline, algorithm):
+    salt = os.urandom(SALT_SIZE)
+    params = MIN_KDF_PARAMS[algorithm]
+
+    benchmark.pedantic(
+        derive_key, ("correct horse battery staple", salt, params), rounds=5
+    )
+    check_baseline()
+
+
+@pytest.mark.parametrize("algorithm", sorted(MIN_KDF_PARAMS))
+def test_calibrated_unlock_time(benchmark, algorithm):
+    params = calibrate_kdf(algorithm)
+    salt = os.urandom(SALT_SIZE)
+
+    benchmark.extra_info["params"] = params
+    benchmark.pedantic(
+        derive_key, ("correct horse battery staple", salt, params), rounds=3
+    )
+
+    # Scaling from one timed run lands within about a factor of two of the
+    # target, unless even the minimum cost is slower than that
+    if params != MIN_KDF_PARAMS[algorithm]:
+        seconds = benchmark.stats.stats.min
+        assert KDF_TARGET_TIME / 2.5 <= seconds <= KDF_TARGET_TIME * 2.5
+
+
+def test_encrypt_password(benchmark, check_baseline, user):
+    _, user_key = user
+
+    benchmark(encrypt_password, "correct horse battery staple", user_key)
+    check_baseline()
+
+
+def test_decrypt_password(benchmark, check_baseline, user):
+    _, user_key = user
+    encrypted_password = encrypt_password("correct horse battery staple", user_key)
+
+    result = benchmark(decrypt_password, encrypted_password, user_key)
+    assert result == "correct horse battery staple"
+    check_baseline()
@@ -0,0 +1,81 @@
+import os
+import time
+
+import pytest
+
+from benchmarks.conftest import peak_memory
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+# Slowest a keystroke in the search box may take to filter the table
+KEYSTROKE_BUDGET = 0.005  # seconds
+
+# Typed one character at a time, clearing the box after each: exact matches,
+# queries most of the vault matches, and typos falling back to fuzzy matching
+QUERIES = [
+    "service-004217",
+    "user4217@",
+    ".com",
+    "example",
+    "gmail.com",
+    "com.x",
+    "@gm.com",
+    "srevice-000123",
+]
+
+
+@pytest.fixture(scope="module")
+def app():
+    from PyQt5.QtWidgets import QApplication
+
+    return QApplication.instance() or QApplication([])
+
+
+def test_password_table(benchmark, check_baseline, app, vault_rows, vault_size):
+    from PyQt5.QtCore import QThreadPool
+
+    from gui.components.password_table import PasswordTable
+
+    rows = [dict(row, id=i) for i, row in enumerate(vault_rows[:vault_size])]
+
+    def build():
+        # Until the table is on screen and its search index is ready
+        table = PasswordTable(rows)
+        QThreadPool.globalInstance().waitForDone()
+        app.processEvents()
+        table.deleteLater()
+        return table
+
+    benchmark.pedantic(build, rounds=1 if vault_size >= 10000 else 5)
+    check_baseline(vault_size, peak_memory(build))
+
+
+def test_filter_keystrokes(benchmark, check_baseline, vault_rows, vault_size):
+    from gui.components.password_table import PasswordTableModel
+    from modules.search import SearchIndex
+
+    model = PasswordTableModel(vault_rows[:vault_size])
+    model.set_search_index(SearchIndex(model.entries()))
+
+    keystrokes = [
+        text
+        for query in QUERIES
+        for text in [query[:length] for length in range(1, len(query) + 1)] + [""]
+    ]
+    fastest = [float("inf")] * len(keystrokes)
+
+    def type_queries():
+        for i, text in enumerate(keystrokes):
+            started = time.perf_counter()
+            model.set_filter(text)
+            fastest[i] = min(fastest[i], time.perf_counter() - started)
+
+    benchmark.pedantic(type_queries, rounds=5)
+    check_baseline(len(keystrokes))
+
+    # Every keystroke, at its best round, within the target
+    slowest = max(range(len(keystrokes)), key=fastest.__getitem__)
+    assert fastest[slowest] < KEYSTROKE_BUDGET, (
+        f"Filtering {vault_size} entries by {keystrokes[slowest]!r} took "
+        f"{fastest[slowest] * 1e3:.1f} ms"
+    )
@@ -0,0 +1,110 @@
+import time
+from unittest.mock import patch
+
+import pytest
+
+from modules.utils import (
+    SYNC_OVERLAP,
+    add_password,
+    get_user_key,
+    list_password_pages,
+    retrieve_password,
+    sync_vault,
+)
+from modules.vault_cache import get_vault_cache
+
+# Round trip of a distant Supabase region; every request waits this long
+RTT = 0.2  # seconds
+JITTER = 0.02  # seconds
+
+ROUNDS = 3
+VAULT_SIZE = 1000
+SERVICE = "service-000005.example.com"
+
+
+@pytest.fixture
+def slow_backend(make_backend, user, vault_rows):
+    """A fake backend behind a 200 ms network, holding a 1000 entry vault."""
+    user_id, _ = user
+    backend = make_backend(latency=RTT, jitter=JITTER, seed=0)
+    backend.server.load("passwords", vault_rows[:VAULT_SIZE])
+
+    # Every benchmark starts with the key fetched and the cache cold
+    get_user_key(user_id)
+    get_vault_cache().clear(user_id)
+    backend.network.reset()
+    return backend
+
+
+def test_view_entry_cold_cache(benchmark, check_baseline, slow_backend, user):
+    user_id, _ = user
+
+    def clear():
+        get_vault_cache().clear(user_id)
+
+    result = benchmark.pedantic(
+        retrieve_password, (SERVICE,), setup=clear, rounds=ROUNDS
+    )
+    assert result["service"] == SERVICE
+    assert slow_backend.requests <= ROUNDS  # At most one request per view
+
+    check_baseline()
+
+
+def test_view_entry_warm_cache(benchmark, check_baseline, slow_backend):
+    for _ in list_password_pages():
+        pass
+    slow_backend.network.reset()
+
+    result = benchmark.pedantic(retrieve_password, (SERVICE,), rounds=ROUNDS)
+    assert result["service"] == SERVICE
+    assert slow_backend.requests == 0
+
+    check_baseline()
+
+
+def test_first_page_cold_cache(benchmark, check_baseline, slow_backend, user):
+    user_id, _ = user
+
+    def clear():
+        get_vault_cache().clear(user_id)
+
+    def first_page():
+        return next(iter(list_password_pages()))
+
+    assert len(benchmark.pedantic(first_page, setup=clear, rounds=ROUNDS)) > 0
+    assert slow_backend.requests == ROUNDS
+
+    check_baseline()
+
+
+def test_first_page_warm_cache(benchmark, check_baseline, slow_backend):
+    for _ in list_password_pages():
+        pass
+
+    # Minutes after the load, syncs no longer re-read its overlap window
+    for overlaps in (1, 2):
+        later = time.time() + overlaps * SYNC_OVERLAP.total_seconds()
+
+        with patch("modules.utils.time.time", return_value=later):
+            sync_vault()
+    slow_backend.network.reset()
+
+    def first_page():
+        return next(iter(list_password_pages()))
+
+    assert len(benchmark.pedantic(first_page, rounds=ROUNDS)) > 0
+    # The delta sync: one empty page of changes and one of tombstones
+    assert slow_backend.requests == 2 * ROUNDS
+
+    check_baseline()
+
+
+def test_add_password(benchmark, check_baseline, slow_backend):
+    result = benchmark.pedantic(
+        add_password, ("new.example.com", "me", "hunter2"), rounds=ROUNDS
+    )
+    assert result == "Password added successfully"
+    assert slow_backend.requests == ROUNDS
+
+    check_baseline()
@@ -0,0 +1,68 @@
+import os
+
+from benchmarks.conftest import peak_memory
+from modules.backup import BackupWriter
+from modules.utils import export_passwords, import_passwords, list_password_pages
+from modules.vault_cache import get_vault_cache
+
+
+def rounds(vault_size):
+    """Fewer rounds for big vaults, so a full run stays in minutes."""
+    return 1 if vault_size >= 10000 else 5
+
+
+def test_export_passwords(
+    benchmark, check_baseline, backend, vault_rows, vault_size, tmp_path, monkeypatch
+):
+    backend.server.load("passwords", vault_rows[:vault_size])
+    monkeypatch.chdir(tmp_path)  # Backups are written under ./backup
+
+    result = benchmark.pedantic(export_passwords, rounds=rounds(vault_size))
+    assert result.startswith("Passwords exported successfully")
+
+    check_baseline(vault_size, peak_memory(export_passwords))
+
+
+def test_import_passwords(
+    benchmark, check_baseline, backend, user, vault_rows, vault_size, tmp_path
+):
+    path = os.path.join(tmp_path, "backup.jsonl")
+
+    with BackupWriter(path, encrypted=False) as writer:
+        for i, row in enumerate(vault_rows[:vault_size]):
+            writer.write(
+                {
+                    "id": i,
+                    "service_name": row["service_name"],
+                    "username": row["username"],
+                    "password": "correct horse battery staple",
+                }
+            )
+
+    def reset():
+        backend.server.tables["passwords"] = []
+
+    result = benchmark.pedantic(
+        import_passwords, (path,), setup=reset, rounds=rounds(vault_size)
+    )
+    assert result == f"Successfully imported accounts from: {path}"
+    assert len(backend.server.tables["passwords"]) == vault_size
+
+    reset()
+    check_baseline(vault_size, peak_memory(import_passwords, path))
+
+
+def test_list_password_pages(
+    benchmark, check_baseline, backend, user, vault_rows, vault_size
+):
+    user_id, _ = user
+    backend.server.load("passwords", vault_rows[:vault_size])
+
+    def list_from_server():
+        # Cold cache: every page comes from the fake server
+        get_vault_cache().clear(user_id)
+        return sum(len(page) for page in list_password_pages())
+
+    assert benchmark.pedantic(list_from_server, rounds=rounds(vault_size)) == vault_size
+
+    check_baseline(vault_size, peak_memory(list_from_server))
@@ -0,0 +1,232 @@
+import base64
+import hashlib
+import json
+import os
+import time
+import tracemalloc
+import uuid
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from modules.fake_backend import FakeBackend, fake_access_token
+from modules.session import current_session
+from modules.supabase_client import use_backend
+from modules.utils import SALT_SIZE, clear_key_cache, encrypt_password
+from modules.vault_cache import VaultCache
+
+# Run with `python -m pytest benchmarks` (needs pytest-benchmark, see
+# requirements-dev.txt). Supabase is replaced by the in-process stand-in in
+# modules.fake_backend, so no network is involved unless a benchmark
+# simulates one.
+
+# Per-entry time and peak memory recorded for every benchmark and size;
+# refresh with --update-baselines after an intended change. Times are kept
+# as multiples of the calibration workload's time, so that the baselines
+# carry over to faster and slower machines.
+BASELINES_PATH = Path(__file__).with_name("baselines.json")
+
+# Rounds of the calibration workload; the fastest one is kept
+CALIBRATION_ROUNDS = 5
+
+# A benchmark fails when it is this much slower or hungrier than its baseline;
+# single rounds of the big vaults vary by up to half between runs
+TIME_TOLERANCE = 1.0
+MEMORY_TOLERANCE = 0.25
+
+# Peaks below this are noise, whatever the baseline says
+MEMORY_FLOOR = 256 * 1024  # bytes
+
+VAULT_SIZES = "10,1000,10000,100000"
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("vault benchmarks")
+    group.addoption(
+        "--vault-sizes",
+        default=VAULT_SIZES,
+        help=f"Comma separated vault sizes to benchmark (default {VAULT_SIZES})",
+    )
+    group.addoption(
+        "--update-baselines",
+        action="store_true",
+        help="Record the measured costs as the new baselines instead of checking",
+    )
+
+
+def pytest_generate_tests(metafunc):
+    if "vault_size" in metafunc.fixturenames:
+        sizes = metafunc.config.getoption("--vault-sizes").split(",")
+        metafunc.parametrize("vault_size", [int(size) for size in sizes])
+
+
+def _calibration_workload():
+    # Interpreter work and C hashing, like the code being benchmarked
+    rows = [{"id": i, "name": f"service-{i:06d}"} for i in range(20000)]
+    rows.sort(key=lambda row: row["name"], reverse=True)
+    hashlib.pbkdf2_hmac("sha256", b"password", b"salt", 20000)
+
+
+def calibrate():
+    """Return the seconds this machine takes for the calibration workload."""
+    fastest = None
+
+    for _ in range(CALIBRATION_ROUNDS):
+        started = time.perf_counter()
+        _calibration_workload()
+        elapsed = time.perf_counter() - started
+        if fastest is None or elapsed < fastest:
+            fastest = elapsed
+
+    return fastest
+
+
+class Baselines:
+    """Checks measured per-entry costs against baselines.json."""
+
+    def __init__(self, update, calibration):
+        self.update = update
+        self.calibration = calibration
+
+        try:
+            self.values = json.loads(BASELINES_PATH.read_text())
+        except FileNotFoundError:
+            self.values = {}
+
+    def check(self, name, seconds_per_entry, peak_bytes=None, entries=1):
+        """Fail when a cost exceeds its baseline by more than the tolerance."""
+        measured = {"relative_time_per_entry": seconds_per_entry / self.calibration}
+        if peak_bytes is not None:
+            measured["peak_bytes_per_entry"] = peak_bytes / entries
+
+        if self.update:
+            self.values[name] = measured
+            return
+
+        baseline = self.values.get(name)
+        if baseline is None:
+            pytest.fail(f"No baseline for {name}; run with --update-baselines")
+
+        # The baseline as it would have been measured on this machine
+        expected = baseline["relative_time_per_entry"] * self.calibration
+        assert seconds_per_entry <= expected * (1 + TIME_TOLERANCE), (
+            f"{name}: {seconds_per_entry * 1e6:.1f} us per entry, "
+            f"baseline {expected * 1e6:.1f} us on this machine"
+        )
+
+        if peak_bytes is not None and peak_bytes > MEMORY_FLOOR:
+            limit = baseline["peak_bytes_per_entry"] * (1 + MEMORY_TOLERANCE)
+            assert measured["peak_bytes_per_entry"] <= limit, (
+                f"{name}: {measured['peak_bytes_per_entry']:.0f} bytes per entry, "
+                f"baseline {baseline['peak_bytes_per_entry']:.0f} bytes"
+            )
+
+    def save(self):
+        BASELINES_PATH.write_text(json.dumps(self.values, indent=2, sort_keys=True))
+
+
+@pytest.fixture(scope="session")
+def baselines(request):
+    update = request.config.getoption("--update-baselines")
+    baselines = Baselines(update, calibrate())
+    yield baselines
+    if update:
+        baselines.save()
+
+
+@pytest.fixture
+def check_baseline(benchmark, baselines, request):
+    """Compare the benchmark's fastest round, per entry, with its baseline."""
+
+    def check(entries=1, peak_bytes=None):
+        baselines.check(
+            request.node.name.removeprefix("test_"),
+            benchmark.stats.stats.min / entries,
+            peak_bytes,
+            entries,
+        )
+
+    return check
+
+
+def peak_memory(fn, *args, **kwargs):
+    """Run fn once and return the peak of Python allocations it made."""
+    tracemalloc.start()
+    try:
+        fn(*args, **kwargs)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.fixture(autouse=True)
+def request_budgets(monkeypatch):
+    """Fail any benchmarked operation that goes over its request budget."""
+    monkeypatch.setattr("modules.accounting.BUDGET_MODE", "raise")
+
+
+@pytest.fixture(scope="session")
+def user():
+    """A logged-in user with a random encryption key."""
+    user_id = str(uuid.uuid4())
+    user_key = base64.b64encode(os.urandom(SALT_SIZE)).decode()
+
+    current_session.start(user_id, "bench@example.com", user_key)
+    current_session.set_identity(fake_access_token(user_id))
+    yield user_id, user_key
+
+    current_session.clear()
+    clear_key_cache()
+
+
+@pytest.fixture(scope="session")
+def vault_rows(request, user):
+    """Synthetic password rows, generated once for the largest size."""
+    user_id, user_key = user
+    size = max(int(s) for s in request.config.getoption("--vault-sizes").split(","))
+    password = encrypt_password("correct horse battery staple", user_key)
+
+    # One real ciphertext shared by every row: generating 100k distinct ones
+    # would dominate the run, and decryption costs the same either way
+    return [
+        {
+            "user_id": user_id,
+            "service_name": f"service-{i:06d}.example.com",
+            "username": f"user{i}@example.com",
+            "encrypted_password": password,
+        }
+        for i in range(size)
+    ]
+
+
+@pytest.fixture
+def make_backend(user, tmp_path):
+    """
+    Route the Supabase client and the vault cache to in-process fakes.
+
+    Takes the FakeBackend network settings; `backend` is the no-latency case.
+    """
+    user_id, user_key = user
+    cache = VaultCache(tmp_path / "vault.db")
+    previous = []
+
+    def make(**network):
+        fake = FakeBackend(**network)
+        fake.server.load(
+            "user_keys", [{"user_id": user_id, "encryption_salt": user_key}]
+        )
+        previous.append(use_backend(fake))
+        return fake
+
+    with patch("modules.vault_cache._cache", cache):
+        yield make
+
+    if previous:
+        use_backend(previous[0])
+    cache.close()
+
+
+@pytest.fixture
+def backend(make_backend):
+    return make_backend()
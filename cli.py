@@ -1,27 +1,13 @@
 import argparse
-import os
+import getpass
 
-from cryptography.fernet import Fernet
-from dotenv import load_dotenv
-
-from modules.models import Password, SessionLocal
-from modules.utils import (
-    add_password,
-    export_passwords,
-    generate_password,
-    import_passwords,
-    list_passwords,
-    retrieve_password,
-    set_master_password,
-    verify_master_password,
-    generate_key
-)
-
-session = SessionLocal()
+# Commands are dispatched before the vault modules are imported, so that
+# `generate` starts without loading the crypto and Supabase layers.
 
 
 def main():
     parser = argparse.ArgumentParser(description="Password Manager CLI")
+    parser.add_argument("--email", help="Account email (prompted if omitted)")
     subparsers = parser.add_subparsers(dest="command", required=True)
 
     # Add command
@@ -40,13 +26,7 @@ def main():
     retrieve_parser.add_argument("service_name", help="Name of the service to retrieve")
 
     # List command
-    list_parser = subparsers.add_parser("list", help="List all stored passwords")
-
-    # Setpass command
-    setpass_parser = subparsers.add_parser("setpass", help="Set the master password")
-    setpass_parser.add_argument(
-        "master_password", help="Master password for the password manager"
-    )
+    subparsers.add_parser("list", help="List all stored passwords")
 
     # Delete command
     delete_parser = subparsers.add_parser("delete", help="Delete a saved password")
@@ -72,53 +52,70 @@ def main():
 
     # Export command
     export_parser = subparsers.add_parser("export", help="Export passwords")
-    export_parser.add_argument("--passwords", nargs="*", help="Service names to export")
+    export_parser.add_argument(
+        "--decrypt",
+        action="store_true",
+        help="Write the passwords in plain text instead of encrypted",
+    )
+    export_parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only export changes since the last export",
+    )
 
     # Import command
     import_parser = subparsers.add_parser("import", help="Import passwords")
     import_parser.add_argument("path", help="Path to the file to import")
 
-    # Parse arguments
-    args = parser.parse_args()
+    # Restore command
+    restore_parser = subparsers.add_parser(
+        "restore", help="Restore a full backup and its incremental exports"
+    )
+    restore_parser.add_argument("path", help="Path to the full backup")
 
-    load_dotenv()
-    encryption_key = os.getenv("ENCRYPTION_KEY")
+    # Migrate command
+    subparsers.add_parser(
+        "migrate", help="Re-encrypt stored passwords in the current format"
+    )
 
-    if not encryption_key:
-        encryption_key = generate_key().decode()
+    # Parse arguments
+    args = parser.parse_args()
 
-        with open(".env", "a") as f:
-            f.write(f"ENCRYPTION_KEY={encryption_key}\n")
+    # Offline commands
+    if args.command == "generate":
+        from modules.generator import generate_password
 
-        print("ENCRYPTION_KEY generated and saved.")
+        print(f"Generated password: {generate_password(args.length)}")
+        return
 
-    if args.command == "setpass":
-        if os.getenv("ENCRYPTED_MASTER_PASSWORD"):
-            print("Master password already set.")
-            return
+    from modules.auth import log_in
+    from modules.utils import (
+        add_password,
+        delete_password,
+        encrypt_password,
+        export_passwords,
+        generate_password,
+        get_password_entry,
+        get_user_key,
+        import_passwords,
+        list_password_pages,
+        migrate_vault,
+        restore_passwords,
+        retrieve_password,
+        update_password,
+    )
 
-        print(set_master_password(args.master_password, encryption_key.encode()))
-        return
+    # Everything else works on the account's vault
+    email = args.email or input("Email: ")
+    result = log_in(email, getpass.getpass("Password: "))
 
-    elif args.command == "generate":
-        generated_password = generate_password(args.length)
-        print(f"Generated password: {generated_password}")
+    if not result["success"]:
+        print(result["message"])
         return
 
-    input_password = input("Enter your master password: ")
-    stored_encrypted_password = os.getenv("ENCRYPTED_MASTER_PASSWORD")
-    if stored_encrypted_password:
-        # Decrypt the stored password and verify
-        if verify_master_password(
-            input_password, stored_encrypted_password.encode(), encryption_key.encode()
-        ):
-            print("Master password verified successfully!")
-        else:
-            print("Incorrect master password.")
-            return
+    user_id = result["user"]["id"]
 
     if args.command == "add":
-        cipher = Fernet(encryption_key)
         if args.generate:
             args.plain_password = generate_password()
         elif not args.plain_password:
@@ -127,56 +124,71 @@ def main():
             )
             return
 
-        print(
-            add_password(
-            args.service_name,
-            args.username,
-            args.plain_password,
-            cipher,
-        )
-        )
+        print(add_password(args.service_name, args.username, args.plain_password))
 
-    elif args.command == "export":
-        print(export_passwords(args.passwords, encryption_key))
+    elif args.command == "retrieve":
+        result = retrieve_password(args.service_name)
+        if isinstance(result, dict):
+            print(f"{result['service']} ({result['username']}): {result['password']}")
+        else:
+            print(result)
 
-    elif args.command == "import":
-        print(import_passwords(args.path, encryption_key))
+    elif args.command == "list":
+        pages = list_password_pages()
+        if isinstance(pages, str):
+            print(pages)
+        else:
+            # Print each page as soon as it arrives
+            for page in pages:
+                for entry in page:
+                    print(f"{entry['service_name']}: {entry['username']}")
 
     elif args.command == "delete":
-        password = (
-            session.query(Password)
-            .filter(Password.service_name == args.service_name)
-            .first()
-        )
-        if password:
-            session.delete(password)
-            session.commit()
+        entry = get_password_entry(args.service_name, user_id=user_id)
+        if entry is None:
+            print(f"No entry found for service: {args.service_name}")
+        elif delete_password(user_id, entry["id"]):
             print(f"Password for {args.service_name} deleted successfully!")
         else:
-            print(f"No entry found for service: {args.service_name}")
+            print(f"Failed to delete the password for {args.service_name}")
 
     elif args.command == "update":
-        password = (
-            session.query(Password)
-            .filter(Password.service_name == args.service_name)
-            .first()
-        )
         if args.generate:
             args.new_password = generate_password()
-        if password:
-            cipher = Fernet(encryption_key)
-            password.encrypted_password = cipher.encrypt(args.new_password.encode())
-            session.commit()
+        elif not args.new_password:
+            print(
+                "Error: You must provide a password or use '--generate' to create one."
+            )
+            return
+
+        entry = get_password_entry(args.service_name, user_id=user_id)
+        if entry is None:
+            print(f"No entry found for service: {args.service_name}")
+            return
+
+        encrypted_password = encrypt_password(args.new_password, get_user_key(user_id))
+        if update_password(
+            user_id,
+            entry["id"],
+            entry["service_name"],
+            entry["username"],
+            encrypted_password,
+        ):
             print(f"Password for {args.service_name} updated successfully!")
         else:
-            print(f"No entry found for service: {args.service}")
+            print(f"Failed to update the password for {args.service_name}")
 
-    elif args.command == "retrieve":
-        cipher = Fernet(encryption_key)
-        print(retrieve_password(args.service_name, cipher))
+    elif args.command == "export":
+        print(export_passwords(args.decrypt, incremental=args.incremental))
 
-    elif args.command == "list":
-        print(list_passwords())
+    elif args.command == "import":
+        print(import_passwords(args.path))
+
+    elif args.command == "restore":
+        print(restore_passwords(args.path))
+
+    elif args.command == "migrate":
+        print(migrate_vault(lambda done: print(f"Re-encrypted {done}", end="\r")))
 
 
 if __name__ == "__main__":
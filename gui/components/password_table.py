@@ -1,256 +1,558 @@
-from PyQt5.QtCore import Qt
-from PyQt5.QtWidgets import (QApplication, QDialog, QMessageBox, QPushButton,
-                             QTableWidget, QTableWidgetItem)
+from PyQt5.QtCore import (QAbstractTableModel, QEvent, QModelIndex, Qt,
+                          QThreadPool, QTimer, pyqtSignal)
+from PyQt5.QtWidgets import (QApplication, QDialog, QHeaderView, QMessageBox,
+                             QStyle, QStyledItemDelegate, QStyleOptionButton,
+                             QTableView)
 
 from gui.dialogs.password import UpdatePasswordDialog
-from modules.supabase_client import supabase
-from modules.utils import decrypt_password
+from gui.tasks import run_task
+from modules.accounting import accounted
+from modules.search import SearchIndex
+from modules.subscriptions import (DELETE, REALTIME_ENABLED,
+                                   PasswordSubscription)
+from modules.tracing import span, use_span
+from modules.utils import (PLAINTEXT_CACHE_TTL, clear_plaintext_cache,
+                           decrypt_password_cached, get_user_id, get_user_key,
+                           predecrypt_passwords)
+
+COLUMNS = ["Service", "Username", "Actions"]
+ACTIONS_COLUMN = 2
+
+# Rows handed to the view each time it scrolls near the end of the loaded rows
+FETCH_BATCH_SIZE = 200
+
+# Rows below the viewport decrypted ahead of scrolling
+PREDECRYPT_LOOKAHEAD = 10
+# Quiet period after scrolling before the visible rows are decrypted
+PREDECRYPT_DELAY = 150  # milliseconds
+
+
+class PasswordTableModel(QAbstractTableModel):
+    """
+    Table model over the password list, loading rows as the view scrolls.
+
+    Rows can be filtered through a SearchIndex, which identifies entries by
+    their position in the list; removed entries leave a None behind so those
+    positions stay valid. Matches are looked up a batch at a time as well.
+    """
+
+    def __init__(self, password_list, parent=None):
+        super().__init__(parent)
+        # Skip invalid entries instead of leaving blank rows
+        self._entries = [entry for entry in password_list if isinstance(entry, dict)]
+        self._positions = {}  # Entry id -> position, for realtime changes
+        self._index_ids(range(len(self._entries)))
+        self._all_rows = list(range(len(self._entries)))
+        self._rows = self._all_rows  # Positions of the shown entries, in order
+        self._loaded = min(FETCH_BATCH_SIZE, len(self._rows))
+        self._complete = True  # False while the search may have more matches
+
+        self.search_index = None
+        self._filter_text = ""
+        self._stale_ids = set()  # Changed while the index was being built
+
+    def entries(self):
+        """Return the entry list the row ids refer to."""
+        return self._entries
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._loaded
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+
+        entry = self._entries[self._rows[index.row()]]
+
+        if index.column() == 0:
+            return entry.get("service_name", "Unknown")
+        if index.column() == 1:
+            return entry.get("username", "Unknown")
+        return "View"
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return COLUMNS[section]
+        return None
+
+    def flags(self, index):
+        # Cells are read-only
+        return Qt.ItemIsSelectable | Qt.ItemIsEnabled
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and (
+            self._loaded < len(self._rows) or not self._complete
+        )
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+
+        if self._loaded == len(self._rows) and not self._complete:
+            # Look up the next batch of matches
+            self._search(self._loaded + FETCH_BATCH_SIZE)
+
+        count = min(FETCH_BATCH_SIZE, len(self._rows) - self._loaded)
+        if count <= 0:
+            return
+
+        self.beginInsertRows(QModelIndex(), self._loaded, self._loaded + count - 1)
+        self._loaded += count
+        self.endInsertRows()
+
+    def append_entries(self, entries):
+        """Add entries after the last one, e.g. the next page of a listing."""
+        start = len(self._entries)
+        self._entries.extend(entry for entry in entries if isinstance(entry, dict))
+        positions = range(start, len(self._entries))
+
+        if not positions:
+            return
+
+        self._index_ids(positions)
+        for position in positions:
+            self._reindex(position)
+
+        if self.search_index is not None and self._filter_text:
+            # New entries may match the current filter
+            self._all_rows = self._all_rows + list(positions)
+            self.set_filter(self._filter_text)
+            return
+
+        if self._rows is not self._all_rows:
+            self._rows = self._all_rows = self._all_rows + list(positions)
+        else:
+            self._all_rows.extend(positions)
+
+        # Fill the first batch right away; later rows load on scrolling
+        shown = min(FETCH_BATCH_SIZE, len(self._rows))
+        if shown > self._loaded:
+            self.beginInsertRows(QModelIndex(), self._loaded, shown - 1)
+            self._loaded = shown
+            self.endInsertRows()
+
+    def _index_ids(self, positions):
+        for position in positions:
+            entry_id = self._entries[position].get("id")
+            if entry_id is not None:
+                self._positions[entry_id] = position
+
+    def _forget(self, position):
+        """Drop the entry at a position, keeping the position itself valid."""
+        entry = self._entries[position]
+        self._entries[position] = None
+        self._positions.pop(entry.get("id"), None)
+        self._reindex(position)
+
+    def upsert_entry(self, entry):
+        """Apply a created or changed entry, e.g. from another device."""
+        position = self._positions.get(entry.get("id"))
+
+        if position is None:
+            self.append_entries([entry])
+            return
+
+        self._entries[position].update(entry)
+        self._reindex(position)
+
+        if self.search_index is not None and self._filter_text:
+            # The change may move the entry in or out of the results
+            self.set_filter(self._filter_text)
+        elif position in self._rows[: self._loaded]:
+            row = self._rows.index(position)
+            self.dataChanged.emit(self.index(row, 0), self.index(row, 1))
 
+    def remove_entry(self, entry_id):
+        """Drop an entry deleted elsewhere; unknown ids are ignored."""
+        position = self._positions.get(entry_id)
 
-class PasswordTable(QTableWidget):
+        if position is None:
+            return
+
+        if position in self._rows[: self._loaded]:
+            self.removeRows(self._rows.index(position), 1)
+            return
+
+        # Not on screen yet: forget it without touching the view
+        self._forget(position)
+        self._all_rows = [i for i in self._all_rows if i != position]
+        self._rows = [i for i in self._rows if i != position]
+
+    def set_search_index(self, search_index):
+        """Start filtering with an index built over entries()."""
+        for position in self._stale_ids:
+            if self._entries[position] is None:
+                search_index.remove(position)
+            else:
+                search_index.update(position, self._entries[position])
+
+        self._stale_ids.clear()
+        self.search_index = search_index
+        self.set_filter(self._filter_text)
+
+    def set_filter(self, text):
+        """Show only the entries matching text; applied once an index is set."""
+        self._filter_text = text
+
+        if self.search_index is None:
+            return
+
+        self.beginResetModel()
+        self._search(FETCH_BATCH_SIZE)
+        self._loaded = min(FETCH_BATCH_SIZE, len(self._rows))
+        self.endResetModel()
+
+    def _search(self, limit):
+        """Show the first `limit` matches of the filter, or every entry."""
+        matches = self.search_index.search(self._filter_text, limit=limit)
+        self._rows = self._all_rows if matches is None else matches
+        self._complete = matches is None or len(matches) < limit
+
+    def entry(self, row):
+        """Return the entry shown at a row, or None if the row is out of range."""
+        if 0 <= row < self._loaded:
+            return self._entries[self._rows[row]]
+        return None
+
+    def removeRows(self, row, count, parent=QModelIndex()):
+        if parent.isValid() or row < 0 or count <= 0 or row + count > self._loaded:
+            return False
+
+        removed = self._rows[row : row + count]
+
+        self.beginRemoveRows(QModelIndex(), row, row + count - 1)
+        # Search results are shared with the index, so build new lists
+        self._rows = self._rows[:row] + self._rows[row + count :]
+        self._loaded -= count
+        for position in removed:
+            self._forget(position)
+        removed_ids = set(removed)
+        self._all_rows = [i for i in self._all_rows if i not in removed_ids]
+        self.endRemoveRows()
+        return True
+
+    def _reindex(self, position):
+        if self.search_index is None:
+            self._stale_ids.add(position)
+        elif self._entries[position] is None:
+            self.search_index.remove(position)
+        else:
+            self.search_index.update(position, self._entries[position])
+
+
+class ViewButtonDelegate(QStyledItemDelegate):
+    """Paints a "View" button in a cell without creating a widget per row."""
+
+    clicked = pyqtSignal(int)
+
+    def paint(self, painter, option, index):
+        button = QStyleOptionButton()
+        button.rect = option.rect.adjusted(2, 2, -2, -2)
+        button.text = index.data()
+        button.state = QStyle.State_Enabled
+
+        if option.state & QStyle.State_MouseOver:
+            button.state |= QStyle.State_MouseOver
+
+        style = option.widget.style() if option.widget else QApplication.style()
+        style.drawControl(QStyle.CE_PushButton, button, painter, option.widget)
+
+    def editorEvent(self, event, model, option, index):
+        if (
+            event.type() == QEvent.MouseButtonRelease
+            and event.button() == Qt.LeftButton
+            and option.rect.contains(event.pos())
+        ):
+            self.clicked.emit(index.row())
+            return True
+        return False
+
+
+@accounted("view")
+def decrypt_entry(entry):
+    """Decrypt a listed entry; runs on a worker thread."""
+    user_id = get_user_id()
+
+    if isinstance(user_id, dict):
+        return {"success": False, "title": "Error", "message": user_id["message"]}
+
+    # The list already carries the ciphertext, no request is needed
+    encrypted_password = entry.get("encrypted_password")
+
+    if not encrypted_password or entry.get("id") is None:
+        return {
+            "success": False,
+            "title": "Data Error",
+            "message": "Password data is incomplete.",
+        }
+
+    # Encryption key comes from the session, not the database
+    user_key = get_user_key(user_id)
+
+    if isinstance(user_key, dict):
+        return {"success": False, "title": "Key Error", "message": user_key["message"]}
+
+    # Decrypt password
+    try:
+        decrypted_password = decrypt_password_cached(encrypted_password, user_key)
+    except Exception as decrypt_error:
+        return {
+            "success": False,
+            "title": "Decryption Error",
+            "message": f"Failed to decrypt password: {str(decrypt_error)}",
+        }
+
+    if not decrypted_password or isinstance(decrypted_password, dict):
+        return {
+            "success": False,
+            "title": "Decryption Error",
+            "message": "Failed to decrypt password.",
+        }
+
+    return {
+        "success": True,
+        "user_id": user_id,
+        "entry_id": entry["id"],
+        "service": entry["service_name"],
+        "username": entry["username"],
+        "password": decrypted_password,
+    }
+
+
+class PasswordTable(QTableView):
     """Widget to display stored passwords with View options."""
 
+    # Realtime changes, re-emitted on the UI thread: (event, entry)
+    password_changed = pyqtSignal(str, object)
+
     def __init__(self, password_list):
+        super().__init__()
+
         try:
             # Validate input
             if not isinstance(password_list, list):
                 raise TypeError("Expected a list of password entries")
-
-            super().__init__(
-                len(password_list), 3
-            )  # 3 columns: Service, Username, Actions
-            self.setHorizontalHeaderLabels(
-                ["Service", "Username", "Actions"]
-            )  # Set column headers
-
-            # Set table properties
-            self.setContentsMargins(0, 0, 0, 0)  # Ensure no margin around the table
-            self.horizontalHeader().setStretchLastSection(True)  # Stretch last column
-            self.horizontalHeader().setDefaultSectionSize(150)  # Adjust column sizes
-            self.verticalHeader().setVisible(False)  # Hide row headers
-
-            # Populate the table rows
-            for row, password_entry in enumerate(password_list):
-                try:
-                    if not isinstance(password_entry, dict):
-                        QApplication.processEvents()  # Keep UI responsive
-                        continue  # Skip invalid entries
-
-                    service = password_entry.get("service_name", "Unknown")
-                    username = password_entry.get("username", "Unknown")
-
-                    # Add service and username to the table
-                    service_item = QTableWidgetItem(service)
-                    username_item = QTableWidgetItem(username)
-
-                    # Make cells non-editable
-                    service_item.setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)
-                    username_item.setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)
-
-                    self.setItem(row, 0, service_item)
-                    self.setItem(row, 1, username_item)
-
-                    # Add "View" button
-                    view_button = QPushButton("View")
-                    view_button.clicked.connect(
-                        lambda _, r=row: self.handle_view_click(r)
-                    )
-                    self.setCellWidget(row, 2, view_button)
-                except Exception as row_error:
-                    QMessageBox.warning(
-                        self,
-                        "Display Warning",
-                        f"Failed to display entry at row {row}: {str(row_error)}",
-                    )
-                    # Create empty row with error indication
-                    self.setItem(row, 0, QTableWidgetItem("Error"))
-                    self.setItem(row, 1, QTableWidgetItem("Failed to load"))
-                    self.setCellWidget(row, 2, QPushButton("N/A"))
-
-            self.resizeColumnsToContents()
-        except Exception as init_error:
+        except TypeError as init_error:
             QMessageBox.critical(
                 None,
                 "Table Error",
                 f"Failed to initialize password table: {str(init_error)}",
             )
-            # Create a minimally functional table
-            super().__init__(0, 3)
-            self.setHorizontalHeaderLabels(["Service", "Username", "Actions"])
+            password_list = []  # Show an empty table
+
+        self.password_model = PasswordTableModel(password_list, self)
+        self.setModel(self.password_model)
+
+        # Only the visible rows are painted; the action column has no widgets
+        self.view_delegate = ViewButtonDelegate(self)
+        self.view_delegate.clicked.connect(self.handle_view_click)
+        self.setItemDelegateForColumn(ACTIONS_COLUMN, self.view_delegate)
+        self.setMouseTracking(True)  # Hover state for the painted buttons
+
+        # Set table properties
+        self.setContentsMargins(0, 0, 0, 0)  # Ensure no margin around the table
+        self.setSelectionBehavior(QTableView.SelectRows)
+        self.setWordWrap(False)
+        self.horizontalHeader().setStretchLastSection(True)  # Stretch last column
+        self.horizontalHeader().setDefaultSectionSize(150)  # Adjust column sizes
+        self.verticalHeader().setVisible(False)  # Hide row headers
+        # Fixed row heights let the view skip measuring every row
+        self.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+
+        self.view_task = None
+        self.view_span = None
+
+        # Index the entries off the UI thread; typing before it is ready
+        # filters as soon as it arrives
+        self.index_task = run_task(
+            SearchIndex,
+            list(self.password_model.entries()),
+            on_finished=self.password_model.set_search_index,
+        )
+
+        # Decrypt the rows on screen ahead of a click, one at a time on a
+        # separate pool so it never competes with requests
+        self.predecrypt_pool = QThreadPool(self)
+        self.predecrypt_pool.setMaxThreadCount(1)
+        self.predecrypt_task = None
+
+        self.predecrypt_timer = QTimer(self)
+        self.predecrypt_timer.setSingleShot(True)
+        self.predecrypt_timer.setInterval(PREDECRYPT_DELAY)
+        self.predecrypt_timer.timeout.connect(self.predecrypt_visible_rows)
+        self.verticalScrollBar().valueChanged.connect(self.predecrypt_timer.start)
+        self.password_model.modelReset.connect(self.predecrypt_timer.start)
+        self.password_model.rowsRemoved.connect(self.predecrypt_timer.start)
+
+        # Wipe the decrypted rows once the table has been left alone
+        self.idle_timer = QTimer(self)
+        self.idle_timer.setSingleShot(True)
+        self.idle_timer.setInterval(PLAINTEXT_CACHE_TTL * 1000)
+        self.idle_timer.timeout.connect(clear_plaintext_cache)
+
+        self.live_updates = None
+        self.password_changed.connect(self.apply_change)
+
+    def predecrypt_visible_rows(self):
+        """Decrypt the visible rows plus a lookahead in the background."""
+        row_count = self.password_model.rowCount()
+        first = self.rowAt(0)
+
+        if first < 0:
+            return
+
+        last = self.rowAt(self.viewport().height() - 1)
+        if last < 0:
+            last = row_count - 1
+        last = min(last + PREDECRYPT_LOOKAHEAD, row_count - 1)
+
+        encrypted_passwords = []
+        for row in range(first, last + 1):
+            entry = self.password_model.entry(row)
+            if entry and entry.get("encrypted_password"):
+                encrypted_passwords.append(entry["encrypted_password"])
+
+        # Rows scrolled away are evicted when the new run starts
+        if self.predecrypt_task:
+            self.predecrypt_task.cancel()
+
+        self.predecrypt_task = run_task(
+            predecrypt_passwords,
+            encrypted_passwords,
+            cancellable=True,
+            pool=self.predecrypt_pool,
+        )
+        self.idle_timer.start()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.predecrypt_timer.start()
+
+    def hideEvent(self, event):
+        # Nothing decrypted outlives the table on screen
+        self.predecrypt_timer.stop()
+        self.idle_timer.stop()
+        if self.predecrypt_task:
+            self.predecrypt_task.cancel()
+        clear_plaintext_cache()
+        super().hideEvent(event)
+
+    def append_passwords(self, password_list):
+        """Add the next page of a listing below the loaded rows."""
+        self.password_model.append_entries(password_list)
+        self.predecrypt_timer.start()
+
+    def start_live_updates(self, user_id):
+        """Apply changes made on other devices as they happen."""
+        if self.live_updates is None and REALTIME_ENABLED:
+            # The subscription calls back on its own thread
+            self.live_updates = PasswordSubscription(
+                user_id, self.password_changed.emit
+            ).start()
+
+    def stop_live_updates(self):
+        """End the realtime subscription."""
+        if self.live_updates is not None:
+            self.live_updates.stop()
+            self.live_updates = None
+
+    def apply_change(self, event, entry):
+        """Apply a realtime insert, update or delete to the model."""
+        if event == DELETE:
+            self.password_model.remove_entry(entry["id"])
+        else:
+            self.password_model.upsert_entry(entry)
+        self.predecrypt_timer.start()
+
+    def filter_passwords(self, text):
+        """Show only the entries whose service or username matches text."""
+        self.password_model.set_filter(text)
 
     def handle_view_click(self, row):
-        """Handle the View button click to fetch and decrypt password from Supabase."""
+        """Handle the View button click to decrypt the password of a row."""
+        row_entry = self.password_model.entry(row)
+
         # Check row bounds
-        if row < 0 or row >= self.rowCount():
+        if row_entry is None:
             QMessageBox.warning(self, "Error", "Invalid row selection.")
             return
 
-        # Validate cell items exist
-        if not self.item(row, 0) or not self.item(row, 1):
+        service = row_entry.get("service_name")
+        username = row_entry.get("username")
+
+        # Validate row data exists
+        if not service or not username:
             QMessageBox.warning(self, "Error", "Row data is incomplete.")
             return
 
-        service = self.item(row, 0).text()
-        username = self.item(row, 1).text()
+        # Ignore further clicks while a password is being loaded
+        if self.view_task:
+            return
 
-        # Check if this is an error row
-        if service == "Error" and "Failed to load" in username:
-            QMessageBox.warning(
-                self,
-                "Error",
-                "This entry failed to load properly and cannot be viewed.",
+        self.setCursor(Qt.BusyCursor)
+
+        # From the click until the dialog is on screen; the lookup's spans
+        # (key derivation, queries) nest under it
+        self.view_span = span("gui.view_password", row=row)
+        with use_span(self.view_span):
+            self.view_task = run_task(
+                decrypt_entry,
+                dict(row_entry),
+                on_finished=self.show_password,
+                on_failed=self.handle_view_error,
             )
+        self.view_task.signals.done.connect(self.finish_view_task)
+
+    def finish_view_task(self):
+        """Restore the cursor once the password lookup has ended."""
+        self.view_task = None
+        self.unsetCursor()
+
+        if self.view_span is not None:
+            self.view_span.end()
+            self.view_span = None
+
+    def handle_view_error(self, error):
+        """Report an unexpected error raised while loading a password."""
+        QMessageBox.critical(
+            self, "Error", f"Failed to retrieve password: {str(error)}"
+        )
+
+    def show_password(self, result):
+        """Open the password dialog with a decrypted entry."""
+        if not result["success"]:
+            if result.get("warning"):
+                QMessageBox.warning(self, result["title"], result["message"])
+            else:
+                QMessageBox.critical(self, result["title"], result["message"])
             return
 
-        QApplication.setOverrideCursor(Qt.WaitCursor)  # Show waiting cursor
-
+        # Create and show dialog
         try:
-            # First database call - get password
-            try:
-                response = (
-                    supabase.table("passwords")
-                    .select("encrypted_password, user_id")
-                    .eq("service_name", service)
-                    .eq("username", username)
-                    .single()
-                    .execute()
-                )
-            except TimeoutError:
-                QApplication.restoreOverrideCursor()
-                QMessageBox.critical(
-                    self,
-                    "Connection Error",
-                    "Database query timed out. Check your connection and try again.",
-                )
-                return
-            except supabase.PostgrestError as db_error:
-                QApplication.restoreOverrideCursor()
-                QMessageBox.critical(
-                    self, "Database Error", f"Database query failed: {str(db_error)}"
-                )
-                return
-            except Exception as query_error:
-                QApplication.restoreOverrideCursor()
-                QMessageBox.critical(
-                    self,
-                    "Query Error",
-                    f"Failed to retrieve password data: {str(query_error)}",
-                )
-                return
-
-            if not response or not response.data:
-                QApplication.restoreOverrideCursor()
-                QMessageBox.warning(
-                    self, "Not Found", "No password found for this service."
-                )
-                return
-
-            encrypted_password = response.data.get("encrypted_password")
-            user_id = response.data.get("user_id")
-
-            if not encrypted_password or not user_id:
-                QApplication.restoreOverrideCursor()
-                QMessageBox.critical(self, "Data Error", "Password data is incomplete.")
-                return
-
-            # Second database call - get encryption key
-            try:
-                key_response = (
-                    supabase.table("user_keys")
-                    .select("encryption_salt")
-                    .eq("user_id", user_id)
-                    .single()
-                    .execute()
-                )
-            except TimeoutError:
-                QApplication.restoreOverrideCursor()
-                QMessageBox.critical(
-                    self,
-                    "Connection Error",
-                    "Key retrieval timed out. Check your connection and try again.",
-                )
-                return
-            except supabase.PostgrestError as db_error:
-                QApplication.restoreOverrideCursor()
-                QMessageBox.critical(
-                    self,
-                    "Database Error",
-                    f"Failed to retrieve encryption key: {str(db_error)}",
-                )
-                return
-            except Exception as key_error:
-                QApplication.restoreOverrideCursor()
-                QMessageBox.critical(
-                    self,
-                    "Key Error",
-                    f"Failed to retrieve encryption key: {str(key_error)}",
-                )
-                return
-
-            if not key_response or not key_response.data:
-                QApplication.restoreOverrideCursor()
-                QMessageBox.critical(
-                    self, "Error", "Encryption key not found for user."
-                )
-                return
-
-            user_key = key_response.data.get("encryption_salt")
-
-            if not user_key:
-                QApplication.restoreOverrideCursor()
-                QMessageBox.critical(self, "Key Error", "Invalid encryption key.")
-                return
-
-            # Decrypt password
-            try:
-                decrypted_password = decrypt_password(encrypted_password, user_key)
-
-                if not decrypted_password:
-                    QApplication.restoreOverrideCursor()
-                    QMessageBox.critical(
-                        self, "Decryption Error", "Failed to decrypt password."
-                    )
-                    return
-            except Exception as decrypt_error:
-                QApplication.restoreOverrideCursor()
-                QMessageBox.critical(
-                    self,
-                    "Decryption Error",
-                    f"Failed to decrypt password: {str(decrypt_error)}",
-                )
-                return
-
-            QApplication.restoreOverrideCursor()  # Restore cursor
-
-            # Create and show dialog
-            try:
+            with use_span(self.view_span), span("gui.render_password_dialog"):
                 dialog = UpdatePasswordDialog(
-                    user_id, service, username, decrypted_password, row, self
-                )
-
-                if (
-                    dialog.exec_() == QDialog.Accepted
-                    and dialog.updated_service
-                    and dialog.updated_username
-                ):
-                    service_item = QTableWidgetItem(dialog.updated_service)
-                    username_item = QTableWidgetItem(dialog.updated_username)
-
-                    # Make cells non-editable
-                    service_item.setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)
-                    username_item.setFlags(Qt.ItemIsSelectable | Qt.ItemIsEnabled)
-
-                    self.setItem(row, 0, service_item)
-                    self.setItem(row, 1, username_item)
-            except Exception as dialog_error:
-                QMessageBox.critical(
+                    result["user_id"],
+                    result["entry_id"],
+                    result["service"],
+                    result["username"],
+                    result["password"],
                     self,
-                    "Dialog Error",
-                    f"Failed to open password dialog: {str(dialog_error)}",
                 )
 
-        except Exception as e:
-            QApplication.restoreOverrideCursor()  # Ensure cursor is restored
+            # The time the dialog stays open is not part of the view
+            if self.view_span is not None:
+                self.view_span.end()
+
+            # Rows may have moved while the dialog was open (realtime changes,
+            # filtering), so the change is applied by id
+            if dialog.exec_() == QDialog.Accepted and dialog.updated_entry:
+                self.password_model.upsert_entry(dialog.updated_entry)
+        except Exception as dialog_error:
             QMessageBox.critical(
-                self, "Error", f"Failed to retrieve password: {str(e)}"
+                self,
+                "Dialog Error",
+                f"Failed to open password dialog: {str(dialog_error)}",
             )
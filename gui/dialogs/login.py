@@ -3,7 +3,9 @@ from PyQt5.QtWidgets import (QDialog, QLabel, QLineEdit, QMessageBox,
 
 from gui.dialogs.password_reset import PasswordResetDialog
 from gui.dialogs.signup import SignUpDialog
-from modules.auth import log_in
+from gui.tasks import run_task
+from modules.auth import log_in, log_out
+from modules.session import current_session
 
 
 class LoginDialog(QDialog):
@@ -42,6 +44,8 @@ class LoginDialog(QDialog):
 
         self.setLayout(layout)
 
+        self.login_task = None
+
     def authenticate_user(self):
         """Authenticate the user with Supabase."""
         try:
@@ -62,23 +66,43 @@ class LoginDialog(QDialog):
                 )
                 return
 
-            try:
-                response = log_in(email, password)
+            # PBKDF2 and the auth requests run off the UI thread
+            self.login_button.setEnabled(False)
+            self.login_task = run_task(
+                log_in,
+                email,
+                password,
+                on_finished=self.handle_login_response,
+                on_failed=self.handle_login_error,
+                on_cancelled=self.handle_login_cancelled,
+                cancellable=True,
+            )
+            self.login_task.signals.done.connect(
+                lambda: self.login_button.setEnabled(True)
+            )
 
-            except TimeoutError:
-                QMessageBox.critical(
-                    self,
-                    "Connection Error",
-                    "Authentication service timed out. Please try again later.",
-                )
-                return
+        except Exception as e:
+            QMessageBox.critical(
+                self, "System Error", f"An unexpected error occurred: {str(e)}"
+            )
 
-            except Exception as auth_error:
-                QMessageBox.critical(
-                    self, "Authentication Error", f"Login failed: {str(auth_error)}"
-                )
-                return
+    def handle_login_error(self, auth_error):
+        """Report an exception raised while logging in."""
+        if isinstance(auth_error, TimeoutError):
+            QMessageBox.critical(
+                self,
+                "Connection Error",
+                "Authentication service timed out. Please try again later.",
+            )
+            return
+
+        QMessageBox.critical(
+            self, "Authentication Error", f"Login failed: {str(auth_error)}"
+        )
 
+    def handle_login_response(self, response):
+        """Close the dialog on success or report why the login failed."""
+        try:
             if not isinstance(response, dict):
                 QMessageBox.critical(
                     self,
@@ -110,6 +134,17 @@ class LoginDialog(QDialog):
                 self, "System Error", f"An unexpected error occurred: {str(e)}"
             )
 
+    def handle_login_cancelled(self):
+        """Sign out again if a dropped login got as far as starting a session."""
+        if current_session.is_active:
+            run_task(log_out)
+
+    def reject(self):
+        """Close the dialog, dropping a login that is still in progress."""
+        if self.login_task:
+            self.login_task.cancel()
+        super().reject()
+
     def open_signup_dialog(self):
         """Open the SignUpDialog when the user clicks Sign Up."""
         try:
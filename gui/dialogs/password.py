@@ -1,14 +1,195 @@
 from PyQt5.QtWidgets import (QApplication, QDialog, QLabel, QLineEdit,
                              QMessageBox, QPushButton, QVBoxLayout)
 
+from gui.tasks import run_task
+from modules.accounting import accounted
 from modules.supabase_client import supabase
-from modules.utils import (add_password, encrypt_password, generate_password,
-                           get_user_id)
+from modules.utils import (add_password, delete_password, encrypt_password,
+                           generate_password, get_user_id, get_user_key,
+                           update_password)
+
+
+@accounted("add")
+def store_new_password(service, username, password):
+    """Encrypt and insert a new entry; runs on a worker thread."""
+    try:
+        user_id = get_user_id()
+        if isinstance(user_id, dict):
+            return {
+                "success": False,
+                "title": "Error",
+                "message": "Authentication failed",
+            }
+
+        try:
+            result = add_password(service, username, password)
+        except supabase.PostgrestError as db_error:
+            return {
+                "success": False,
+                "title": "Database Error",
+                "message": f"Database connection failed: {str(db_error)}",
+            }
+        except TimeoutError:
+            return {
+                "success": False,
+                "title": "Connection Error",
+                "message": "Database connection timed out. Please try again.",
+            }
+
+        if "success" in result.lower():
+            return {"success": True, "service": service}
+
+        return {
+            "success": False,
+            "title": "Error",
+            "message": f"Failed to add password: {result}",
+        }
+
+    except Exception as e:
+        return {
+            "success": False,
+            "title": "Error",
+            "message": f"Failed to add password: {str(e)}",
+        }
+
+
+@accounted("update")
+def store_updated_password(user_id, entry_id, new_service, new_username, new_password):
+    """Encrypt and save an edited entry; runs on a worker thread."""
+    try:
+        # Encryption key comes from the session, not the database
+        user_key = get_user_key(user_id)
+
+        if isinstance(user_key, dict):
+            return {
+                "success": False,
+                "warning": True,
+                "title": "Error",
+                "message": user_key["message"],
+            }
+
+        try:
+            encrypted_password = encrypt_password(new_password, user_key)
+            if (
+                not encrypted_password or len(encrypted_password) < 10
+            ):  # Assuming encrypted passwords have minimum length
+                return {
+                    "success": False,
+                    "warning": True,
+                    "title": "Encryption Error",
+                    "message": "Password encryption failed. Please try again.",
+                }
+        except Exception as encrypt_error:
+            return {
+                "success": False,
+                "title": "Encryption Error",
+                "message": f"Failed to encrypt password: {str(encrypt_error)}",
+            }
+
+        try:
+            updated_rows = update_password(
+                user_id, entry_id, new_service, new_username, encrypted_password
+            )
+        except TimeoutError:
+            return {
+                "success": False,
+                "title": "Connection Error",
+                "message": "Database update timed out. Please try again.",
+            }
+        except supabase.PostgrestError as db_error:
+            return {
+                "success": False,
+                "title": "Database Error",
+                "message": f"Failed to update password: {str(db_error)}",
+            }
+
+        if not updated_rows:
+            return {
+                "success": False,
+                "warning": True,
+                "title": "Warning",
+                "message": "Update may not have been successful. Please verify.",
+            }
+
+        return {"success": True, "entry": updated_rows[0]}
+
+    except Exception as e:
+        return {
+            "success": False,
+            "title": "Error",
+            "message": f"Failed to update password: {str(e)}",
+        }
+
+
+@accounted("delete")
+def remove_password(user_id, entry_id):
+    """Delete an entry; runs on a worker thread."""
+    try:
+        try:
+            deleted_rows = delete_password(user_id, entry_id)
+        except TimeoutError:
+            return {
+                "success": False,
+                "title": "Connection Error",
+                "message": "Database deletion timed out. Please try again.",
+            }
+        except supabase.PostgrestError as db_error:
+            return {
+                "success": False,
+                "title": "Database Error",
+                "message": f"Failed to delete from database: {str(db_error)}",
+            }
+
+        # Verify deletion was successful by checking response
+        if not deleted_rows:
+            return {
+                "success": False,
+                "warning": True,
+                "title": "Warning",
+                "message": "Password may not have been deleted. Please verify.",
+            }
+
+        return {"success": True}
+
+    except Exception as e:
+        return {
+            "success": False,
+            "title": "Error",
+            "message": f"Failed to delete password: {str(e)}",
+        }
 
 
 class BasePasswordDialog(QDialog):
     """Base class for password dialogs with shared functionalities."""
 
+    task = None  # Request running in the background, if any
+
+    def run_request(self, fn, *args, on_finished):
+        """Run a Supabase request off the UI thread with the buttons disabled."""
+        self.set_buttons_enabled(False)
+        self.task = run_task(
+            fn, *args, on_finished=on_finished, on_failed=self.handle_request_error
+        )
+        self.task.signals.done.connect(self.finish_request)
+
+    def finish_request(self):
+        self.task = None
+        self.set_buttons_enabled(True)
+
+    def set_buttons_enabled(self, enabled):
+        for button in self.action_buttons:
+            button.setEnabled(enabled)
+
+    def handle_request_error(self, error):
+        """Report an unexpected error raised by a background request."""
+        QMessageBox.critical(self, "Error", f"Request failed: {str(error)}")
+
+    def reject(self):
+        """Close the dialog, dropping the result of a request still running."""
+        if self.task:
+            self.task.cancel()
+        super().reject()
+
     @staticmethod
     def add_generated_password(password_input):
         """Generate a random password and set it in the input field."""
@@ -63,6 +244,8 @@ class AddPasswordDialog(BasePasswordDialog):
 
         self.setLayout(layout)
 
+        self.action_buttons = [self.save_button]
+
         # Button connections
         self.save_button.clicked.connect(self.save_password)
         self.generate_button.clicked.connect(
@@ -79,59 +262,45 @@ class AddPasswordDialog(BasePasswordDialog):
             QMessageBox.warning(self, "Error", "All fields are required.")
             return
 
-        try:
-            user_id = get_user_id()
-            if not user_id:
-                QMessageBox.critical(self, "Error", "Authentication failed")
-                return
-
-            try:
-                result = add_password(service, username, password)
-            except supabase.PostgrestError as db_error:
-                QMessageBox.critical(
-                    self,
-                    "Database Error",
-                    f"Database connection failed: {str(db_error)}",
-                )
-                return
-            except TimeoutError:
-                QMessageBox.critical(
-                    self,
-                    "Connection Error",
-                    "Database connection timed out. Please try again.",
-                )
-                return
-
-            if "success" in result.lower():
-                QMessageBox.information(
-                    self, "Success", f"Password for {service} added."
-                )
-                self.close()
-            else:
-                QMessageBox.critical(self, "Error", f"Failed to add password: {result}")
+        self.run_request(
+            store_new_password,
+            service,
+            username,
+            password,
+            on_finished=self.handle_save_result,
+        )
 
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Failed to add password: {str(e)}")
+    def handle_save_result(self, result):
+        if result["success"]:
+            QMessageBox.information(
+                self, "Success", f"Password for {result['service']} added."
+            )
+            self.close()
+        else:
+            QMessageBox.critical(self, result["title"], result["message"])
 
 
 class UpdatePasswordDialog(BasePasswordDialog):
     """Dialog for viewing, updating, and deleting a password."""
 
     def __init__(
-        self, user_id, service, username, encrypted_password, row, parent_table
+        self,
+        user_id,
+        entry_id,
+        service,
+        username,
+        encrypted_password,
+        parent_table,
     ):
         super().__init__()
         self.setWindowTitle("Update Password")
         self.setGeometry(300, 300, 400, 300)
 
         self.user_id = user_id
-        self.row = row
+        self.entry_id = entry_id
         self.parent_table = parent_table
-        self.original_service = service
-        self.original_username = username
 
-        self.updated_service = None
-        self.updated_username = None
+        self.updated_entry = None  # Row returned by Supabase after an update
 
         layout = QVBoxLayout()
 
@@ -173,6 +342,8 @@ class UpdatePasswordDialog(BasePasswordDialog):
 
         self.setLayout(layout)
 
+        self.action_buttons = [self.update_button, self.delete_button]
+
         # Button connections
         self.generate_button.clicked.connect(
             lambda: self.add_generated_password(self.password_input)
@@ -219,112 +390,28 @@ class UpdatePasswordDialog(BasePasswordDialog):
             QMessageBox.warning(self, "Error", "All fields are required.")
             return
 
-        try:
-            # First try to get the encryption key with timeout handling
-            try:
-                response = (
-                    supabase.table("user_keys")
-                    .select("encryption_salt")
-                    .eq("user_id", self.user_id)
-                    .single()
-                    .execute()
-                )
-                if not response.data:
-                    QMessageBox.warning(
-                        self, "Error", "Encryption key not found for this user."
-                    )
-                    return
-            except TimeoutError:
-                QMessageBox.critical(
-                    self,
-                    "Connection Error",
-                    "Database connection timed out. Please try again.",
-                )
-                return
-            except supabase.PostgrestError as db_error:
-                QMessageBox.critical(
-                    self, "Database Error", f"Failed to query database: {str(db_error)}"
-                )
-                return
-            except Exception as key_error:
-                QMessageBox.critical(
-                    self,
-                    "Error",
-                    f"Failed to retrieve encryption key: {str(key_error)}",
-                )
-                return
-
-            user_key = response.data["encryption_salt"]
-
-            try:
-                encrypted_password = encrypt_password(new_password, user_key)
-                if (
-                    not encrypted_password or len(encrypted_password) < 10
-                ):  # Assuming encrypted passwords have minimum length
-                    QMessageBox.warning(
-                        self,
-                        "Encryption Error",
-                        "Password encryption failed. Please try again.",
-                    )
-                    return
-            except Exception as encrypt_error:
-                QMessageBox.critical(
-                    self,
-                    "Encryption Error",
-                    f"Failed to encrypt password: {str(encrypt_error)}",
-                )
-                return
-
-            try:
-                response = (
-                    supabase.table("passwords")
-                    .update(
-                        {
-                            "service_name": new_service,
-                            "username": new_username,
-                            "encrypted_password": encrypted_password,
-                        }
-                    )
-                    .eq("user_id", self.user_id)
-                    .eq("service_name", self.original_service)
-                    .eq("username", self.original_username)
-                    .execute()
-                )
+        self.run_request(
+            store_updated_password,
+            self.user_id,
+            self.entry_id,
+            new_service,
+            new_username,
+            new_password,
+            on_finished=self.handle_update_result,
+        )
 
-                if not response or not response.data:
-                    QMessageBox.warning(
-                        self,
-                        "Warning",
-                        "Update may not have been successful. Please verify.",
-                    )
-                    return
+    def handle_update_result(self, result):
+        if not result["success"]:
+            if result.get("warning"):
+                QMessageBox.warning(self, result["title"], result["message"])
+            else:
+                QMessageBox.critical(self, result["title"], result["message"])
+            return
 
-                self.updated_service = new_service
-                self.updated_username = new_username
+        self.updated_entry = result["entry"]
 
-                QMessageBox.information(
-                    self, "Success", "Password updated successfully."
-                )
-                self.accept()
-            except TimeoutError:
-                QMessageBox.critical(
-                    self,
-                    "Connection Error",
-                    "Database update timed out. Please try again.",
-                )
-            except supabase.PostgrestError as db_error:
-                QMessageBox.critical(
-                    self,
-                    "Database Error",
-                    f"Failed to update password: {str(db_error)}",
-                )
-            except Exception as update_error:
-                QMessageBox.critical(
-                    self, "Error", f"Failed to update password: {str(update_error)}"
-                )
-
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Failed to update password: {str(e)}")
+        QMessageBox.information(self, "Success", "Password updated successfully.")
+        self.accept()
 
     def delete_password(self):
         """Delete the password entry from Supabase."""
@@ -337,61 +424,35 @@ class UpdatePasswordDialog(BasePasswordDialog):
         )
 
         if confirm == QMessageBox.Yes:
-            try:
-                try:
-                    response = (
-                        supabase.table("passwords")
-                        .delete()
-                        .eq("user_id", self.user_id)
-                        .eq("service_name", self.original_service)
-                        .eq("username", self.original_username)
-                        .execute()
-                    )
-
-                    # Verify deletion was successful by checking response
-                    if not response or not response.data:
-                        QMessageBox.warning(
-                            self,
-                            "Warning",
-                            "Password may not have been deleted. Please verify.",
-                        )
-                        return
-                except TimeoutError:
-                    QMessageBox.critical(
-                        self,
-                        "Connection Error",
-                        "Database deletion timed out. Please try again.",
-                    )
-                    return
-                except supabase.PostgrestError as db_error:
-                    QMessageBox.critical(
-                        self,
-                        "Database Error",
-                        f"Failed to delete from database: {str(db_error)}",
-                    )
-                    return
-
-                try:
-                    # Remove the row from the table
-                    self.parent_table.removeRow(self.row)
-                except Exception as ui_error:
-                    QMessageBox.warning(
-                        self,
-                        "UI Error",
-                        f"Password was deleted but UI update failed: {str(ui_error)}",
-                    )
-                    self.accept()
-                    return
-
-                QMessageBox.information(
-                    self, "Deleted", "Password deleted successfully."
-                )
-                self.accept()
+            self.run_request(
+                remove_password,
+                self.user_id,
+                self.entry_id,
+                on_finished=self.handle_delete_result,
+            )
 
-            except Exception as e:
-                QMessageBox.critical(
-                    self, "Error", f"Failed to delete password: {str(e)}"
-                )
+    def handle_delete_result(self, result):
+        if not result["success"]:
+            if result.get("warning"):
+                QMessageBox.warning(self, result["title"], result["message"])
+            else:
+                QMessageBox.critical(self, result["title"], result["message"])
+            return
+
+        try:
+            # Remove the entry from the table, wherever it is shown by now
+            self.parent_table.password_model.remove_entry(self.entry_id)
+        except Exception as ui_error:
+            QMessageBox.warning(
+                self,
+                "UI Error",
+                f"Password was deleted but UI update failed: {str(ui_error)}",
+            )
+            self.accept()
+            return
+
+        QMessageBox.information(self, "Deleted", "Password deleted successfully.")
+        self.accept()
 
 
 if __name__ == "__main__":
@@ -3,6 +3,7 @@ import re
 from PyQt5.QtWidgets import (QDialog, QLabel, QLineEdit, QMessageBox,
                              QPushButton, QVBoxLayout)
 
+from gui.tasks import run_task
 from modules.auth import sign_up
 
 
@@ -38,6 +39,8 @@ class SignUpDialog(QDialog):
 
         self.setLayout(layout)
 
+        self.signup_task = None
+
     def handle_signup(self):
         email = self.email_input.text().strip()
         password = self.password_input.text().strip()
@@ -70,16 +73,33 @@ class SignUpDialog(QDialog):
             )
             return
 
-        try:
-            result = sign_up(email, password)
-            if (
-                not isinstance(result, dict)
-                or "success" not in result
-                or "message" not in result
-            ):
-                raise ValueError("Unexpected response from sign-up function.")
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Sign-up failed: {str(e)}")
+        # KDF calibration and the auth requests run off the UI thread
+        self.signup_button.setEnabled(False)
+        self.signup_task = run_task(
+            sign_up,
+            email,
+            password,
+            on_finished=self.handle_signup_response,
+            on_failed=self.handle_signup_error,
+        )
+        self.signup_task.signals.done.connect(
+            lambda: self.signup_button.setEnabled(True)
+        )
+
+    def handle_signup_error(self, error):
+        """Report an exception raised while signing up."""
+        QMessageBox.critical(self, "Error", f"Sign-up failed: {str(error)}")
+
+    def handle_signup_response(self, result):
+        """Close the dialog on success or report why the sign-up failed."""
+        if (
+            not isinstance(result, dict)
+            or "success" not in result
+            or "message" not in result
+        ):
+            self.handle_signup_error(
+                ValueError("Unexpected response from sign-up function.")
+            )
             return
 
         if result["success"]:
@@ -1,21 +1,24 @@
 import json
+import multiprocessing
 import sys
 from io import BytesIO
 
-import qrcode
 from components.password_table import PasswordTable
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QImage, QPixmap
 from PyQt5.QtWidgets import (QApplication, QDialog, QFileDialog, QLabel,
-                             QMainWindow, QMessageBox, QPushButton,
-                             QVBoxLayout, QWidget)
+                             QLineEdit, QMainWindow, QMessageBox,
+                             QProgressDialog, QPushButton, QVBoxLayout,
+                             QWidget)
 
 from gui.dialogs.login import LoginDialog
 from gui.dialogs.password import AddPasswordDialog
+from gui.tasks import run_task
 from modules.auth import get_current_user, log_out
 from modules.supabase_client import supabase
-from modules.utils import (decrypt_password, export_passwords, get_user_id,
-                           import_passwords, list_passwords)
+from modules.utils import (decrypt_many, export_passwords, get_user_id,
+                           get_user_key, list_password_pages,
+                           restore_passwords, start_vault_migration)
 
 
 class QRCodeDialog(QDialog):
@@ -38,6 +41,8 @@ class QRCodeDialog(QDialog):
 
     def display_qr_code(self, data):
         """Generate QR code and display it dynamically."""
+        import qrcode  # Only needed once a QR code is shown
+
         qr = qrcode.QRCode(
             version=1,
             error_correction=qrcode.constants.ERROR_CORRECT_L,
@@ -106,6 +111,12 @@ class MainWindow(QMainWindow):
         self.qr_button.clicked.connect(self.show_qr_code)
         self.logout_button.clicked.connect(self.handle_logout)
 
+        # Upgrade legacy ciphertexts without blocking the UI
+        self.migration_thread = start_vault_migration()
+
+        self.list_task = None
+        self.password_table = None
+
     def handle_logout(self):
         """Logs out the user and returns to the login screen."""
         try:
@@ -117,14 +128,38 @@ class MainWindow(QMainWindow):
         except Exception as e:
             QMessageBox.critical(self, "Logout Error", f"Failed to log out: {str(e)}")
 
+    def run_with_progress(self, label, fn, *args, on_finished, progress_text=None):
+        """
+        Run `fn` in the background behind a cancellable progress dialog.
+
+        `progress_text(*args)` turns the function's progress reports into the
+        text shown in the dialog.
+        """
+        progress = QProgressDialog(label, "Cancel", 0, 0, self)
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setMinimumDuration(0)
+
+        def handle_progress(*args):
+            progress.setLabelText(progress_text(*args))
+
+        def handle_failure(error):
+            QMessageBox.critical(self, "Error", f"{label} failed: {str(error)}")
+
+        task = run_task(
+            fn,
+            *args,
+            on_finished=on_finished,
+            on_failed=handle_failure,
+            on_progress=handle_progress if progress_text else None,
+            on_cancelled=lambda: self.status_label.setText(f"{label} cancelled"),
+        )
+        progress.canceled.connect(task.cancel)
+        task.signals.done.connect(progress.reset)
+        progress.show()
+        return task
+
     def show_qr_code(self):
         """Show QR Code dialog with stored passwords with encryption option."""
-        user_id = get_user_id()
-
-        if not user_id:
-            QMessageBox.critical(self, "Error", "No authenticated user found.")
-            return
-
         reply = QMessageBox.question(
             self,
             "Encrypt Export?",
@@ -133,42 +168,18 @@ class MainWindow(QMainWindow):
             QMessageBox.No,
         )
 
-        if reply == QMessageBox.Yes:
-            response = (
-                supabase.table("passwords")
-                .select("service_name, username, encrypted_password")
-                .eq("user_id", user_id)
-                .execute()
-            )
-        else:
-            key_response = (
-                supabase.table("user_keys")
-                .select("encryption_salt")
-                .eq("user_id", user_id)
-                .single()
-                .execute()
-            )
-
-            if not key_response.data or "encryption_salt" not in key_response.data:
-                QMessageBox.critical(
-                    self, "Encryption Error", "Could not retrieve encryption key."
-                )
-                return
-
-            user_key = key_response.data["encryption_salt"]
-
-            response = (
-                supabase.table("passwords")
-                .select(f"service_name, username, encrypted_password")
-                .eq("user_id", user_id)
-                .execute()
-            )
-
-            encrypted_password = response.data[0]["encrypted_password"]
-            decrypted_password = decrypt_password(encrypted_password, user_key)
-            response.data[0]["encrypted_password"] = decrypted_password
+        self.run_with_progress(
+            "Loading passwords",
+            fetch_qr_entries,
+            reply != QMessageBox.Yes,
+            on_finished=self.display_qr_entries,
+        )
 
-        passwords = response.data if response.data else []
+    def display_qr_entries(self, passwords):
+        """Show the loaded entries as a QR code."""
+        if isinstance(passwords, dict):
+            QMessageBox.critical(self, passwords["title"], passwords["message"])
+            return
 
         try:
             qr_data = json.dumps(passwords)
@@ -189,28 +200,38 @@ class MainWindow(QMainWindow):
         dialog.exec_()
 
     def display_passwords(self):
-        """Display a table of stored passwords."""
-        try:
-            password_list = list_passwords()
+        """Display a table of stored passwords, filling it page by page."""
+        # Ignore further clicks while a listing is being loaded
+        if self.list_task:
+            return
 
+        self.password_table = None
+        self.setCursor(Qt.BusyCursor)
+        self.list_task = run_task(
+            load_password_pages,
+            on_progress=self.show_password_page,
+            on_finished=self.finish_password_list,
+            on_failed=lambda error: QMessageBox.critical(
+                self, "Error", f"Failed to retrieve passwords: {str(error)}"
+            ),
+        )
+        self.list_task.signals.done.connect(self.finish_list_task)
+
+    def show_password_page(self, password_list):
+        """Show the first page in a new table, append later ones to it."""
+        # Pages still queued when the table was closed are dropped
+        if self.list_task is None or self.list_task.is_cancelled:
+            return
+
+        try:
             if not isinstance(password_list, list):
                 raise ValueError("Unexpected data format received.")
 
-            if not password_list:
-                QMessageBox.information(
-                    self, "No Passwords", "No passwords stored yet."
-                )
+            if self.password_table is not None:
+                self.password_table.append_passwords(password_list)
                 return
 
-            dialog = QDialog(self)
-            dialog.setWindowTitle("Stored Passwords")
-            dialog.setGeometry(200, 200, 600, 400)
-
-            layout = QVBoxLayout(dialog)
-            table = PasswordTable(password_list)
-            layout.addWidget(table)
-            dialog.setLayout(layout)
-            dialog.exec_()
+            self.show_password_list(password_list)
 
         except ValueError as ve:
             QMessageBox.critical(self, "Data Error", f"Invalid data format: {str(ve)}")
@@ -219,6 +240,51 @@ class MainWindow(QMainWindow):
                 self, "Error", f"Failed to retrieve passwords: {str(e)}"
             )
 
+    def show_password_list(self, password_list):
+        """Open the password table while the rest of the list loads."""
+        self.unsetCursor()
+
+        dialog = QDialog(self)
+        dialog.setWindowTitle("Stored Passwords")
+        dialog.setGeometry(200, 200, 600, 400)
+        dialog.setAttribute(Qt.WA_DeleteOnClose)
+
+        layout = QVBoxLayout(dialog)
+        table = PasswordTable(password_list)
+
+        search_input = QLineEdit()
+        search_input.setPlaceholderText("Search services and usernames")
+        search_input.setClearButtonEnabled(True)
+        search_input.textChanged.connect(table.filter_passwords)
+
+        layout.addWidget(search_input)
+        layout.addWidget(table)
+        dialog.setLayout(layout)
+
+        # Closing the table stops loading the remaining pages
+        task = self.list_task
+        dialog.finished.connect(lambda: task and task.cancel())
+
+        # Edits made on other devices show up while the table is open
+        table.start_live_updates(self.user_id)
+        dialog.finished.connect(table.stop_live_updates)
+
+        self.password_table = table
+        dialog.show()
+
+    def finish_password_list(self, result):
+        """Report an empty or failed listing once every page has loaded."""
+        if isinstance(result, str):
+            QMessageBox.critical(self, "Data Error", f"Invalid data format: {result}")
+        elif not result:
+            QMessageBox.information(self, "No Passwords", "No passwords stored yet.")
+
+    def finish_list_task(self):
+        """Restore the cursor once the listing has ended."""
+        self.list_task = None
+        self.password_table = None
+        self.unsetCursor()
+
     def handle_import(self):
         """Handle the import process."""
         try:
@@ -226,16 +292,24 @@ class MainWindow(QMainWindow):
                 self,
                 "Select Backup File",
                 "backup",
-                "Text Files (*.txt);;All Files (*)",
+                "Backup Files (*.jsonl *.txt);;All Files (*)",
             )
             if not selected_file:
                 return
 
-            result = import_passwords(selected_file)
-            QMessageBox.information(self, "Import Status", result)
+            # Full backups are restored together with their incremental exports
+            self.run_with_progress(
+                "Importing passwords",
+                restore_passwords,
+                selected_file,
+                on_finished=lambda result: QMessageBox.information(
+                    self, "Import Status", result
+                ),
+                progress_text=lambda imported, processed: (
+                    f"Imported {imported} of {processed} accounts..."
+                ),
+            )
 
-        except FileNotFoundError:
-            QMessageBox.warning(self, "Import Error", "File not found.")
         except Exception as e:
             QMessageBox.critical(self, "Import Error", f"Failed to import: {str(e)}")
 
@@ -250,16 +324,71 @@ class MainWindow(QMainWindow):
                 QMessageBox.No,
             )
 
-            if reply == QMessageBox.Yes:
-                result = export_passwords()
-            else:
-                result = export_passwords(decrypt=True)
-
-            QMessageBox.information(self, "Export Status", result)
+            self.run_with_progress(
+                "Exporting passwords",
+                export_passwords,
+                None if reply == QMessageBox.Yes else True,
+                on_finished=lambda result: QMessageBox.information(
+                    self, "Export Status", result
+                ),
+                progress_text=lambda exported: f"Exported {exported} accounts...",
+            )
         except Exception as e:
             QMessageBox.critical(self, "Export Error", f"Failed to export: {str(e)}")
 
 
+def load_password_pages(progress_callback):
+    """
+    Report the password list page by page; runs on a worker thread.
+
+    Returns the number of entries listed, or an error message.
+    """
+    pages = list_password_pages()
+
+    if isinstance(pages, str):
+        return pages
+
+    count = 0
+    for page in pages:
+        count += len(page)
+        progress_callback(page)
+
+    return count
+
+
+def fetch_qr_entries(decrypt):
+    """Load the entries for the QR export; runs on a worker thread."""
+    user_id = get_user_id()
+
+    if isinstance(user_id, dict):
+        return {"title": "Error", "message": "No authenticated user found."}
+
+    response = (
+        supabase.table("passwords")
+        .select("service_name, username, encrypted_password")
+        .eq("user_id", user_id)
+        .execute()
+    )
+    passwords = response.data if response.data else []
+
+    if decrypt:
+        user_key = get_user_key(user_id)
+
+        if isinstance(user_key, dict):
+            return {
+                "title": "Encryption Error",
+                "message": "Could not retrieve encryption key.",
+            }
+
+        decrypted_passwords = decrypt_many(
+            [entry["encrypted_password"] for entry in passwords], user_key
+        )
+        for entry, decrypted_password in zip(passwords, decrypted_passwords):
+            entry["encrypted_password"] = decrypted_password
+
+    return passwords
+
+
 def main():
     """Application entry point."""
     try:
@@ -292,4 +421,5 @@ def main():
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # Bulk decryption workers in frozen builds
     main()
@@ -0,0 +1,124 @@
+import contextvars
+import threading
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+# Tasks started and not yet reported back to the UI thread. PyQt does not keep
+# a QRunnable alive on its own, so the reference is held here.
+_running = set()
+
+
+class TaskCancelled(Exception):
+    """Raised inside a task's progress callback once the task is cancelled."""
+
+
+class TaskSignals(QObject):
+    """Signals of a background task, delivered on the UI thread."""
+
+    finished = pyqtSignal(object)  # Return value of the function
+    failed = pyqtSignal(object)  # Exception raised by the function
+    progress = pyqtSignal(object)  # Arguments passed to the progress callback
+    cancelled = pyqtSignal()
+    done = pyqtSignal()  # Emitted last, whatever the outcome
+
+
+class Task(QRunnable):
+    """
+    Run a blocking function (network, PBKDF2, file I/O) on the thread pool.
+
+    With `progress=True` the function gets a `progress_callback` keyword
+    argument; each call is forwarded through the `progress` signal and raises
+    TaskCancelled once cancel() was called, stopping long imports and exports
+    between batches. Results of a cancelled task are dropped.
+    """
+
+    def __init__(self, fn, *args, progress=False, **kwargs):
+        super().__init__()
+        self.setAutoDelete(False)
+
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = TaskSignals()
+        self._cancelled = threading.Event()
+
+        # Run in a copy of the caller's context, so e.g. tracing spans
+        # started by the task nest under the span that started it
+        self.context = contextvars.copy_context()
+
+        if progress:
+            self.kwargs["progress_callback"] = self._report_progress
+
+    @property
+    def is_cancelled(self):
+        """Checks if cancel() has been called."""
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        """Ask the task to stop; it is never reported as finished afterwards."""
+        self._cancelled.set()
+
+    def _report_progress(self, *args):
+        if self.is_cancelled:
+            raise TaskCancelled()
+        self.signals.progress.emit(args)
+
+    def run(self):
+        try:
+            if self.is_cancelled:
+                self.signals.cancelled.emit()
+                return
+
+            try:
+                result = self.context.run(self.fn, *self.args, **self.kwargs)
+            except Exception as e:
+                if self.is_cancelled or isinstance(e, TaskCancelled):
+                    self.signals.cancelled.emit()
+                else:
+                    self.signals.failed.emit(e)
+                return
+
+            if self.is_cancelled:
+                self.signals.cancelled.emit()
+            else:
+                self.signals.finished.emit(result)
+        finally:
+            self.signals.done.emit()
+
+
+def run_task(
+    fn,
+    *args,
+    on_finished=None,
+    on_failed=None,
+    on_progress=None,
+    on_cancelled=None,
+    cancellable=False,
+    pool=None,
+    priority=0,
+    **kwargs,
+):
+    """
+    Start `fn(*args, **kwargs)` in the background and return its Task.
+
+    The callbacks run on the UI thread. `on_progress` receives the arguments
+    the function passed to its progress callback. With `cancellable`, the
+    function gets a progress callback even without `on_progress`, so cancel()
+    can stop it. Tasks with a higher `priority` are started first.
+    """
+    task = Task(fn, *args, progress=on_progress is not None or cancellable, **kwargs)
+
+    if on_finished:
+        task.signals.finished.connect(on_finished)
+    if on_failed:
+        task.signals.failed.connect(on_failed)
+    if on_progress:
+        task.signals.progress.connect(lambda args: on_progress(*args))
+    if on_cancelled:
+        task.signals.cancelled.connect(on_cancelled)
+
+    _running.add(task)
+    task.signals.done.connect(lambda: _running.discard(task))
+
+    (pool or QThreadPool.globalInstance()).start(task, priority)
+    return task
@@ -0,0 +1,201 @@
+import contextvars
+import functools
+import logging
+import os
+import threading
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# Most Supabase requests a logical operation may make once the session is
+# warm (identity and key cached); None only counts. Import and export grow
+# with the vault, so their callers declare a budget if they want one.
+REQUEST_BUDGETS = {
+    "add": 1,
+    "view": 1,
+    "update": 1,
+    "delete": 1,
+    "import": None,
+    "export": None,
+}
+
+# What happens when an operation goes over its budget: "off", "warn" (log a
+# warning) or "raise" (raise RequestBudgetExceeded, for tests)
+BUDGET_MODE = os.getenv("PASSWORD_MANAGER_REQUEST_BUDGETS", "warn")
+
+_current = contextvars.ContextVar("current_operation", default=None)
+
+
+class RequestBudgetExceeded(Exception):
+    """An operation made more Supabase requests than its budget allows."""
+
+    def __init__(self, operation):
+        self.operation = operation
+        super().__init__(
+            f"{operation.name} made {operation.total} Supabase requests, "
+            f"budget {operation.budget}: {operation.describe()}"
+        )
+
+
+class Operation:
+    """
+    Counts the Supabase requests of one logical operation.
+
+    Use it as a context manager. Requests made inside a nested operation
+    count toward the enclosing ones as well; a nested operation of the same
+    name joins the enclosing one instead.
+    """
+
+    def __init__(self, name, budget=None):
+        self.name = name
+        self.budget = budget
+        self.requests = Counter()  # (kind, target) -> count
+        self.parent = None
+        self._lock = threading.Lock()
+        self._token = None
+
+    @property
+    def total(self):
+        return sum(self.requests.values())
+
+    @property
+    def over_budget(self):
+        return self.budget is not None and self.total > self.budget
+
+    def describe(self):
+        return ", ".join(
+            f"{count} x {kind} {target}"
+            for (kind, target), count in self.requests.items()
+        )
+
+    def record(self, kind, target):
+        operation = self
+        while operation is not None:
+            with operation._lock:
+                operation.requests[(kind, target)] += 1
+            operation = operation.parent
+
+    def __enter__(self):
+        self.parent = _current.get()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self._token)
+        _stats.add(self)
+
+        if not self.over_budget or BUDGET_MODE == "off":
+            return
+
+        if BUDGET_MODE == "raise" and exc_type is None:
+            raise RequestBudgetExceeded(self)
+
+        logger.warning(str(RequestBudgetExceeded(self)))
+
+
+class _JoinedOperation:
+    """Context manager for an operation already running under the same name."""
+
+    def __init__(self, operation):
+        self.operation = operation
+
+    def __enter__(self):
+        return self.operation
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+
+class OperationStats:
+    """Per-operation totals since the start of the process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {}
+
+    def add(self, operation):
+        with self._lock:
+            totals = self._totals.setdefault(
+                operation.name,
+                {"count": 0, "requests": 0, "max_requests": 0, "over_budget": 0},
+            )
+            totals["count"] += 1
+            totals["requests"] += operation.total
+            totals["max_requests"] = max(totals["max_requests"], operation.total)
+            totals["over_budget"] += operation.over_budget
+
+    def snapshot(self):
+        with self._lock:
+            return {name: dict(totals) for name, totals in self._totals.items()}
+
+    def clear(self):
+        with self._lock:
+            self._totals.clear()
+
+
+_stats = OperationStats()
+
+
+def operation(name, budget=...):
+    """
+    Account the enclosed block's Supabase requests to operation `name`.
+
+    The budget defaults to REQUEST_BUDGETS[name].
+    """
+    current = _current.get()
+    if current is not None and current.name == name:
+        return _JoinedOperation(current)
+
+    if budget is ...:
+        budget = REQUEST_BUDGETS.get(name)
+    return Operation(name, budget)
+
+
+def accounted(name):
+    """Decorator accounting every call of the function to operation `name`."""
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with operation(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def is_active():
+    """True inside an operation."""
+    return _current.get() is not None
+
+
+def current_operation():
+    return _current.get()
+
+
+def record_request(kind, target):
+    """Count one request, e.g. ("postgrest", "GET passwords"), if accounting."""
+    current = _current.get()
+    if current is not None:
+        current.record(kind, target)
+
+
+def operation_stats():
+    """Return {name: {count, requests, max_requests, over_budget}}."""
+    return _stats.snapshot()
+
+
+def clear_operation_stats():
+    _stats.clear()
+
+
+def set_budget_mode(mode):
+    """Switch between "off", "warn" and "raise"; returns the previous mode."""
+    global BUDGET_MODE
+
+    if mode not in ("off", "warn", "raise"):
+        raise ValueError(f"Unknown budget mode: {mode}")
+
+    previous, BUDGET_MODE = BUDGET_MODE, mode
+    return previous
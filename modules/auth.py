@@ -1,13 +1,70 @@
 import base64
 import os
+from types import SimpleNamespace
 
+from modules.accounting import record_request
+from modules.session import current_session
 from modules.supabase_client import supabase
-from modules.utils import SALT_SIZE, derive_key
-
-
+from modules.tracing import SPAN_KIND_CLIENT, span, traced
+from modules.utils import (
+    MISSING_COLUMN_CODES,
+    SALT_SIZE,
+    calibrate_kdf,
+    clear_key_cache,
+    clear_plaintext_cache,
+    derive_key,
+    parse_kdf_params,
+    select_user_keys,
+    start_cache_refresh,
+)
+from modules.vault_cache import get_vault_cache
+
+# Subscription keeping the cached identity in step with the auth client
+_auth_listener = None
+
+
+def _clear_vault_cache():
+    """Remove the signed-in user's rows from the local vault cache."""
+    if current_session.user_id:
+        try:
+            get_vault_cache().clear(current_session.user_id)
+        except Exception:
+            pass  # Never keep a user signed in because the cache is locked
+
+
+def _on_auth_state_change(event, session):
+    """Refresh or invalidate the cached identity on auth events."""
+    if event == "TOKEN_REFRESHED":
+        # Refreshes started by a call (e.g. get_session() with an expired
+        # token) run on its thread and count toward its operation; the
+        # client's background refreshes belong to none
+        record_request("auth", "refresh_token")
+
+    if event in ("SIGNED_OUT", "USER_DELETED"):
+        _clear_vault_cache()
+        clear_plaintext_cache()
+        current_session.clear()
+    elif session is not None and event in (
+        "SIGNED_IN",
+        "TOKEN_REFRESHED",
+        "USER_UPDATED",
+    ):
+        current_session.set_identity(session.access_token)
+
+
+def _watch_auth_state():
+    """Subscribe to auth state changes once per process."""
+    global _auth_listener
+
+    if _auth_listener is None:
+        _auth_listener = supabase.auth.on_auth_state_change(_on_auth_state_change)
+
+
+@traced("auth.sign_up")
 def sign_up(email: str, password: str):
     """Registers a new user with Supabase Authentication and stores encryption salt."""
     try:
+        record_request("auth", "sign_up")
         response = supabase.auth.sign_up({"email": email, "password": password})
 
         if not response or not hasattr(response, "user") or not response.user:
@@ -17,10 +74,23 @@ def sign_up(email: str, password: str):
         salt = os.urandom(SALT_SIZE)  # Generate a new random salt
         salt_encoded = base64.b64encode(salt).decode()  # Encode it for storage
 
-        # Store the salt in a separate table `user_keys`
-        supabase.table("user_keys").insert(
-            {"user_id": user_id, "encryption_salt": salt_encoded}
-        ).execute()
+        # Store the salt and the KDF parameters tuned for this machine in a
+        # separate table `user_keys`
+        row = {
+            "user_id": user_id,
+            "encryption_salt": salt_encoded,
+            "kdf_params": calibrate_kdf(),
+        }
+
+        try:
+            supabase.table("user_keys").insert(row).execute()
+        except Exception as e:
+            if getattr(e, "code", None) not in MISSING_COLUMN_CODES:
+                raise
+
+            # No kdf_params column yet: the user logs in with the defaults
+            del row["kdf_params"]
+            supabase.table("user_keys").insert(row).execute()
 
         return {"success": True, "message": "Sign-up successful! You can now log in."}
 
@@ -28,33 +98,61 @@ def sign_up(email: str, password: str):
         return {"success": False, "message": f"Sign-up error: {str(e)}"}
 
 
-def log_in(email: str, password: str):
-    """Logs in an existing user and derives encryption key."""
+@traced("auth.log_in")
+def log_in(email: str, password: str, progress_callback=None):
+    """
+    Logs in an existing user and derives encryption key.
+
+    `progress_callback()` is called once the key is derived, just before the
+    session starts; if it raises (the UI gave up on the login), the user is
+    signed out again and no session is started.
+    """
     try:
-        response = supabase.auth.sign_in_with_password(
-            {"email": email, "password": password}
-        )
+        with span("gotrue sign_in_with_password", SPAN_KIND_CLIENT):
+            record_request("auth", "sign_in_with_password")
+            response = supabase.auth.sign_in_with_password(
+                {"email": email, "password": password}
+            )
 
         if not response or not hasattr(response, "user") or not response.user:
             return {"success": False, "message": "Invalid email or password."}
 
         user_id = response.user.id
 
-        # Retrieve stored salt from `user_keys`
-        salt_response = (
-            supabase.table("user_keys")
-            .select("encryption_salt")
-            .eq("user_id", user_id)
-            .execute()
-        )
+        # Retrieve stored salt and KDF parameters from `user_keys`
+        salt_response = select_user_keys(user_id)
 
         if not salt_response.data:
             return {"success": False, "message": "Encryption salt not found."}
 
-        salt = base64.b64decode(salt_response.data[0]["encryption_salt"])
+        user_key = salt_response.data[0]["encryption_salt"]
+        salt = base64.b64decode(user_key)
+        kdf_params = parse_kdf_params(salt_response.data[0].get("kdf_params"))
 
         # Derive encryption key from password
-        encryption_key = derive_key(password, salt)
+        encryption_key = derive_key(password, salt, kdf_params)
+
+        if progress_callback:
+            try:
+                progress_callback()
+            except Exception:
+                record_request("auth", "sign_out")
+                supabase.auth.sign_out()
+                raise
+
+        # Keep the key material for this session so later operations
+        # do not have to query `user_keys` again
+        current_session.start(
+            user_id, response.user.email, user_key, encryption_key, kdf_params
+        )
+
+        # Cache the identity locally so later calls skip get_user()
+        if getattr(response, "session", None):
+            current_session.set_identity(response.session.access_token)
+        _watch_auth_state()
+
+        # Fill the local vault cache without delaying the login
+        start_cache_refresh(user_id)
 
         user_data = {
             "id": user_id,
@@ -68,18 +166,36 @@ def log_in(email: str, password: str):
         return {"success": False, "message": f"Login error: {str(e)}"}
 
 
+@traced("auth.log_out")
 def log_out():
     """Logs out the currently logged-in user."""
+    # Drop the local vault copy and zeroize key material even if sign-out fails
+    _clear_vault_cache()
+    clear_key_cache()
+    clear_plaintext_cache()
+    current_session.clear()
+
     try:
+        record_request("auth", "sign_out")
         supabase.auth.sign_out()
         return {"success": True, "message": "Logged out successfully"}
     except Exception as e:
         return {"success": False, "message": f"Logout error: {str(e)}"}
 
 
+@traced("auth.get_current_user")
 def get_current_user():
     """Returns the currently logged-in user or None."""
+    user_id = current_session.cached_user_id()
+
+    if user_id:
+        # Same shape as supabase.auth.get_user(), served from the cache
+        return SimpleNamespace(
+            user=SimpleNamespace(id=user_id, email=current_session.email)
+        )
+
     try:
+        record_request("auth", "get_user")
         user = supabase.auth.get_user()
         return user if user else None
     except Exception:
@@ -88,9 +204,13 @@ def get_current_user():
 
 def is_logged_in():
     """Checks if a user is currently logged in."""
+    if current_session.cached_user_id():
+        return True
+
     return get_current_user() is not None
 
 
+@traced("auth.request_password_reset")
 def request_password_reset(email):
     """Send an OTP for password reset via Supabase."""
     try:
@@ -102,6 +222,7 @@ def request_password_reset(email):
         if not user_check.data:
             return {"success": False, "message": "No account found with this email."}
 
+        record_request("auth", "reset_password_for_email")
         supabase.auth.reset_password_for_email(email)
         return {"success": True, "message": "OTP sent to your email."}
 
@@ -112,10 +233,12 @@ def request_password_reset(email):
         }
 
 
+@traced("auth.verify_otp_and_reset_password")
 def verify_otp_and_reset_password(email, otp, new_password):
     """Verify OTP and reset password in Supabase."""
     try:
         # Verify the OTP
+        record_request("auth", "verify_otp")
         response = supabase.auth.verify_otp(
             {"email": email, "token": otp, "type": "recovery"}
         )
@@ -124,6 +247,7 @@ def verify_otp_and_reset_password(email, otp, new_password):
             return {"success": False, "message": "Invalid or expired OTP."}
 
         # Update password after OTP is verified
+        record_request("auth", "update_user")
         update_response = supabase.auth.update_user({"password": new_password})
 
         if not update_response:
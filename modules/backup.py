@@ -0,0 +1,366 @@
+import datetime
+import hashlib
+import json
+import os
+
+# Versioned JSON Lines backup layout:
+#   line 1      header  {"format": BACKUP_FORMAT, "version": 2, "encrypted": ...}
+#   lines 2..n  one JSON object per entry
+#   index block one {"offsets": "<hex>"} line per INDEX_CHUNK_SIZE entries
+#   last line   trailer {"trailer": true, "count": n, "sha256": ...,
+#                        "index_offset": ..., "index_chunk": INDEX_CHUNK_SIZE}
+# The checksum covers the raw bytes of every entry line. The index block holds
+# the byte offset of each entry line as fixed-width hex, so every full index
+# line has the same length and a single entry can be read with two seeks.
+# Version 1 backups kept the offsets as an "index" list in the trailer.
+# A "delta" backup has the same layout; its header names the full backup it
+# applies to and deleted entries are written as {"id": ..., "deleted": true}.
+BACKUP_FORMAT = "password-manager-backup"
+BACKUP_VERSION = 2
+BACKUP_EXTENSION = ".jsonl"
+FULL_BACKUP = "full"
+DELTA_BACKUP = "delta"
+ENTRY_FIELDS = ("id", "service_name", "username", "password")
+
+# Bytes read per step when scanning backwards for the trailer
+TRAILER_CHUNK_SIZE = 64 * 1024
+
+# Entry offsets per index line, and hex digits per offset
+INDEX_CHUNK_SIZE = 1024
+OFFSET_WIDTH = 16
+
+
+class BackupFormatError(ValueError):
+    """Raised when a backup file is malformed or fails its checksum."""
+
+
+class BackupWriter:
+    """
+    Streams entries into a structured backup file.
+
+    Entry offsets are spooled to a temporary file one index line at a time,
+    so memory use does not grow with the number of entries.
+    """
+
+    def __init__(self, path, encrypted, kind=FULL_BACKUP, **header_fields):
+        self.path = path
+        self.count = 0
+        self._offsets = []  # Offsets not yet written to the index spool
+        import tempfile  # Kept out of the app's startup imports
+
+        self._index = tempfile.TemporaryFile()
+        self._digest = hashlib.sha256()
+        self._file = open(path, "wb")
+
+        self.header = {
+            "format": BACKUP_FORMAT,
+            "version": BACKUP_VERSION,
+            "kind": kind,
+            "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "encrypted": bool(encrypted),
+            "fields": list(ENTRY_FIELDS),
+            **header_fields,
+        }
+        self._file.write(_encode_line(self.header))
+
+    def write(self, entry):
+        """Append one entry (a dict with ENTRY_FIELDS keys)."""
+        self._write_line(
+            _encode_line({field: entry.get(field) for field in ENTRY_FIELDS})
+        )
+
+    def write_deletion(self, entry_id):
+        """Record that an entry was deleted (delta backups only)."""
+        self._write_line(_encode_line({"id": entry_id, "deleted": True}))
+
+    def _write_line(self, line):
+        self._offsets.append(self._file.tell())
+        self._digest.update(line)
+        self._file.write(line)
+        self.count += 1
+
+        if len(self._offsets) == INDEX_CHUNK_SIZE:
+            self._flush_index()
+
+    def _flush_index(self):
+        if self._offsets:
+            self._index.write(_encode_index_line(self._offsets))
+            self._offsets = []
+
+    def close(self):
+        """Write the index block and the trailer, then close the file."""
+        if self._file.closed:
+            return
+
+        self._flush_index()
+        index_offset = self._file.tell()
+        self._index.seek(0)
+        while chunk := self._index.read(TRAILER_CHUNK_SIZE):
+            self._file.write(chunk)
+        self._index.close()
+
+        trailer = {
+            "trailer": True,
+            "count": self.count,
+            "sha256": self._digest.hexdigest(),
+            "index_offset": index_offset,
+            "index_chunk": INDEX_CHUNK_SIZE,
+        }
+        self._file.write(_encode_line(trailer))
+        self._file.close()
+
+    def abort(self):
+        """Close the file without a trailer, leaving it unreadable."""
+        self._index.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def _encode_line(obj):
+    return (json.dumps(obj, ensure_ascii=False, separators=(",", ":")) + "\n").encode()
+
+
+def _encode_index_line(offsets):
+    return _encode_line(
+        {"offsets": "".join(f"{offset:0{OFFSET_WIDTH}x}" for offset in offsets)}
+    )
+
+
+def _is_index_line(obj):
+    return "offsets" in obj and len(obj) == 1
+
+
+def is_structured_backup(path):
+    """Checks if the file starts with a structured backup header."""
+    try:
+        read_header(path)
+        return True
+    except (BackupFormatError, OSError):
+        return False
+
+
+def read_header(path):
+    """Return the header of a structured backup."""
+    with open(path, "rb") as f:
+        return _parse_header(f.readline())
+
+
+def _parse_header(line):
+    try:
+        header = json.loads(line)
+    except ValueError:
+        raise BackupFormatError("Not a structured backup file.")
+
+    if not isinstance(header, dict) or header.get("format") != BACKUP_FORMAT:
+        raise BackupFormatError("Not a structured backup file.")
+
+    if header.get("version", 0) > BACKUP_VERSION:
+        raise BackupFormatError(f"Unsupported backup version: {header.get('version')}")
+
+    return header
+
+
+def read_trailer(path):
+    """Return the trailer (count, checksum and index location) of a backup."""
+    with open(path, "rb") as f:
+        return _read_trailer(f)
+
+
+def _read_trailer(f):
+    f.seek(0, 2)
+    end = f.tell()
+    position = end
+    tail = b""
+
+    # The file ends with "\n"; scan back for the newline before the trailer
+    while position > 0:
+        step = min(TRAILER_CHUNK_SIZE, position)
+        position -= step
+        f.seek(position)
+        tail = f.read(step) + tail
+
+        newline = tail.rfind(b"\n", 0, len(tail) - 1)
+        if newline != -1:
+            tail = tail[newline + 1 :]
+            break
+
+    try:
+        trailer = json.loads(tail)
+    except ValueError:
+        raise BackupFormatError("Backup file is truncated (no trailer).")
+
+    if not isinstance(trailer, dict) or not trailer.get("trailer"):
+        raise BackupFormatError("Backup file is truncated (no trailer).")
+
+    return trailer
+
+
+def _entry_offset(f, trailer, position):
+    if "index" in trailer:  # Version 1
+        return trailer["index"][position]
+
+    chunk, slot = divmod(position, trailer["index_chunk"])
+    # Every index line before the last one holds a full chunk
+    line_size = len(_encode_index_line([0] * trailer["index_chunk"]))
+    f.seek(trailer["index_offset"] + chunk * line_size)
+
+    offsets = json.loads(f.readline())["offsets"]
+    return int(offsets[slot * OFFSET_WIDTH : (slot + 1) * OFFSET_WIDTH], 16)
+
+
+def read_entry(path, position):
+    """Read the entry at `position` by seeking through the index block."""
+    with open(path, "rb") as f:
+        trailer = _read_trailer(f)
+
+        if not 0 <= position < trailer["count"]:
+            raise IndexError(f"Backup has no entry {position}")
+
+        f.seek(_entry_offset(f, trailer, position))
+        return json.loads(f.readline())
+
+
+def verify_backup(path):
+    """Check the entry count and checksum of a backup; returns the header."""
+    digest = hashlib.sha256()
+    count = 0
+
+    with open(path, "rb") as f:
+        header = _parse_header(f.readline())
+        trailer = _read_trailer(f)
+
+        f.seek(0)
+        f.readline()
+
+        for _ in range(trailer["count"]):
+            line = f.readline()
+            if not line:
+                break
+            digest.update(line)
+            count += 1
+
+    if count != trailer["count"] or digest.hexdigest() != trailer["sha256"]:
+        raise BackupFormatError("Backup checksum mismatch; the file is corrupted.")
+
+    return header
+
+
+def iter_backup(path):
+    """Yield (line_number, entry) pairs from a structured backup."""
+    with open(path, "rb") as f:
+        _parse_header(f.readline())
+
+        for line_number, line in enumerate(f, start=2):
+            entry = json.loads(line)
+
+            if entry.get("trailer") or _is_index_line(entry):
+                return
+
+            yield line_number, entry
+
+    raise BackupFormatError("Backup file is truncated (no trailer).")
+
+
+def parse_legacy_line(line):
+    """Parse a 'Service: .., Username: .., Password: ..' line into a tuple."""
+    parts = line.strip().split(", ")
+    if len(parts) != 3:
+        return None
+
+    try:
+        return tuple(part.split(": ", 1)[1] for part in parts)
+    except IndexError:
+        return None
+
+
+def iter_legacy_backup(path):
+    """
+    Yield (line_number, entry) pairs from a legacy text backup.
+
+    Lines that cannot be parsed yield None as the entry.
+    """
+    with open(path, "r") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+
+            parsed = parse_legacy_line(line)
+
+            if parsed is None:
+                yield line_number, None
+                continue
+
+            service, username, password = parsed
+            yield line_number, {
+                "service_name": service,
+                "username": username,
+                "password": password,
+            }
+
+
+def find_deltas(base_path):
+    """Return the delta backups taken on top of a full backup, oldest first."""
+    base_header = read_header(base_path)
+    base_name = os.path.basename(base_path)
+    backup_dir = os.path.dirname(os.path.abspath(base_path))
+    deltas = []
+
+    for name in os.listdir(backup_dir):
+        if not name.endswith(BACKUP_EXTENSION) or name == base_name:
+            continue
+
+        path = os.path.join(backup_dir, name)
+        try:
+            header = read_header(path)
+        except (BackupFormatError, OSError):
+            continue
+
+        # Match the base's timestamp too, in case it was replaced by a copy
+        if (
+            header.get("kind") == DELTA_BACKUP
+            and header.get("base") == base_name
+            and header.get("base_created_at") == base_header["created_at"]
+        ):
+            deltas.append((header["created_at"], path))
+
+    return [path for _, path in sorted(deltas)]
+
+
+def replay_backups(base_path, delta_paths):
+    """
+    Replay delta backups on top of a full backup.
+
+    Every file is verified first. Returns the base header and the resulting
+    entries in a dict keyed by entry id.
+    """
+    base_header = verify_backup(base_path)
+
+    if base_header.get("kind", FULL_BACKUP) != FULL_BACKUP:
+        raise BackupFormatError("Restore must start from a full backup.")
+
+    entries = {entry["id"]: entry for _, entry in iter_backup(base_path)}
+
+    for path in delta_paths:
+        header = verify_backup(path)
+
+        if header.get("kind") != DELTA_BACKUP:
+            raise BackupFormatError(f"Not a delta backup: {path}")
+
+        if header["encrypted"] != base_header["encrypted"]:
+            raise BackupFormatError(f"Delta encryption does not match base: {path}")
+
+        for _, entry in iter_backup(path):
+            if entry.get("deleted"):
+                entries.pop(entry["id"], None)
+            else:
+                entries[entry["id"]] = entry
+
+    return base_header, entries
@@ -0,0 +1,536 @@
+import asyncio
+import base64
+import bisect
+import datetime
+import itertools
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from types import SimpleNamespace
+
+import httpx
+from postgrest import SyncPostgrestClient
+
+# Tables whose rows get a serial id and an updated_at stamp on write
+STAMPED_TABLES = ("passwords",)
+# Deleted passwords leave their id here, like the trigger in modules.models
+TOMBSTONES_TABLE = "password_tombstones"
+
+
+def _like(value, pattern, flags=0):
+    """SQL LIKE; PostgREST also accepts `*` for `%` in URLs."""
+    if value is None:
+        return False
+    regex = "".join(
+        ".*" if char in "%*" else "." if char == "_" else re.escape(char)
+        for char in pattern
+    )
+    return re.fullmatch(regex, str(value), flags | re.DOTALL) is not None
+
+
+_OPERATORS = {
+    "eq": lambda a, b: a == b,
+    "neq": lambda a, b: a != b,
+    "gt": lambda a, b: a is not None and a > b,
+    "gte": lambda a, b: a is not None and a >= b,
+    "lt": lambda a, b: a is not None and a < b,
+    "lte": lambda a, b: a is not None and a <= b,
+    "like": _like,
+    "ilike": lambda a, b: _like(a, b, re.IGNORECASE),
+}
+
+
+def _split(text):
+    """Split a PostgREST logic tree on top-level commas, honouring quotes."""
+    parts, depth, quoted, escaped, current = [], 0, False, False, ""
+
+    for char in text:
+        if escaped:
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char == '"':
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and char == ",":
+            parts.append(current)
+            current = ""
+            continue
+        current += char
+
+    parts.append(current)
+    return parts
+
+
+def _unquote(value):
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return re.sub(r"\\(.)", r"\1", value[1:-1])
+    return value
+
+
+def _coerce(value, like):
+    """Convert a filter value to the type of the column value it is compared to."""
+    if value == "null":
+        return None
+    if isinstance(like, bool):
+        return value == "true"
+    if isinstance(like, int):
+        try:
+            return int(value)
+        except ValueError:
+            return value
+    return value
+
+
+def _condition(column, expression):
+    """Compile `column` + `op.value` into a row predicate."""
+    negate = expression.startswith("not.")
+    if negate:
+        expression = expression[len("not.") :]
+
+    operator, _, value = expression.partition(".")
+
+    if operator == "is":
+        expected = {"null": None, "true": True, "false": False}[value]
+        check = lambda row: row.get(column) is expected  # noqa: E731
+    elif operator == "in":
+        values = [_unquote(v) for v in _split(value[1:-1])]
+        check = lambda row: str(row.get(column)) in values  # noqa: E731
+    else:
+        compare = _OPERATORS[operator]
+        value = _unquote(value)
+        check = lambda row: compare(  # noqa: E731
+            row.get(column), _coerce(value, row.get(column))
+        )
+
+    return (lambda row: not check(row)) if negate else check
+
+
+def _keyset_bound(tree):
+    """
+    Return the (columns, values) cursor of a keyset `or` filter, else None.
+
+    Matches `(a.gt.x,and(a.eq.x,b.gt.y))`, as built by modules.models.
+    """
+    parts = _split(tree[1:-1])
+    if len(parts) != 2 or not parts[1].startswith("and("):
+        return None
+
+    inner = _split(parts[1][len("and(") : -1])
+    first, _, first_value = parts[0].partition(".gt.")
+    if len(inner) != 2 or inner[0] != f"{first}.eq.{first_value}":
+        return None
+
+    second, _, second_value = inner[1].partition(".gt.")
+    if not second_value:
+        return None
+
+    return (first, second), (_unquote(first_value), _unquote(second_value))
+
+
+def _logic(kind, tree):
+    """Compile an `or=(...)` / `and(...)` tree into a row predicate."""
+    predicates = []
+
+    for part in _split(tree[1:-1]):
+        if part.startswith(("and(", "or(")):
+            inner_kind, _, inner = part.partition("(")
+            predicates.append(_logic(inner_kind, "(" + inner))
+        else:
+            column, _, expression = part.partition(".")
+            predicates.append(_condition(column, expression))
+
+    combine = any if kind == "or" else all
+    return lambda row: combine(predicate(row) for predicate in predicates)
+
+
+class FakePostgrest(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """
+    In-process stand-in for the PostgREST API behind Supabase.
+
+    Serves the requests postgrest-py builds for this app (select with eq/gt
+    style filters, `or` trees, order, limit and offset; insert, update and
+    delete with returned rows; single-object responses) from in-memory tables,
+    so the real client code runs end to end without a network. Passwords get
+    serial ids and increasing updated_at stamps, and deleting one records a
+    tombstone.
+    """
+
+    def __init__(self, tables=None):
+        self.tables = {name: list(rows) for name, rows in (tables or {}).items()}
+        self._ids = itertools.count(1)
+        self._clock = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+        self._lock = threading.Lock()
+        self._versions = {}  # table -> write count, invalidates sorted views
+        self._views = {}  # (table, order) -> (version, rows, sort keys)
+
+    def _stamp(self):
+        self._clock += datetime.timedelta(microseconds=1)
+        return self._clock.isoformat()
+
+    def load(self, table, rows):
+        """Insert rows directly, without a request."""
+        with self._lock:
+            return self._insert(table, rows)
+
+    def _insert(self, table, rows):
+        self._versions[table] = self._versions.get(table, 0) + 1
+        stored = []
+        for row in rows:
+            row = dict(row)
+            if table in STAMPED_TABLES:
+                row.setdefault("id", next(self._ids))
+                row["updated_at"] = self._stamp()
+            self.tables.setdefault(table, []).append(row)
+            stored.append(row)
+        return stored
+
+    def _ordered(self, table, order):
+        """Return the table sorted by `order` and the sort keys, or None keys."""
+        version = self._versions.get(table, 0)
+        cached = self._views.get((table, tuple(order or ())))
+
+        if cached is not None and cached[0] == version:
+            return cached[1], cached[2]
+
+        rows = self.tables.get(table, [])
+        keys = None
+
+        for key in reversed(order or []):
+            column, _, direction = key.partition(".")
+            rows = sorted(
+                rows,
+                key=lambda row: (row.get(column) is None, row.get(column)),
+                reverse=direction.startswith("desc"),
+            )
+
+        names = [key.partition(".")[0] for key in order or []]
+        ascending = all(key.partition(".")[2] in ("", "asc") for key in order or [])
+        if names and ascending:
+            keys = [tuple(row.get(name) for name in names) for row in rows]
+            if any(None in key for key in keys):
+                keys = None
+
+        self._views[(table, tuple(order or ()))] = (version, rows, keys)
+        return rows, keys
+
+    def _select(self, table, predicates, order, limit, offset, lower_bounds):
+        rows, keys = self._ordered(table, order)
+        start = 0
+
+        # Keyset pagination: skip straight to the cursor instead of rescanning
+        # every earlier page, like an index would
+        names = [key.partition(".")[0] for key in order or []]
+        for bound_columns, raw_values in lower_bounds:
+            if keys and rows and list(bound_columns) == names[: len(bound_columns)]:
+                bound = tuple(
+                    _coerce(value, rows[0].get(column))
+                    for column, value in zip(bound_columns, raw_values)
+                )
+                try:
+                    start = max(start, bisect.bisect_left(keys, bound))
+                except TypeError:
+                    pass
+
+        needed = None if limit is None else offset + limit
+        result = []
+
+        for row in itertools.islice(rows, start, None):
+            if all(predicate(row) for predicate in predicates):
+                result.append(row)
+                if needed is not None and len(result) >= needed:
+                    break
+
+        return result[offset:]
+
+    def handle_request(self, request):
+        with self._lock:
+            return self._respond(request)
+
+    async def handle_async_request(self, request):
+        return self.handle_request(request)
+
+    def _respond(self, request):
+        table = request.url.path.rstrip("/").rsplit("/", 1)[-1]
+        params = request.url.params.multi_items()
+        rows = self.tables.setdefault(table, [])
+
+        predicates = []
+        columns = order = limit = None
+        offset = 0
+        lower_bounds = []  # (columns, raw values) every matching row is past
+
+        for key, value in params:
+            if key == "select":
+                columns = (
+                    None if value == "*" else [c.strip() for c in value.split(",")]
+                )
+            elif key == "order":
+                order = value.split(",")
+            elif key == "limit":
+                limit = int(value)
+            elif key == "offset":
+                offset = int(value)
+            elif key in ("or", "and"):
+                predicates.append(_logic(key, value))
+                if key == "or" and _keyset_bound(value):
+                    lower_bounds.append(_keyset_bound(value))
+            elif key != "columns":
+                predicates.append(_condition(key, value))
+                if value.startswith(("gt.", "gte.")):
+                    lower_bounds.append(((key,), (_unquote(value.partition(".")[2]),)))
+
+        if request.method == "GET":
+            result = self._select(table, predicates, order, limit, offset, lower_bounds)
+            status = 200
+        else:
+            self._versions[table] = self._versions.get(table, 0) + 1
+            matched = [row for row in rows if all(p(row) for p in predicates)]
+
+        if request.method == "POST":
+            body = json.loads(request.content or b"[]")
+            result = self._insert(table, body if isinstance(body, list) else [body])
+            status = 201
+        elif request.method == "PATCH":
+            changes = json.loads(request.content or b"{}")
+            for row in matched:
+                row.update(changes)
+                if table in STAMPED_TABLES:
+                    row["updated_at"] = self._stamp()
+            result, status = matched, 200
+        elif request.method == "DELETE":
+            deleted = {id(row) for row in matched}
+            self.tables[table] = [row for row in rows if id(row) not in deleted]
+            if table in STAMPED_TABLES:
+                self.tables.setdefault(TOMBSTONES_TABLE, []).extend(
+                    {
+                        "id": row["id"],
+                        "user_id": row.get("user_id"),
+                        "deleted_at": self._stamp(),
+                    }
+                    for row in matched
+                )
+            result, status = matched, 200
+
+        if columns is not None:
+            result = [{c: row.get(c) for c in columns} for row in result]
+
+        if "return=minimal" in request.headers.get("prefer", ""):
+            return httpx.Response(status)
+
+        if request.headers.get("accept") == "application/vnd.pgrst.object+json":
+            if len(result) != 1:
+                return httpx.Response(
+                    406,
+                    json={
+                        "code": "PGRST116",
+                        "message": "JSON object requested, multiple (or no) rows returned",
+                        "details": f"The result contains {len(result)} rows",
+                        "hint": None,
+                    },
+                )
+            return httpx.Response(status, json=result[0])
+
+        return httpx.Response(status, json=result)
+
+
+class SimulatedNetwork(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """
+    Wraps a transport with a round-trip delay, jitter and injected failures.
+
+    Every request waits `latency` seconds give or take up to `jitter`, then
+    fails with a connection error (or `failure_status`, if given) with
+    probability `failure_rate`. Requests are counted per (method, table) in
+    `counts`, failed ones included.
+    """
+
+    def __init__(
+        self,
+        transport,
+        latency=0.0,
+        jitter=0.0,
+        failure_rate=0.0,
+        failure_status=None,
+        seed=None,
+    ):
+        self._transport = transport
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.counts = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @property
+    def requests(self):
+        """Number of requests made so far."""
+        return sum(self.counts.values())
+
+    def reset(self):
+        """Zero the request counts."""
+        with self._lock:
+            self.counts.clear()
+
+    def _round_trip(self, method, target):
+        """Count a request and return (delay, failed)."""
+        with self._lock:
+            self.counts[(method, target)] += 1
+            delay = self.latency + self._random.uniform(-self.jitter, self.jitter)
+            failed = self._random.random() < self.failure_rate
+        return max(delay, 0.0), failed
+
+    def _fail(self, request):
+        if self.failure_status is None:
+            raise httpx.ConnectError("Injected connection failure", request=request)
+        return httpx.Response(
+            self.failure_status,
+            json={"code": str(self.failure_status), "message": "Injected failure"},
+            request=request,
+        )
+
+    def handle_request(self, request):
+        delay, failed = self._round_trip(request.method, _table_of(request))
+        time.sleep(delay)
+        if failed:
+            return self._fail(request)
+        return self._transport.handle_request(request)
+
+    async def handle_async_request(self, request):
+        delay, failed = self._round_trip(request.method, _table_of(request))
+        await asyncio.sleep(delay)
+        if failed:
+            return self._fail(request)
+        return await self._transport.handle_async_request(request)
+
+    def call(self, name):
+        """Apply the network conditions to a non-HTTP call, e.g. an auth one."""
+        delay, failed = self._round_trip("AUTH", name)
+        time.sleep(delay)
+        if failed:
+            raise httpx.ConnectError("Injected connection failure")
+
+
+def _table_of(request):
+    return request.url.path.rstrip("/").rsplit("/", 1)[-1]
+
+
+def fake_access_token(user_id, email=None, expires_in=3600):
+    """An unsigned JWT the session accepts; the fake never checks signatures."""
+
+    def encode(obj):
+        raw = json.dumps(obj).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    claims = {"sub": user_id, "email": email, "exp": int(time.time()) + expires_in}
+    return f"{encode({'alg': 'none', 'typ': 'JWT'})}.{encode(claims)}.fake"
+
+
+class FakeAuth:
+    """The subset of the gotrue client the app uses, with in-memory users."""
+
+    def __init__(self, network):
+        self._network = network
+        self._users = {}  # email -> (user, password)
+        self._session = None
+        self._listeners = []
+
+    def _response(self, user, session=None):
+        return SimpleNamespace(user=user, session=session)
+
+    def sign_up(self, credentials):
+        self._network.call("sign_up")
+        email = credentials["email"]
+
+        if email in self._users:
+            raise ValueError("User already registered")
+
+        user = SimpleNamespace(id=str(uuid.uuid4()), email=email)
+        self._users[email] = (user, credentials["password"])
+        return self._response(user)
+
+    def sign_in_with_password(self, credentials):
+        self._network.call("sign_in_with_password")
+        user, password = self._users.get(credentials["email"], (None, None))
+
+        if user is None or password != credentials["password"]:
+            raise ValueError("Invalid login credentials")
+
+        self._session = SimpleNamespace(
+            access_token=fake_access_token(user.id, user.email), user=user
+        )
+        self._notify("SIGNED_IN")
+        return self._response(user, self._session)
+
+    def get_user(self):
+        self._network.call("get_user")
+        return self._response(self._session.user) if self._session else None
+
+    def get_session(self):
+        return self._session
+
+    def sign_out(self):
+        self._network.call("sign_out")
+        self._session = None
+        self._notify("SIGNED_OUT")
+
+    def on_auth_state_change(self, callback):
+        self._listeners.append(callback)
+        return SimpleNamespace(unsubscribe=lambda: self._listeners.remove(callback))
+
+    def _notify(self, event):
+        for callback in list(self._listeners):
+            callback(event, self._session)
+
+
+class _Client(SyncPostgrestClient):
+    def __init__(self, base_url, *, transport, **kwargs):
+        self._transport = transport
+        super().__init__(base_url, **kwargs)
+
+    def create_session(self, base_url, headers, timeout, verify=True, proxy=None):
+        return httpx.Client(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            transport=self._transport,
+        )
+
+
+class FakeBackend:
+    """
+    In-process stand-in for the Supabase client, for tests and load testing.
+
+    Serves `table()` from a FakePostgrest and `auth` from FakeAuth, both
+    behind a SimulatedNetwork with the given latency, jitter and failure
+    rate. Async clients reach the same server through `async_transport`.
+    Plug it in with modules.supabase_client.use_backend().
+    """
+
+    def __init__(
+        self, latency=0.0, jitter=0.0, failure_rate=0.0, failure_status=None, seed=None
+    ):
+        self.server = FakePostgrest()
+        self.network = SimulatedNetwork(
+            self.server, latency, jitter, failure_rate, failure_status, seed
+        )
+        self.postgrest = _Client("http://fake/rest/v1", transport=self.network)
+        self.async_transport = self.network
+        self.auth = FakeAuth(self.network)
+
+    @property
+    def requests(self):
+        """Number of requests made so far, auth calls included."""
+        return self.network.requests
+
+    def table(self, table_name):
+        return self.postgrest.from_(table_name)
+
+    from_ = table
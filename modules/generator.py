@@ -0,0 +1,13 @@
+import random
+import string
+
+# Characters of generated passwords
+PASSWORD_ALPHABET = string.ascii_letters + string.digits + string.punctuation
+
+# Draws from os.urandom, like the secrets module, which imports far more
+_random = random.SystemRandom()
+
+
+def generate_password(length=16):
+    """Return a random password drawn from PASSWORD_ALPHABET."""
+    return "".join(_random.choice(PASSWORD_ALPHABET) for _ in range(length))
@@ -1,4 +1,19 @@
 from modules.supabase_client import supabase
+from modules.vault_cache import CACHE_COLUMNS
+
+# Rows per page when listing passwords
+LIST_PAGE_SIZE = 100
+
+# Ids of deleted passwords, filled by an `after delete` trigger on passwords;
+# supabase/migrations/20261018000000_password_sync.sql creates the table, the
+# trigger and the updated_at column the delta sync reads.
+TOMBSTONES_TABLE = "password_tombstones"
+
+
+def _quote(value):
+    """Quote a value for use inside a PostgREST `or` filter."""
+    escaped = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{escaped}"'
 
 
 class Password:
@@ -16,7 +31,82 @@ class Password:
         return response
 
     @staticmethod
-    def get_passwords():
-        """Retrieves all stored passwords."""
-        response = supabase.table("passwords").select("*").execute()
-        return response.data
+    def get_passwords(
+        user_id, page_size=LIST_PAGE_SIZE, after=None, updated_after=None
+    ):
+        """
+        Retrieves one page of the user's passwords.
+
+        Rows are ordered by (service_name, id). `after` is the
+        (service_name, id) of the last row of the previous page; the next page
+        starts right after it, so pages stay consistent while rows are added.
+        With `updated_after`, only rows changed after that timestamp are listed.
+        """
+        query = (
+            supabase.table("passwords")
+            .select(", ".join(CACHE_COLUMNS))
+            .eq("user_id", user_id)
+            .order("service_name")
+            .order("id")
+            .limit(page_size)
+        )
+
+        if updated_after is not None:
+            query = query.gt("updated_at", updated_after)
+
+        if after is not None:
+            service_name, entry_id = _quote(after[0]), _quote(after[1])
+            query = query.or_(
+                f"service_name.gt.{service_name},"
+                f"and(service_name.eq.{service_name},id.gt.{entry_id})"
+            )
+
+        response = query.execute()
+        return response.data or []
+
+    @staticmethod
+    def iter_passwords(
+        user_id, page_size=LIST_PAGE_SIZE, after=None, updated_after=None
+    ):
+        """Yield the user's passwords page by page, see get_passwords."""
+        while True:
+            page = Password.get_passwords(user_id, page_size, after, updated_after)
+
+            if page:
+                yield page
+
+            if len(page) < page_size:
+                return
+
+            after = (page[-1]["service_name"], page[-1]["id"])
+
+    @staticmethod
+    def iter_deletions(user_id, deleted_after=None, page_size=LIST_PAGE_SIZE):
+        """Yield pages of tombstones (id, deleted_at) of deleted passwords."""
+        offset = 0
+
+        while True:
+            query = (
+                supabase.table(TOMBSTONES_TABLE)
+                .select("id, deleted_at")
+                .eq("user_id", user_id)
+            )
+            if deleted_after is not None:
+                query = query.gt("deleted_at", deleted_after)
+
+            # Tombstones are only ever appended, so offsets stay stable
+            response = (
+                query.order("deleted_at")
+                .order("id")
+                .range(offset, offset + page_size - 1)
+                .execute()
+            )
+            page = response.data or []
+
+            if page:
+                yield page
+
+            if len(page) < page_size:
+                return
+
+            offset += page_size
@@ -0,0 +1,379 @@
+import asyncio
+
+import httpx
+from postgrest import AsyncPostgrestClient
+
+from modules.session import current_session
+from modules.supabase_client import SUPABASE_KEY, SUPABASE_URL, backend_transport
+from modules.tracing import trace_query
+from modules.utils import (
+    EXPORT_PAGE_SIZE,
+    IMPORT_BATCH_SIZE,
+    _cache_rows,
+    decrypt_password,
+    encrypt_password,
+    get_user_id,
+    get_user_key,
+    get_vault_cache,
+)
+from modules.vault_cache import CACHE_COLUMNS
+
+# Request timeouts, in seconds
+REQUEST_TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+
+# Attempts per request on connection errors, timeouts and gateway errors
+MAX_ATTEMPTS = 3
+RETRY_BACKOFF = 0.5  # seconds, doubled after every failed attempt
+RETRY_STATUS_CODES = (502, 503, 504)
+# Only these are retried: sending them twice cannot apply a change twice
+IDEMPOTENT_METHODS = ("GET", "HEAD", "PUT", "DELETE")
+
+# Connection pool shared by every request; HTTP/2 multiplexes concurrent
+# requests over these connections
+MAX_CONNECTIONS = 10
+MAX_KEEPALIVE_CONNECTIONS = 5
+
+# Requests a bulk operation keeps in flight at once
+BULK_CONCURRENCY = 16
+
+
+class RetryTransport(httpx.AsyncBaseTransport):
+    """
+    Retries idempotent requests on transport errors and gateway errors.
+
+    Inserts (POST) and updates (PATCH) are sent once: a failed attempt may
+    still have been applied, and repeating it could duplicate rows.
+    """
+
+    def __init__(self, transport, max_attempts=MAX_ATTEMPTS):
+        self._transport = transport
+        self.max_attempts = max_attempts
+
+    async def handle_async_request(self, request):
+        if request.method not in IDEMPOTENT_METHODS:
+            return await self._transport.handle_async_request(request)
+
+        for attempt in range(1, self.max_attempts + 1):
+            last_attempt = attempt == self.max_attempts
+
+            try:
+                response = await self._transport.handle_async_request(request)
+            except httpx.TransportError:
+                if last_attempt:
+                    raise
+            else:
+                if last_attempt or response.status_code not in RETRY_STATUS_CODES:
+                    return response
+                await response.aclose()
+
+            await asyncio.sleep(RETRY_BACKOFF * 2 ** (attempt - 1))
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+class _PostgrestClient(AsyncPostgrestClient):
+    """AsyncPostgrestClient over a given transport."""
+
+    def __init__(self, base_url, *, transport, **kwargs):
+        self._transport = transport
+        super().__init__(base_url, **kwargs)
+
+    def create_session(self, base_url, headers, timeout, verify=True, proxy=None):
+        return httpx.AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            follow_redirects=True,
+            transport=self._transport,
+        )
+
+
+class PasswordRepository:
+    """
+    Asyncio access to the `passwords` table through PostgREST.
+
+    Every request goes through one pooled HTTP/2 connection set, so
+    concurrent requests share a few connections. Requests authenticate with
+    the session's access token and are retried with exponential backoff on
+    transient failures. Writes go through to the local vault cache like the
+    synchronous functions in modules.utils, whose bulk imports insert through
+    it. Without a `transport`, the active stand-in backend's is used if there
+    is one (see modules.supabase_client.use_backend).
+    """
+
+    def __init__(
+        self,
+        url=SUPABASE_URL,
+        key=SUPABASE_KEY,
+        timeout=REQUEST_TIMEOUT,
+        max_attempts=MAX_ATTEMPTS,
+        max_connections=MAX_CONNECTIONS,
+        concurrency=BULK_CONCURRENCY,
+        transport=None,
+    ):
+        self.concurrency = concurrency
+        self._token = None
+
+        if transport is None:
+            transport = backend_transport()
+
+        if transport is None:
+            transport = httpx.AsyncHTTPTransport(
+                http2=True,
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                ),
+            )
+
+        self._client = _PostgrestClient(
+            f"{url}/rest/v1",
+            headers={"apiKey": key, "Authorization": f"Bearer {key}"},
+            timeout=timeout,
+            transport=RetryTransport(transport, max_attempts),
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    async def aclose(self):
+        """Close the pooled connections."""
+        await self._client.aclose()
+
+    def _table(self):
+        token = current_session.access_token
+
+        # Row level security needs the user's token, not the anon key
+        if token and token != self._token:
+            self._client.auth(token)
+            self._token = token
+
+        return trace_query(self._client.from_("passwords"), "passwords")
+
+    async def _gather(self, coroutines):
+        """Run coroutines with at most `concurrency` in flight; keeps order."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def limited(coroutine):
+            async with semaphore:
+                return await coroutine
+
+        return await asyncio.gather(*(limited(c) for c in coroutines))
+
+    async def _credentials(self):
+        # get_user_id may refresh the session over the network
+        user_id = await asyncio.to_thread(get_user_id)
+
+        if isinstance(user_id, dict):
+            return user_id, None
+
+        return user_id, await asyncio.to_thread(get_user_key, user_id)
+
+    async def add_password(self, service_name, username, plain_password):
+        """Add a new password entry to Supabase."""
+        user_id, user_key = await self._credentials()
+
+        if isinstance(user_id, dict):
+            return user_id["message"]
+
+        if isinstance(user_key, dict):
+            return user_key["message"]
+
+        encrypted_password = encrypt_password(plain_password, user_key)
+
+        try:
+            response = await (
+                self._table()
+                .insert(
+                    {
+                        "user_id": user_id,
+                        "service_name": service_name,
+                        "username": username,
+                        "encrypted_password": encrypted_password,
+                    }
+                )
+                .execute()
+            )
+        except Exception as e:
+            return f"Database error: {str(e)}"
+
+        if not response.data:
+            return "Failed to add password"
+
+        _cache_rows(user_id, response.data)
+        return "Password added successfully"
+
+    async def add_passwords(self, entries, batch_size=IMPORT_BATCH_SIZE):
+        """
+        Add many (service_name, username, plain_password) entries.
+
+        Entries are inserted in batches of `batch_size` rows with several
+        batches in flight at once. Returns the number of rows inserted and
+        the error messages of failed batches.
+        """
+        user_id, user_key = await self._credentials()
+
+        if isinstance(user_id, dict):
+            return 0, [user_id["message"]]
+
+        if isinstance(user_key, dict):
+            return 0, [user_key["message"]]
+
+        rows = [
+            {
+                "user_id": user_id,
+                "service_name": service_name,
+                "username": username,
+                "encrypted_password": encrypt_password(plain_password, user_key),
+            }
+            for service_name, username, plain_password in entries
+        ]
+
+        results = await self.insert_rows(
+            user_id,
+            [
+                rows[start : start + batch_size]
+                for start in range(0, len(rows), batch_size)
+            ],
+        )
+        return (
+            sum(inserted for inserted, _ in results),
+            [error for _, error in results if error],
+        )
+
+    async def insert_rows(self, user_id, batches):
+        """
+        Insert batches of encrypted rows, one request per batch.
+
+        Several batches are in flight at once. Returns an (inserted, error)
+        pair per batch, in order; error is None if the batch was inserted.
+        """
+
+        async def insert(batch):
+            try:
+                response = await self._table().insert(batch).execute()
+            except Exception as e:
+                return 0, f"Database error: {str(e)}"
+
+            _cache_rows(user_id, response.data)
+            return len(response.data or []), None
+
+        return await self._gather(insert(batch) for batch in batches)
+
+    async def list_passwords(self, page_size=EXPORT_PAGE_SIZE):
+        """List the user's rows with ids and ciphertext, refreshing the cache."""
+        user_id = await asyncio.to_thread(get_user_id)
+
+        if isinstance(user_id, dict):
+            return "Error: No authenticated user found."
+
+        rows = []
+        last_id = None
+
+        try:
+            while True:
+                query = (
+                    self._table()
+                    .select(", ".join(CACHE_COLUMNS))
+                    .eq("user_id", user_id)
+                    .order("id")
+                    .limit(page_size)
+                )
+                if last_id is not None:
+                    query = query.gt("id", last_id)
+
+                page = (await query.execute()).data or []
+                rows.extend(page)
+
+                if len(page) < page_size:
+                    break
+
+                last_id = page[-1]["id"]
+        except Exception as e:
+            return f"Error: Could not load passwords: {str(e)}"
+
+        get_vault_cache().replace_all(user_id, rows)
+        return rows
+
+    async def retrieve_password(self, service_name):
+        """Retrieve and decrypt a password from Supabase."""
+        user_id, user_key = await self._credentials()
+
+        if isinstance(user_id, dict):
+            return user_id["message"]
+
+        if isinstance(user_key, dict):
+            return user_key["message"]
+
+        try:
+            response = await (
+                self._table()
+                .select(", ".join(CACHE_COLUMNS))
+                .eq("user_id", user_id)
+                .eq("service_name", service_name)
+                .limit(1)
+                .execute()
+            )
+        except Exception as e:
+            return f"Database error: {str(e)}"
+
+        if not response.data:
+            return f"No entry found for service: {service_name}"
+
+        _cache_rows(user_id, response.data)
+        entry = response.data[0]
+
+        decrypted_password = decrypt_password(entry["encrypted_password"], user_key)
+
+        if isinstance(decrypted_password, dict):
+            return decrypted_password["message"]
+
+        return {
+            "success": True,
+            "service": entry["service_name"],
+            "username": entry["username"],
+            "password": decrypted_password,
+        }
+
+    async def update_password(
+        self, user_id, entry_id, new_service, new_username, encrypted_password
+    ):
+        """Update an entry in Supabase and the local cache; returns updated rows."""
+        response = await (
+            self._table()
+            .update(
+                {
+                    "service_name": new_service,
+                    "username": new_username,
+                    "encrypted_password": encrypted_password,
+                }
+            )
+            .eq("user_id", user_id)
+            .eq("id", entry_id)
+            .execute()
+        )
+
+        _cache_rows(user_id, response.data)
+        return response.data
+
+    async def delete_password(self, user_id, entry_id):
+        """Delete an entry from Supabase and the local cache; returns deleted rows."""
+        response = await (
+            self._table().delete().eq("user_id", user_id).eq("id", entry_id).execute()
+        )
+
+        if response.data:
+            get_vault_cache().delete(user_id, [row["id"] for row in response.data])
+
+        return response.data
+
+    async def delete_passwords(self, user_id, entry_ids):
+        """Delete many entries concurrently; returns the deleted rows."""
+        results = await self._gather(
+            self.delete_password(user_id, entry_id) for entry_id in entry_ids
+        )
+        return [row for rows in results for row in rows or []]
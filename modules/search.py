@@ -0,0 +1,187 @@
+import bisect
+import re
+from collections import Counter, defaultdict
+from itertools import islice
+
+# Entry fields matched by a search
+SEARCH_FIELDS = ("service_name", "username")
+
+# Share of the query's trigrams an entry needs for a fuzzy match
+FUZZY_MIN_SIMILARITY = 0.5
+
+# Trigrams in more entries than this (".co", "com" on large vaults) are too
+# common to find fuzzy candidates by; they only add to a candidate's score
+FUZZY_MAX_POSTINGS = 1000
+
+_TOKEN_SPLIT = re.compile(r"[^\w]+")
+
+
+def normalize(text):
+    """Lower-case and trim text for matching."""
+    return (text or "").casefold().strip()
+
+
+def trigrams(text):
+    """Return the set of 3-character substrings of text."""
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+class SearchIndex:
+    """
+    In-memory index over password entries for per-keystroke filtering.
+
+    Entries are identified by their position in the list given to the index.
+    Postings are kept as id-ordered lists, so results never need sorting.
+    Queries shorter than three characters are looked up as word prefixes.
+    Longer queries scan the shortest trigram posting list for the exact
+    substring. When nothing contains the query, entries sharing most of its
+    trigrams are returned as fuzzy matches, also in id order. A query that
+    extends the previous one only re-checks the previous result.
+
+    Searches can stop after the first `limit` matches, so a query most of a
+    large vault matches does not check every entry on each keystroke.
+    """
+
+    def __init__(self, entries=(), fields=SEARCH_FIELDS):
+        self.fields = fields
+        self._text = {}  # id -> normalized searchable text
+        self._prefixes = defaultdict(list)  # 1-2 character word prefix -> ids
+        self._trigrams = defaultdict(list)  # trigram -> ids
+        self._last_query = None
+        self._last_result = None
+        self._last_fuzzy = False
+        self._last_complete = False
+
+        for entry_id, entry in enumerate(entries):
+            # Ids arrive in order, so appending keeps every posting list sorted
+            for key in self._keys(entry_id, entry):
+                key.append(entry_id)
+
+    def __len__(self):
+        return len(self._text)
+
+    def _keys(self, entry_id, entry):
+        """Store the entry's text and return the posting lists it belongs to."""
+        text = " ".join(normalize(entry.get(field)) for field in self.fields)
+        self._text[entry_id] = text
+        return self._postings(text)
+
+    def _postings(self, text):
+        prefixes = {
+            token[:length]
+            for token in _TOKEN_SPLIT.split(text)
+            for length in (1, 2)
+            if len(token) >= length
+        }
+        return [self._prefixes[prefix] for prefix in prefixes] + [
+            self._trigrams[gram] for gram in trigrams(text)
+        ]
+
+    def add(self, entry_id, entry):
+        """Index a new entry."""
+        for postings in self._keys(entry_id, entry):
+            bisect.insort(postings, entry_id)
+        self._last_query = None
+
+    def remove(self, entry_id):
+        """Drop an entry from the index."""
+        text = self._text.pop(entry_id, None)
+        if text is None:
+            return
+
+        for postings in self._postings(text):
+            position = bisect.bisect_left(postings, entry_id)
+            if position < len(postings) and postings[position] == entry_id:
+                del postings[position]
+
+        self._last_query = None
+
+    def update(self, entry_id, entry):
+        """Re-index an edited entry."""
+        self.remove(entry_id)
+        self.add(entry_id, entry)
+
+    def search(self, query, limit=None):
+        """
+        Return the ids of matching entries in ascending order.
+
+        An empty query returns None, meaning every entry matches. With
+        `limit`, the scan may stop once that many matches are found; a
+        shorter result holds every match. The returned list must not be
+        modified.
+        """
+        query = normalize(query)
+
+        if not query:
+            self._last_query = self._last_result = None
+            return None
+
+        fuzzy = False
+
+        if (
+            self._last_query
+            and len(self._last_query) >= 3
+            and query.startswith(self._last_query)
+            and not self._last_fuzzy
+            and self._last_complete
+        ):
+            # Narrowing a substring query: only its matches can still match
+            result = self._scan(query, self._last_result, limit)
+        else:
+            result = self._search(query, limit)
+
+        if not result and len(query) >= 3:
+            result = self._fuzzy_search(query)[:limit]
+            fuzzy = True
+
+        self._last_query = query
+        self._last_result = result
+        self._last_fuzzy = fuzzy
+        self._last_complete = limit is None or len(result) < limit
+        return result
+
+    def _scan(self, query, candidates, limit):
+        text = self._text
+        matches = (i for i in candidates if query in text[i])
+        return list(islice(matches, limit))
+
+    def _search(self, query, limit):
+        if len(query) < 3:
+            return self._prefixes.get(query, [])
+
+        if len(query) == 3:
+            return self._trigrams.get(query, [])
+
+        # Every match contains all of the query's trigrams, so the rarest
+        # one bounds the candidates
+        postings = min(
+            (self._trigrams.get(gram, []) for gram in trigrams(query)), key=len
+        )
+        return self._scan(query, postings, limit)
+
+    def _fuzzy_search(self, query):
+        grams = trigrams(query)
+        needed = max(1, int(len(grams) * FUZZY_MIN_SIMILARITY + 0.5))
+        counts = Counter()
+        common = []
+
+        for gram in grams:
+            postings = self._trigrams.get(gram, ())
+            if len(postings) > FUZZY_MAX_POSTINGS:
+                common.append(gram)
+            else:
+                counts.update(postings)
+
+        # Candidates share a rarer trigram with the query; the common ones
+        # are looked up in their text only
+        text = self._text
+        matches = (
+            entry_id
+            for entry_id, count in counts.items()
+            if count + len(common) >= needed
+            and count + sum(gram in text[entry_id] for gram in common) >= needed
+        )
+
+        # Like every other result, fuzzy matches keep the table's order
+        # rather than being ranked by similarity
+        return sorted(matches)
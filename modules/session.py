@@ -0,0 +1,123 @@
+import base64
+import json
+import threading
+import time
+
+# Treat tokens this close to expiry as expired
+TOKEN_EXPIRY_LEEWAY = 30  # seconds
+
+
+def decode_jwt_claims(token):
+    """
+    Decode and sanity-check a JWT payload locally, without any I/O.
+
+    The signature is not verified because the signing secret lives on the
+    server, which still validates the token on every request. Returns the
+    claims, or None if the token is malformed, has no subject or has expired.
+    """
+    try:
+        _, payload, _ = token.split(".")
+        padded = payload + "=" * (-len(payload) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(padded))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+    if not isinstance(claims, dict) or not claims.get("sub"):
+        return None
+
+    expires_at = claims.get("exp")
+    if not isinstance(expires_at, (int, float)):
+        return None
+
+    if expires_at <= time.time() + TOKEN_EXPIRY_LEEWAY:
+        return None
+
+    return claims
+
+
+class Session:
+    """Holds the logged-in user's id and key material for this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.user_id = None
+        self.email = None
+        self.user_key = None  # Secret used to encrypt password entries
+        self.encryption_key = None  # Key derived from the login password
+        self.kdf_params = None  # Stored KDF parameters of the user, if any
+        self.access_token = None
+        self.token_expires_at = None
+
+    @property
+    def is_active(self):
+        """Checks if a user has logged in during this session."""
+        return self.user_id is not None
+
+    def start(self, user_id, email, user_key, encryption_key=None, kdf_params=None):
+        """Store the key material loaded by log_in."""
+        with self._lock:
+            self._wipe()
+            self.user_id = user_id
+            self.email = email
+            self.user_key = user_key
+            self.encryption_key = bytearray(encryption_key or b"")
+            self.kdf_params = kdf_params
+
+    def set_identity(self, access_token):
+        """Cache the identity carried by an access token; False if it is invalid."""
+        claims = decode_jwt_claims(access_token)
+
+        with self._lock:
+            if claims is None:
+                self.access_token = None
+                self.token_expires_at = None
+                return False
+
+            if self.user_id not in (None, claims["sub"]):
+                self._wipe()  # Another account: drop the previous key material
+
+            self.user_id = claims["sub"]
+            self.email = claims.get("email", self.email)
+            self.access_token = access_token
+            self.token_expires_at = claims["exp"]
+            return True
+
+    def cached_user_id(self):
+        """Return the user id if the cached token is still valid, else None."""
+        with self._lock:
+            if not self.access_token:
+                return None
+
+            if self.token_expires_at <= time.time() + TOKEN_EXPIRY_LEEWAY:
+                return None
+
+            return self.user_id
+
+    def remember_user_key(self, user_id, user_key, kdf_params=None):
+        """Cache a user key fetched outside log_in (e.g. a persisted login)."""
+        with self._lock:
+            if self.user_id in (None, user_id):
+                self.user_id = user_id
+                self.user_key = user_key
+                self.kdf_params = kdf_params
+
+    def clear(self):
+        """Forget the user and overwrite the derived key."""
+        with self._lock:
+            self._wipe()
+
+    def _wipe(self):
+        if self.encryption_key:
+            for i in range(len(self.encryption_key)):
+                self.encryption_key[i] = 0
+
+        self.user_id = None
+        self.email = None
+        self.user_key = None
+        self.encryption_key = None
+        self.kdf_params = None
+        self.access_token = None
+        self.token_expires_at = None
+
+
+current_session = Session()
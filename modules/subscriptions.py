@@ -0,0 +1,145 @@
+import asyncio
+import os
+import threading
+
+from modules.session import current_session
+from modules.supabase_client import SUPABASE_KEY, SUPABASE_URL
+from modules.vault_cache import CACHE_COLUMNS, get_vault_cache
+
+# Set PASSWORD_MANAGER_REALTIME=0 to turn push updates off
+REALTIME_ENABLED = os.getenv("PASSWORD_MANAGER_REALTIME", "1") != "0"
+
+# Change events passed to on_change
+INSERT, UPDATE, DELETE = "INSERT", "UPDATE", "DELETE"
+
+
+class PasswordSubscription:
+    """
+    Realtime subscription to the user's `passwords` rows.
+
+    The table is added to the `supabase_realtime` publication by
+    supabase/migrations/20261018000200_passwords_realtime.sql.
+
+    Runs the realtime client on its own event loop in a daemon thread and
+    calls `on_change(event, entry)` there for every insert, update and
+    delete; `entry` holds the cached columns (only the id for deletes).
+    Changes are written through to the local vault cache as well. Any
+    connection error ends the subscription quietly and is kept in `error`.
+    """
+
+    def __init__(self, user_id, on_change, url=SUPABASE_URL, key=SUPABASE_KEY):
+        self.user_id = user_id
+        self.on_change = on_change
+        self.url = f"{url}/realtime/v1"
+        self.key = key
+        self.error = None
+
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Connect and subscribe on a background thread."""
+        self._thread = threading.Thread(
+            target=self._run, name="passwords-realtime", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """
+        Unsubscribe and close the connection in the background.
+
+        With a `timeout`, wait up to that many seconds for it to be closed.
+        """
+        self._stopped.set()
+        if timeout is not None and self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        try:
+            asyncio.run(self._listen())
+        except Exception as e:
+            self.error = e
+
+    async def _listen(self):
+        # Only imported once live updates are actually used
+        from realtime import AsyncRealtimeClient
+
+        client = AsyncRealtimeClient(self.url, self.key, auto_reconnect=True)
+        await client.connect()
+
+        try:
+            # Row level security needs the user's token, not the anon key
+            if current_session.access_token:
+                result = client.set_auth(current_session.access_token)
+                if asyncio.iscoroutine(result):
+                    await result
+
+            channel = client.channel(f"passwords:{self.user_id}")
+            channel.on_postgres_changes(
+                "INSERT",
+                schema="public",
+                table="passwords",
+                filter=f"user_id=eq.{self.user_id}",
+                callback=self.handle_payload,
+            )
+            channel.on_postgres_changes(
+                "UPDATE",
+                schema="public",
+                table="passwords",
+                filter=f"user_id=eq.{self.user_id}",
+                callback=self.handle_payload,
+            )
+            # Deletes cannot be filtered and carry only the id; handle_payload
+            # drops the ones for rows the cache does not hold
+            channel.on_postgres_changes(
+                "DELETE",
+                schema="public",
+                table="passwords",
+                callback=self.handle_payload,
+            )
+            await channel.subscribe()
+
+            # Older clients dispatch messages from listen(), newer ones from
+            # a task started by connect()
+            listener = asyncio.ensure_future(client.listen())
+            await asyncio.to_thread(self._stopped.wait)
+            listener.cancel()
+        finally:
+            await client.close()
+
+    def handle_payload(self, payload):
+        """Apply one postgres_changes payload to the cache and report it."""
+        if self._stopped.is_set():
+            return
+
+        data = payload.get("data", payload)
+        event = data.get("type") or data.get("eventType")
+
+        if event == DELETE:
+            record = data.get("old_record") or data.get("old") or {}
+            if record.get("id") is None:
+                return
+
+            entry = {"id": record["id"]}
+            cache = get_vault_cache()
+
+            # Other users' rows are never in the cache of a populated one
+            if not cache.delete(self.user_id, [entry["id"]]) and (
+                cache.is_populated(self.user_id)
+            ):
+                return
+        elif event in (INSERT, UPDATE):
+            record = data.get("record") or data.get("new") or {}
+            if record.get("user_id", self.user_id) != self.user_id:
+                return
+
+            entry = {column: record.get(column) for column in CACHE_COLUMNS}
+            if entry["id"] is None:
+                return
+
+            get_vault_cache().upsert(self.user_id, [entry])
+        else:
+            return
+
+        self.on_change(event, entry)
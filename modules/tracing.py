@@ -0,0 +1,375 @@
+import atexit
+import contextvars
+import functools
+import json
+import os
+import random
+import threading
+import time
+
+from modules.accounting import is_active, record_request
+
+# Set PASSWORD_MANAGER_TRACE_FILE to record timing spans there, one OTLP/JSON
+# export request per line (what the OpenTelemetry collector's file receiver
+# reads). Tracing is off when it is unset.
+TRACE_FILE = os.getenv("PASSWORD_MANAGER_TRACE_FILE")
+
+# Fraction of traces recorded, decided once per trace at its root span
+TRACE_SAMPLE_RATE = float(os.getenv("PASSWORD_MANAGER_TRACE_SAMPLE_RATE", "1"))
+
+# Finished spans are written when a trace ends or this many are waiting
+EXPORT_BATCH_SIZE = 512
+
+SERVICE_NAME = "password-manager"
+
+# OTLP span kinds and status codes
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_CLIENT = 3
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+_current = contextvars.ContextVar("current_span", default=None)
+_random = random.Random()
+
+
+def _attribute_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _attributes(attributes):
+    return [
+        {"key": key, "value": _attribute_value(value)}
+        for key, value in attributes.items()
+    ]
+
+
+class Span:
+    """
+    A timed operation; use it as a context manager or call end().
+
+    Entering the span makes it the parent of spans started inside the block.
+    """
+
+    __slots__ = (
+        "tracer",
+        "name",
+        "kind",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "attributes",
+        "start_ns",
+        "end_ns",
+        "error",
+        "_token",
+    )
+
+    def __init__(self, tracer, name, parent, kind, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.kind = kind
+        self.trace_id = (
+            parent.trace_id if parent else f"{_random.getrandbits(128):032x}"
+        )
+        self.span_id = f"{_random.getrandbits(64):016x}"
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+        self._token = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def end(self, error=None):
+        """Stop the clock and hand the span to the exporter; only once."""
+        if self.end_ns is not None:
+            return
+
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.error = error
+        self.tracer.finish(self)
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self._token)
+        self.end(exc)
+
+    def to_otlp(self):
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": _attributes(self.attributes),
+            "status": {"code": STATUS_OK},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        if self.error is not None:
+            span["status"] = {"code": STATUS_ERROR, "message": str(self.error)}
+            span["attributes"] += _attributes(
+                {"exception.type": type(self.error).__name__}
+            )
+        return span
+
+
+class _NoopSpan:
+    """Stands in for spans that are not recorded; costs nothing to use."""
+
+    __slots__ = ("_token",)
+
+    def set_attribute(self, key, value):
+        pass
+
+    def end(self, error=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+
+class _UnsampledSpan(_NoopSpan):
+    """Root of a trace left out by sampling; its children are dropped too."""
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self._token)
+
+
+_NOOP = _NoopSpan()
+
+
+class Tracer:
+    """Samples traces and appends their finished spans to a file."""
+
+    def __init__(self, path, sample_rate=1.0):
+        self.path = path
+        self.sample_rate = sample_rate
+        self._finished = []
+        self._lock = threading.Lock()
+
+    def start_span(self, name, kind=SPAN_KIND_INTERNAL, attributes=None):
+        parent = _current.get()
+
+        if isinstance(parent, _NoopSpan):
+            return _NOOP
+
+        if parent is None and _random.random() >= self.sample_rate:
+            return _UnsampledSpan()
+
+        return Span(self, name, parent, kind, attributes or {})
+
+    def finish(self, span):
+        with self._lock:
+            self._finished.append(span)
+            flush = span.parent_id is None or len(self._finished) >= EXPORT_BATCH_SIZE
+
+        if flush:
+            self.flush()
+
+    def flush(self):
+        """Write the finished spans out as one OTLP export request."""
+        with self._lock:
+            spans, self._finished = self._finished, []
+
+            if not spans:
+                return
+
+            request = {
+                "resourceSpans": [
+                    {
+                        "resource": {
+                            "attributes": _attributes({"service.name": SERVICE_NAME})
+                        },
+                        "scopeSpans": [
+                            {
+                                "scope": {"name": __name__},
+                                "spans": [span.to_otlp() for span in spans],
+                            }
+                        ],
+                    }
+                ]
+            }
+
+            try:
+                with open(self.path, "a", encoding="utf-8") as file:
+                    file.write(json.dumps(request, separators=(",", ":")) + "\n")
+            except OSError:
+                pass  # Tracing must never break the app
+
+
+_tracer = None
+
+
+def configure(path=TRACE_FILE, sample_rate=TRACE_SAMPLE_RATE):
+    """Record spans to `path` from now on; None turns tracing off."""
+    global _tracer
+
+    if _tracer is not None:
+        _tracer.flush()
+
+    _tracer = Tracer(path, sample_rate) if path else None
+    return _tracer
+
+
+def is_enabled():
+    return _tracer is not None
+
+
+def span(name, kind=SPAN_KIND_INTERNAL, **attributes):
+    """
+    Start a span under the current one: `with span("crypto.derive_key"):`.
+
+    For operations that end somewhere else, e.g. in a UI callback, keep the
+    span, run the work inside use_span(span) so its spans nest, and call
+    span.end() when done.
+    """
+    tracer = _tracer
+    if tracer is None:
+        return _NOOP
+
+    return tracer.start_span(name, kind, attributes)
+
+
+class use_span:
+    """Make a span current for the enclosed block, without ending it."""
+
+    __slots__ = ("span", "_token")
+
+    def __init__(self, span):
+        self.span = span
+
+    def __enter__(self):
+        self._token = _current.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self._token)
+
+
+def traced(name):
+    """Decorator running every call of the function in a span called `name`."""
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            tracer = _tracer
+            if tracer is None:
+                return fn(*args, **kwargs)
+
+            with tracer.start_span(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class TracedQuery:
+    """
+    Wraps a PostgREST request builder so that execute() runs in a span and
+    counts toward the current operation's request budget.
+
+    Builder methods return wrapped builders, so filters can be chained as
+    usual. Works for the sync and the async clients.
+    """
+
+    __slots__ = ("_builder", "_table")
+
+    def __init__(self, builder, table):
+        self._builder = builder
+        self._table = table
+
+    def __getattr__(self, name):
+        attribute = getattr(self._builder, name)
+
+        if hasattr(attribute, "execute"):  # e.g. the `not_` property
+            return TracedQuery(attribute, self._table)
+
+        if not callable(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            result = attribute(*args, **kwargs)
+            if hasattr(result, "execute"):
+                return TracedQuery(result, self._table)
+            return result
+
+        return call
+
+    def _span(self):
+        method = getattr(self._builder, "http_method", "")
+        return span(
+            " ".join(filter(None, ("postgrest", method, self._table))),
+            SPAN_KIND_CLIENT,
+            **{
+                "db.system": "postgresql",
+                "db.collection.name": self._table,
+                "http.request.method": method,
+            },
+        )
+
+    @staticmethod
+    def _record(current, response):
+        data = getattr(response, "data", None)
+        if isinstance(data, list):
+            current.set_attribute("db.response.returned_rows", len(data))
+
+    def execute(self):
+        method = getattr(self._builder, "http_method", "")
+        record_request("postgrest", f"{method} {self._table}".strip())
+
+        if _tracer is None:
+            return self._builder.execute()
+
+        import inspect  # Only needed when tracing; slow to import
+
+        if inspect.iscoroutinefunction(self._builder.execute):
+            return self._execute_async()
+
+        with self._span() as current:
+            response = self._builder.execute()
+            self._record(current, response)
+            return response
+
+    async def _execute_async(self):
+        with self._span() as current:
+            response = await self._builder.execute()
+            self._record(current, response)
+            return response
+
+
+def trace_query(builder, table):
+    """Return `builder` traced if tracing or accounting is on, else unchanged."""
+    if _tracer is None and not is_active():
+        return builder
+    return TracedQuery(builder, table)
+
+
+def _flush_at_exit():
+    if _tracer is not None:
+        _tracer.flush()
+
+
+configure()
+atexit.register(_flush_at_exit)
@@ -1,13 +1,44 @@
 import base64
+import contextlib
 import datetime
+import hashlib
+import json
+import logging
 import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
 from pathlib import Path
 
-from Crypto.Cipher import AES
+from cryptography.exceptions import UnsupportedAlgorithm
 from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-
+from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+
+from modules.accounting import accounted, record_request
+from modules.backup import (
+    BACKUP_EXTENSION,
+    DELTA_BACKUP,
+    FULL_BACKUP,
+    BackupWriter,
+    find_deltas,
+    is_structured_backup,
+    iter_backup,
+    iter_legacy_backup,
+    replay_backups,
+    verify_backup,
+)
+from modules.generator import generate_password  # Re-exported for callers
+from modules.models import LIST_PAGE_SIZE, Password
+from modules.session import current_session
 from modules.supabase_client import supabase
+from modules.tracing import traced
+from modules.vault_cache import CACHE_COLUMNS, get_vault_cache, set_key_provider
+
+logger = logging.getLogger(__name__)
 
 # TODO: Use the same convention when returning or printing function outputs
 
@@ -15,46 +46,527 @@ from modules.supabase_client import supabase
 SALT_SIZE = 16
 KEY_SIZE = 32  # AES-256
 ITERATIONS = 100000
+NONCE_SIZE = 16
+TAG_SIZE = 16
+
+# Versioned ciphertext format. Legacy blobs are plain base64 of
+# salt + nonce + tag + ciphertext, with a full PBKDF2 run per entry. Current
+# blobs carry a version prefix (":" never appears in base64) and use a per-entry
+# subkey expanded with HKDF from a vault key that is derived once per session.
+# v2 vault keys come from PBKDF2 at ITERATIONS, v3 ones from the user's stored
+# KDF parameters; users who have parameters write v3.
+CIPHERTEXT_VERSION = "v2"
+VERSION_PREFIX = f"{CIPHERTEXT_VERSION}:"
+TUNED_CIPHERTEXT_VERSION = "v3"
+TUNED_VERSION_PREFIX = f"{TUNED_CIPHERTEXT_VERSION}:"
+VAULT_KEY_SALT = b"password-manager/vault-key/v2"
+TUNED_VAULT_KEY_SALT = b"password-manager/vault-key/v3"
+ENTRY_KEY_INFO = b"password-manager/entry-key/v2"
+CACHE_KEY_INFO = b"password-manager/cache-key/v1"
+
+# Minimum number of legacy blobs worth starting a process pool for
+PARALLEL_DECRYPT_THRESHOLD = 8
+
+# Rows per request when paging through the vault for an export
+EXPORT_PAGE_SIZE = 1000
+
+# Per-user watermark of the last export, kept in the backup directory
+EXPORT_STATE_FILE = ".export_state.json"
+
+# Rows per insert request when importing, and errors listed in the result
+IMPORT_BATCH_SIZE = 500
+IMPORT_ERRORS_SHOWN = 10
+
+# Derived-key memo bounds
+KEY_CACHE_SIZE = 256
+KEY_CACHE_TTL = 15 * 60  # seconds
+
+# Pre-decrypted passwords of the rows on screen; kept only briefly
+PLAINTEXT_CACHE_SIZE = 64
+PLAINTEXT_CACHE_TTL = 60  # seconds
+
+# Rows read per request when migrating legacy ciphertexts, and the cache
+# metadata key recording the format a finished migration left the vault in
+MIGRATION_PAGE_SIZE = 500
+MIGRATED_KEY = "migrated_format"
+
+# Cache metadata keys holding the delta cursors of the last sync (see
+# _merge_delta); rows and tombstones come from different tables, so each has
+# its own
+SYNC_CURSOR_KEY = "sync_cursor"
+SYNC_DELETED_CURSOR_KEY = "sync_deleted_cursor"
+
+# updated_at and deleted_at hold the time a row's transaction started, so a
+# write committing after a sync or export can carry a stamp older than what
+# it read. Writes are assumed to commit within this long; deltas re-read the
+# rows stamped this far back until it has passed.
+SYNC_OVERLAP = datetime.timedelta(minutes=5)
+
+# PostgREST errors meaning the tombstone table does not exist
+MISSING_TABLE_CODES = ("42P01", "PGRST205")
+# PostgREST errors meaning a column (e.g. user_keys.kdf_params) does not exist
+MISSING_COLUMN_CODES = ("42703", "PGRST204")
+
+# Password-based key derivation. Each user's algorithm and cost are chosen by
+# calibrate_kdf at sign-up and stored alongside the salt, in the column added
+# by supabase/migrations/20261018000100_user_keys_kdf_params.sql. They derive
+# the login key and the v3 vault key. Users without stored parameters keep
+# PBKDF2 at ITERATIONS, as do legacy blobs; per-entry keys come from HKDF.
+PBKDF2, SCRYPT, ARGON2ID = "pbkdf2-sha256", "scrypt", "argon2id"
+DEFAULT_KDF_PARAMS = {"algorithm": PBKDF2, "iterations": ITERATIONS}
+
+# Algorithm for new users; scrypt is used where Argon2id is unavailable
+KDF_ALGORITHM = os.getenv("PASSWORD_MANAGER_KDF", ARGON2ID)
+# Unlock time calibrate_kdf aims for on the signing-up machine
+KDF_TARGET_TIME = 0.5  # seconds
+
+# Weakest parameters calibration may pick, whatever the machine
+MIN_KDF_PARAMS = {
+    PBKDF2: {"algorithm": PBKDF2, "iterations": ITERATIONS},
+    SCRYPT: {"algorithm": SCRYPT, "n": 2**15, "r": 8, "p": 1},
+    ARGON2ID: {
+        "algorithm": ARGON2ID,
+        "iterations": 2,
+        "memory_cost": 19456,  # KiB
+        "lanes": 1,
+    },
+}
+# Largest scrypt cost tried; memory use is 128 * r * n bytes
+MAX_SCRYPT_N = 2**20
+
+
+def _make_kdf(params, salt):
+    algorithm = params.get("algorithm", PBKDF2)
+
+    if algorithm == PBKDF2:
+        return PBKDF2HMAC(
+            algorithm=hashes.SHA256(),
+            length=KEY_SIZE,
+            salt=salt,
+            iterations=params["iterations"],
+        )
+
+    if algorithm == SCRYPT:
+        return Scrypt(
+            salt=salt, length=KEY_SIZE, n=params["n"], r=params["r"], p=params["p"]
+        )
+
+    if algorithm == ARGON2ID:
+        # Only in recent cryptography releases built against OpenSSL 3.2+
+        from cryptography.hazmat.primitives.kdf.argon2 import Argon2id
+
+        return Argon2id(
+            salt=salt,
+            length=KEY_SIZE,
+            iterations=params["iterations"],
+            lanes=params["lanes"],
+            memory_cost=params["memory_cost"],
+        )
+
+    raise ValueError(f"Unsupported key derivation function: {algorithm}")
+
+
+@traced("crypto.derive_key")
+def derive_key(user_password: str, salt: bytes, params=None) -> bytes:
+    """
+    Derives a 256-bit AES encryption key from the user's login password.
+
+    `params` are the user's stored KDF parameters; PBKDF2 at ITERATIONS
+    without them.
+    """
+    kdf = _make_kdf(params or DEFAULT_KDF_PARAMS, salt)
+    return kdf.derive(user_password.encode())
+
+
+def _kdf_time(params):
+    """Seconds one derivation with params takes on this machine."""
+    start = time.perf_counter()
+    derive_key("calibration", os.urandom(SALT_SIZE), params)
+    return time.perf_counter() - start
+
+
+def calibrate_kdf(algorithm=KDF_ALGORITHM, target_time=KDF_TARGET_TIME):
+    """
+    Pick KDF parameters taking about `target_time` seconds here.
+
+    Costs are scaled from a timed run at the minimum parameters and never go
+    below them. Falls back to scrypt if Argon2id is not supported.
+    """
+    if algorithm == ARGON2ID:
+        try:
+            elapsed = _kdf_time(MIN_KDF_PARAMS[ARGON2ID])
+        except (ImportError, UnsupportedAlgorithm):
+            return calibrate_kdf(SCRYPT, target_time)
+    else:
+        elapsed = _kdf_time(MIN_KDF_PARAMS[algorithm])
+
+    params = dict(MIN_KDF_PARAMS[algorithm])
+    scale = target_time / max(elapsed, 1e-6)
+
+    if algorithm == SCRYPT:
+        # Time grows linearly with n, which must stay a power of two
+        while params["n"] * 2 <= MAX_SCRYPT_N and scale >= 2:
+            params["n"] *= 2
+            scale /= 2
+    else:
+        # PBKDF2 and Argon2id time grows linearly with the iterations
+        params["iterations"] = max(
+            params["iterations"], int(params["iterations"] * scale)
+        )
+
+    return params
+
+
+def select_user_keys(user_id):
+    """Fetch the user's salt and KDF parameters, if the column exists."""
+    try:
+        return (
+            supabase.table("user_keys")
+            .select("encryption_salt, kdf_params")
+            .eq("user_id", user_id)
+            .execute()
+        )
+    except Exception as e:
+        if getattr(e, "code", None) not in MISSING_COLUMN_CODES:
+            raise
+
+    return (
+        supabase.table("user_keys")
+        .select("encryption_salt")
+        .eq("user_id", user_id)
+        .execute()
+    )
+
+
+def parse_kdf_params(value):
+    """KDF parameters from a user_keys row value (JSON or text); None if unset."""
+    if not value:
+        return None
+
+    if isinstance(value, str):
+        value = json.loads(value)
+
+    return value
+
+
+class DerivedKeyCache:
+    """Size-bounded, TTL-evicted LRU memo of PBKDF2 results."""
+
+    def __init__(self, max_size=KEY_CACHE_SIZE, ttl=KEY_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # (secret digest, salt, KDF parameters) -> (key, expiry)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _cache_key(secret, salt, params=None):
+        # Never keep the secret itself as a dictionary key
+        return (
+            hashlib.sha256(secret.encode()).digest(),
+            bytes(salt),
+            json.dumps(params, sort_keys=True) if params else None,
+        )
+
+    @staticmethod
+    def _zeroize(key):
+        for i in range(len(key)):
+            key[i] = 0
+
+    def get(self, secret, salt, params=None):
+        """Return the cached key for (secret, salt, params) or None."""
+        cache_key = self._cache_key(secret, salt, params)
+
+        with self._lock:
+            entry = self._entries.get(cache_key)
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            key, expiry = entry
+            if expiry <= time.monotonic():
+                self._zeroize(self._entries.pop(cache_key)[0])
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(cache_key)
+            self.hits += 1
+            return bytes(key)
+
+    def put(self, secret, salt, key, params=None):
+        """Store a derived key, evicting the least recently used entries."""
+        cache_key = self._cache_key(secret, salt, params)
+
+        with self._lock:
+            if cache_key in self._entries:
+                self._zeroize(self._entries.pop(cache_key)[0])
+
+            self._entries[cache_key] = (bytearray(key), time.monotonic() + self.ttl)
+
+            while len(self._entries) > self.max_size:
+                self._zeroize(self._entries.popitem(last=False)[1][0])
 
+    def clear(self):
+        """Overwrite and drop every cached key."""
+        with self._lock:
+            for key, _ in self._entries.values():
+                self._zeroize(key)
+            self._entries.clear()
 
-def derive_key(user_password: str, salt: bytes) -> bytes:
-    """Derives a 256-bit AES encryption key from the user's login password."""
-    kdf = PBKDF2HMAC(
+    def stats(self):
+        """Return hit/miss counters and the current size."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+            }
+
+
+_key_cache = DerivedKeyCache()
+
+
+class PlaintextCache:
+    """
+    Short-lived LRU of decrypted passwords keyed by their ciphertext.
+
+    Plaintexts are held as bytearrays and overwritten when evicted, expired
+    or cleared. The str handed out by get() is a copy Python cannot wipe, so
+    callers should only ask for entries the user is about to see.
+    """
+
+    def __init__(self, max_size=PLAINTEXT_CACHE_SIZE, ttl=PLAINTEXT_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # ciphertext digest -> (plaintext, expiry)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _cache_key(encrypted_password):
+        return hashlib.sha256(encrypted_password.encode()).digest()
+
+    def get(self, encrypted_password):
+        """Return the cached plaintext of a ciphertext or None."""
+        cache_key = self._cache_key(encrypted_password)
+
+        with self._lock:
+            entry = self._entries.get(cache_key)
+
+            if entry is None:
+                return None
+
+            plaintext, expiry = entry
+            if expiry <= time.monotonic():
+                DerivedKeyCache._zeroize(self._entries.pop(cache_key)[0])
+                return None
+
+            self._entries.move_to_end(cache_key)
+            return plaintext.decode()
+
+    def put(self, encrypted_password, plaintext):
+        """Store a decrypted password, evicting the least recently used ones."""
+        cache_key = self._cache_key(encrypted_password)
+
+        with self._lock:
+            if cache_key in self._entries:
+                DerivedKeyCache._zeroize(self._entries.pop(cache_key)[0])
+
+            self._entries[cache_key] = (
+                bytearray(plaintext.encode()),
+                time.monotonic() + self.ttl,
+            )
+
+            while len(self._entries) > self.max_size:
+                DerivedKeyCache._zeroize(self._entries.popitem(last=False)[1][0])
+
+    def retain(self, encrypted_passwords):
+        """Drop every entry not in encrypted_passwords, and expired ones."""
+        keep = {self._cache_key(encrypted) for encrypted in encrypted_passwords}
+        now = time.monotonic()
+
+        with self._lock:
+            for cache_key in list(self._entries):
+                if cache_key not in keep or self._entries[cache_key][1] <= now:
+                    DerivedKeyCache._zeroize(self._entries.pop(cache_key)[0])
+
+    def clear(self):
+        """Overwrite and drop every cached plaintext."""
+        with self._lock:
+            for plaintext, _ in self._entries.values():
+                DerivedKeyCache._zeroize(plaintext)
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_plaintext_cache = PlaintextCache()
+
+
+def derive_key_cached(user_password: str, salt: bytes, params=None) -> bytes:
+    """Same as derive_key, memoized in the session key cache."""
+    key = _key_cache.get(user_password, salt, params)
+
+    if key is None:
+        key = derive_key(user_password, salt, params)
+        _key_cache.put(user_password, salt, key, params)
+
+    return key
+
+
+def key_cache_stats():
+    """Return hit/miss counters of the derived-key cache."""
+    return _key_cache.stats()
+
+
+def clear_key_cache():
+    """Zeroize every derived key held in memory (vault and legacy keys)."""
+    _key_cache.clear()
+
+
+def get_vault_key(user_key: str, params=None) -> bytes:
+    """
+    Returns the vault key for user_key, running the KDF only on first use.
+
+    With the user's stored KDF `params` this is the v3 key, otherwise the v2
+    key from PBKDF2 at ITERATIONS.
+    """
+    if params:
+        return derive_key_cached(user_key, TUNED_VAULT_KEY_SALT, params)
+    return derive_key_cached(user_key, VAULT_KEY_SALT)
+
+
+def vault_kdf_params(user_key):
+    """KDF parameters of user_key's vault key; only known for the session's."""
+    if user_key is not None and user_key == current_session.user_key:
+        return current_session.kdf_params
+    return None
+
+
+def ciphertext_version(user_key):
+    """Version new ciphertexts of user_key are written in."""
+    if vault_kdf_params(user_key):
+        return TUNED_CIPHERTEXT_VERSION
+    return CIPHERTEXT_VERSION
+
+
+def derive_entry_key(vault_key: bytes, entry_salt: bytes) -> bytes:
+    """Expands the vault key into a per-entry AES key with HKDF-SHA256."""
+    hkdf = HKDF(
         algorithm=hashes.SHA256(),
         length=KEY_SIZE,
-        salt=salt,
-        iterations=ITERATIONS,
+        salt=entry_salt,
+        info=ENTRY_KEY_INFO,
     )
-    return kdf.derive(user_password.encode())
+    return hkdf.derive(vault_key)
+
+
+def get_cache_key(user_id):
+    """
+    Key sealing the user's rows in the local vault cache, or None.
+
+    Only the logged-in user's key is known, and only once it is in the
+    session; this never makes a request.
+    """
+    if current_session.user_id != user_id or not current_session.user_key:
+        return None
+
+    hkdf = HKDF(
+        algorithm=hashes.SHA256(),
+        length=KEY_SIZE,
+        salt=None,
+        info=CACHE_KEY_INFO,
+    )
+    user_key = current_session.user_key
+    return hkdf.derive(get_vault_key(user_key, vault_kdf_params(user_key)))
+
+
+set_key_provider(get_cache_key)
+
+
+def _split_version(encrypted_password):
+    """Return (version, base64 data) of a ciphertext; no version if legacy."""
+    if isinstance(encrypted_password, str):
+        version, separator, data = encrypted_password.partition(":")
+        if separator and version in (CIPHERTEXT_VERSION, TUNED_CIPHERTEXT_VERSION):
+            return version, data
+
+    return None, encrypted_password
+
+
+def is_encrypted(value):
+    """Checks if a value looks like a ciphertext in any supported format."""
+    _, value = _split_version(value)
 
+    # Anything shorter than salt + nonce + tag is a plain password
+    return is_base64(value) and len(value) * 3 // 4 > SALT_SIZE + NONCE_SIZE + TAG_SIZE
 
+
+@traced("crypto.encrypt_password")
 def encrypt_password(plain_password, user_key):
-    """Encrypt the password using AES-256."""
+    """Encrypt the password using AES-256 with a per-entry subkey."""
+    from Crypto.Cipher import AES  # Imported on first use to keep startup fast
+
+    params = vault_kdf_params(user_key)
+    version = ciphertext_version(user_key)
+
     salt = os.urandom(SALT_SIZE)
-    key = derive_key(user_key, salt)
+    key = derive_entry_key(get_vault_key(user_key, params), salt)
 
     cipher = AES.new(key, AES.MODE_EAX)
+    cipher.update(version.encode())  # Bind the format version
     ciphertext, tag = cipher.encrypt_and_digest(plain_password.encode())
 
     # Store salt, nonce, tag, and ciphertext, then base64 encode it
     encrypted_data = base64.b64encode(salt + cipher.nonce + tag + ciphertext).decode()
 
-    return encrypted_data
+    return f"{version}:{encrypted_data}"
+
 
+def _split_blob(encrypted_data):
+    """Split raw ciphertext bytes into salt, nonce, tag and ciphertext."""
+    salt = encrypted_data[:SALT_SIZE]
+    nonce = encrypted_data[SALT_SIZE : SALT_SIZE + NONCE_SIZE]
+    tag = encrypted_data[SALT_SIZE + NONCE_SIZE : SALT_SIZE + NONCE_SIZE + TAG_SIZE]
+    ciphertext = encrypted_data[SALT_SIZE + NONCE_SIZE + TAG_SIZE :]
+    return salt, nonce, tag, ciphertext
 
+
+@traced("crypto.decrypt_password")
 def decrypt_password(encrypted_password, user_key):
-    """Decrypt the AES-encrypted password."""
+    """Decrypt the AES-encrypted password (current or legacy format)."""
+    from Crypto.Cipher import AES
+
     try:
-        encrypted_data = base64.b64decode(encrypted_password)
+        version, data = _split_version(encrypted_password)
+
+        if version is not None:
+            encrypted_data = base64.b64decode(data)
+            salt, nonce, tag, ciphertext = _split_blob(encrypted_data)
+
+            params = None
+            if version == TUNED_CIPHERTEXT_VERSION:
+                # Only the session knows its user's KDF parameters
+                params = vault_kdf_params(user_key)
+                if not params:
+                    raise ValueError("No KDF parameters for a v3 ciphertext")
 
-        salt = encrypted_data[:SALT_SIZE]
-        nonce = encrypted_data[SALT_SIZE : SALT_SIZE + 16]
-        tag = encrypted_data[SALT_SIZE + 16 : SALT_SIZE + 32]
-        ciphertext = encrypted_data[SALT_SIZE + 32 :]
+            key = derive_entry_key(get_vault_key(user_key, params), salt)
 
-        key = derive_key(user_key, salt)
+            cipher = AES.new(key, AES.MODE_EAX, nonce=nonce)
+            cipher.update(version.encode())
+        else:
+            encrypted_data = base64.b64decode(encrypted_password)
+            salt, nonce, tag, ciphertext = _split_blob(encrypted_data)
+
+            # Legacy blobs: one full PBKDF2 run per entry, memoized per session
+            key = derive_key_cached(user_key, salt)
+
+            cipher = AES.new(key, AES.MODE_EAX, nonce=nonce)
 
-        cipher = AES.new(key, AES.MODE_EAX, nonce=nonce)
         decrypted_password = cipher.decrypt_and_verify(ciphertext, tag)
 
         return decrypted_password.decode()
@@ -69,6 +581,138 @@ def decrypt_password(encrypted_password, user_key):
         }
 
 
+def create_decryption_pool(workers=None):
+    """Create a process pool for decrypt_many that callers can reuse."""
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    # Spawn, not fork: other threads may hold the key cache lock
+    return ProcessPoolExecutor(
+        max_workers=workers or os.cpu_count() or 1,
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+
+
+@traced("crypto.decrypt_many")
+def decrypt_many(entries, user_key, workers=None, executor=None):
+    """
+    Decrypt a batch of ciphertexts, preserving input order.
+
+    Versioned blobs are cheap and decrypted in-process; legacy blobs need a
+    full PBKDF2 run each and are fanned out over a process pool. A failed entry
+    yields decrypt_password's error dict instead of aborting the batch. Pass an
+    `executor` from create_decryption_pool to reuse one pool across batches.
+    """
+    results = [None] * len(entries)
+    legacy_indexes = []
+
+    for index, encrypted_password in enumerate(entries):
+        # v3 blobs also need the session's KDF parameters, which workers lack
+        if _split_version(encrypted_password)[0] is not None:
+            results[index] = decrypt_password(encrypted_password, user_key)
+        else:
+            legacy_indexes.append(index)
+
+    workers = workers or os.cpu_count() or 1
+    workers = min(workers, len(legacy_indexes))
+
+    if len(legacy_indexes) >= PARALLEL_DECRYPT_THRESHOLD and (
+        executor is not None or workers > 1
+    ):
+        from concurrent.futures.process import BrokenProcessPool
+
+        legacy_entries = [entries[index] for index in legacy_indexes]
+        chunksize = max(1, len(legacy_entries) // (workers * 4))
+
+        try:
+            if executor is not None:
+                decrypted = list(
+                    executor.map(
+                        decrypt_password,
+                        legacy_entries,
+                        repeat(user_key),
+                        chunksize=chunksize,
+                    )
+                )
+            else:
+                with create_decryption_pool(workers) as pool:
+                    decrypted = list(
+                        pool.map(
+                            decrypt_password,
+                            legacy_entries,
+                            repeat(user_key),
+                            chunksize=chunksize,
+                        )
+                    )
+
+            for index, decrypted_password in zip(legacy_indexes, decrypted):
+                results[index] = decrypted_password
+        except (BrokenProcessPool, OSError) as e:
+            # No usable process pool; finish the batch serially below
+            logger.warning(
+                "Decryption pool failed (%s); decrypting %d entries serially",
+                e,
+                len(legacy_indexes),
+            )
+
+    for index in legacy_indexes:
+        if results[index] is None:
+            results[index] = decrypt_password(entries[index], user_key)
+
+    return results
+
+
+@traced("crypto.decrypt_password_cached")
+def decrypt_password_cached(encrypted_password, user_key):
+    """Same as decrypt_password, served from the pre-decryption cache."""
+    plaintext = _plaintext_cache.get(encrypted_password)
+
+    if plaintext is None:
+        plaintext = decrypt_password(encrypted_password, user_key)
+
+        if isinstance(plaintext, str):
+            _plaintext_cache.put(encrypted_password, plaintext)
+
+    return plaintext
+
+
+def predecrypt_passwords(encrypted_passwords, progress_callback=None):
+    """
+    Decrypt ciphertexts ahead of use into the pre-decryption cache.
+
+    Entries no longer in `encrypted_passwords` are evicted first.
+    `progress_callback(done)` is called after every entry; raising from it
+    stops the run. Returns the number of entries now cached.
+    """
+    _plaintext_cache.retain(encrypted_passwords)
+
+    user_id = get_user_id()
+
+    if isinstance(user_id, dict):
+        return 0
+
+    user_key = get_user_key(user_id)
+
+    if isinstance(user_key, dict):
+        return 0
+
+    cached = 0
+
+    for done, encrypted_password in enumerate(encrypted_passwords, start=1):
+        if isinstance(decrypt_password_cached(encrypted_password, user_key), str):
+            cached += 1
+
+        if progress_callback:
+            progress_callback(done)
+
+    return cached
+
+
+def clear_plaintext_cache():
+    """Zeroize every pre-decrypted password held in memory."""
+    _plaintext_cache.clear()
+
+
 def get_env_path():
     """
     Resolve the path to the .env file.
@@ -81,19 +725,65 @@ def get_env_path():
 
 def get_user_id():
     """Retrieve the user ID of the currently logged-in user."""
+    # Identity cached from the access token, no network round trip
+    user_id = current_session.cached_user_id()
+
+    if user_id:
+        return user_id
+
     try:
+        record_request("auth", "get_user")
         user_response = supabase.auth.get_user()
         user = getattr(user_response, "user", None)
 
         if not user or not getattr(user, "id", None):
             return {"success": False, "message": "User ID not found."}
 
+        # Cache the identity of a persisted login for the next calls
+        auth_session = supabase.auth.get_session()
+        if auth_session:
+            current_session.set_identity(auth_session.access_token)
+
         return user.id
 
     except Exception as e:
         return {"success": False, "message": f"Error retrieving user: {str(e)}"}
 
 
+def get_user_key(user_id=None):
+    """Return the user's encryption key, querying `user_keys` at most once."""
+    if user_id is None:
+        user_id = current_session.user_id or get_user_id()
+
+        if isinstance(user_id, dict):
+            return user_id
+
+    if current_session.user_id == user_id and current_session.user_key:
+        return current_session.user_key
+
+    try:
+        response = select_user_keys(user_id)
+    except Exception as e:
+        return {
+            "success": False,
+            "message": f"Error retrieving encryption key: {str(e)}",
+        }
+
+    if not response.data or not response.data[0].get("encryption_salt"):
+        return {
+            "success": False,
+            "message": "Error: Encryption key not found for this user.",
+        }
+
+    user_key = response.data[0]["encryption_salt"]
+    current_session.remember_user_key(
+        user_id, user_key, parse_kdf_params(response.data[0].get("kdf_params"))
+    )
+
+    return user_key
+
+
+@accounted("add")
 def add_password(service_name, username, plain_password):
     """Add a new password entry to Supabase."""
     user_id_response = get_user_id()
@@ -103,19 +793,11 @@ def add_password(service_name, username, plain_password):
 
     user_id = user_id_response  # Extract actual user ID
 
-    # Fetch user's encryption key
-    response = (
-        supabase.table("user_keys")
-        .select("encryption_salt")
-        .eq("user_id", user_id)
-        .single()
-        .execute()
-    )
-
-    if not response.get("data"):
-        return "Error: Encryption key not found for this user."
+    # User's encryption key from the session
+    user_key = get_user_key(user_id)
 
-    user_key = response["data"].get("encryption_salt")
+    if isinstance(user_key, dict):
+        return user_key["message"]
 
     # Encrypt the password
     encrypted_password = encrypt_password(plain_password, user_key)
@@ -134,7 +816,8 @@ def add_password(service_name, username, plain_password):
             .execute()
         )
 
-        if "data" in insert_response:
+        if insert_response.data:
+            _cache_rows(user_id, insert_response.data)
             return "Password added successfully"
         else:
             return "Failed to add password"
@@ -143,6 +826,7 @@ def add_password(service_name, username, plain_password):
         return f"Database error: {str(e)}"
 
 
+@accounted("view")
 def retrieve_password(service_name):
     """Retrieve and decrypt a password from Supabase."""
     user_id_response = get_user_id()
@@ -152,36 +836,20 @@ def retrieve_password(service_name):
 
     user_id = user_id_response
 
-    key_response = (
-        supabase.table("user_keys")
-        .select("encryption_salt")
-        .eq("user_id", user_id)
-        .single()
-        .execute()
-    )
+    user_key = get_user_key(user_id)
 
-    if not key_response.get("data"):
-        return "Error: Encryption key not found."
+    if isinstance(user_key, dict):
+        return user_key["message"]
 
-    user_key = key_response["data"].get("encryption_salt")
+    entry = get_password_entry(service_name, user_id=user_id)
 
-    response = (
-        supabase.table("passwords")
-        .select("service_name, username, encrypted_password")
-        .eq("user_id", user_id)
-        .eq("service_name", service_name)
-        .execute()
-    )
-
-    if not response.get("data"):
+    if entry is None:
         return f"No entry found for service: {service_name}"
 
-    entry = response["data"][0]
-
     decrypted_password = decrypt_password(entry["encrypted_password"], user_key)
 
-    if "Error" in decrypted_password:
-        return decrypted_password  # Directly return the decryption error
+    if isinstance(decrypted_password, dict):
+        return decrypted_password["message"]  # Directly return the decryption error
 
     return {
         "success": True,
@@ -191,32 +859,360 @@ def retrieve_password(service_name):
     }
 
 
+def _cache_rows(user_id, rows):
+    """Write rows returned by Supabase through to the local cache."""
+    rows = [row for row in rows or [] if isinstance(row, dict) and "id" in row]
+
+    if not rows:
+        return
+
+    try:
+        get_vault_cache().upsert(user_id, rows)
+    except Exception:
+        # A cache that missed a write is stale; refill it on the next listing
+        try:
+            get_vault_cache().set_meta(user_id, "populated", "0")
+        except Exception:
+            pass
+
+
+def _parse_timestamp(value):
+    """Parse an ISO 8601 timestamp from PostgREST into an aware datetime."""
+    parsed = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed
+
+
+def _latest_timestamp(rows, field, latest=None):
+    """Return the newest `field` value of rows, or `latest` if newer."""
+    newest = _parse_timestamp(latest) if latest else None
+
+    for row in rows:
+        if not row.get(field):
+            continue
+
+        parsed = _parse_timestamp(row[field])
+        if newest is None or parsed > newest:
+            latest, newest = row[field], parsed
+
+    return latest
+
+
+def refresh_vault_cache(user_id=None):
+    """Replace the local cache with the user's rows from Supabase."""
+    user_id = user_id or get_user_id()
+
+    if isinstance(user_id, dict):
+        return user_id["message"]
+
+    started = time.time()
+    rows = [
+        row
+        for page in _iter_password_pages(user_id, ", ".join(CACHE_COLUMNS))
+        for row in page
+    ]
+    cache = get_vault_cache()
+    cache.replace_all(user_id, rows)
+    _save_sync_cursors(cache, user_id, rows, started)
+
+    return f"Cached {len(rows)} passwords."
+
+
+def _later(first, second):
+    """Return the later of two timestamps, either of which may be None."""
+    if first is None or (
+        second is not None and _parse_timestamp(second) > _parse_timestamp(first)
+    ):
+        return second
+    return first
+
+
+def _merge_delta(cursor, rows, field, started):
+    """
+    Return the rows of a delta read not merged before, and the new cursor.
+
+    A cursor records what earlier reads merged: every row stamped at or
+    before its "floor", plus the [id, stamp] pairs in "seen". Reads fetch
+    the rows stamped after the floor, begun at time.time() `started`. The
+    floor trails the newest stamp merged by SYNC_OVERLAP, so writes that
+    committed late are still found, and catches up with it once
+    SYNC_OVERLAP has passed since the read that saw it ("pending"), so an
+    idle vault is not re-read for ever.
+    """
+    cursor = cursor or {}
+    seen = {tuple(pair) for pair in cursor.get("seen", ())}
+    fresh = [row for row in rows if (row["id"], row[field]) not in seen]
+    watermark = _latest_timestamp(fresh, field, cursor.get("watermark"))
+    floor = cursor.get("floor")
+    pending = cursor.get("pending")
+
+    if pending and started - pending[1] >= SYNC_OVERLAP.total_seconds():
+        # Everything stamped up to the pending watermark had committed
+        # before this read began
+        floor, pending = _later(floor, pending[0]), None
+
+    if watermark:
+        overlap_start = _parse_timestamp(watermark) - SYNC_OVERLAP
+        floor = _later(floor, overlap_start.isoformat())
+        if pending is None and watermark != floor:
+            pending = [watermark, started]
+
+    seen |= {(row["id"], row[field]) for row in fresh}
+    if floor is not None:
+        seen = {
+            pair for pair in seen if _parse_timestamp(pair[1]) > _parse_timestamp(floor)
+        }
+
+    return fresh, {
+        "watermark": watermark,
+        "floor": floor,
+        "seen": [list(pair) for pair in seen],
+        "pending": pending,
+    }
+
+
+def _get_cursor(cache, user_id, key):
+    value = cache.get_meta(user_id, key)
+    return json.loads(value) if value else None
+
+
+def _save_sync_cursors(cache, user_id, rows, started):
+    """Record the cursors of a cache just filled with all of `rows`."""
+    # Later syncs only fetch what changed after the rows seen here. Rows
+    # deleted before the overlap are already missing, so tombstones are
+    # looked for from the same point.
+    _, cursor = _merge_delta(None, rows, "updated_at", started)
+    if cursor["watermark"]:
+        cache.set_meta(user_id, SYNC_CURSOR_KEY, json.dumps(cursor))
+        cache.set_meta(
+            user_id, SYNC_DELETED_CURSOR_KEY, json.dumps({"floor": cursor["floor"]})
+        )
+
+
+def _deleted_ids_since(user_id, cursor, page_size, started):
+    """Return the ids of rows deleted since cursor and the new cursor."""
+    try:
+        tombstones = [
+            row
+            for page in Password.iter_deletions(user_id, cursor["floor"], page_size)
+            for row in page
+        ]
+    except Exception as e:
+        if getattr(e, "code", None) not in MISSING_TABLE_CODES:
+            raise
+
+        # No tombstone table: find deletions by diffing the id sets
+        remote_ids = {
+            row["id"]
+            for page in _iter_password_pages(user_id, "id", EXPORT_PAGE_SIZE)
+            for row in page
+        }
+        cached_ids = {row["id"] for row in get_vault_cache().list(user_id)}
+        return sorted(cached_ids - remote_ids), cursor
+
+    tombstones, cursor = _merge_delta(cursor, tombstones, "deleted_at", started)
+    return [row["id"] for row in tombstones], cursor
+
+
+def sync_vault(user_id=None, page_size=LIST_PAGE_SIZE):
+    """
+    Bring the local cache up to date with Supabase.
+
+    Only rows changed and tombstones of rows deleted since the last sync are
+    fetched and merged, so a sync with nothing to do costs one short page per
+    table whatever the vault size. Recent stamps are read again for a while,
+    so writes that committed late are not missed (see _merge_delta). Without
+    a cursor, or after a cache write failed, the cache is reloaded in full.
+    """
+    user_id = user_id or get_user_id()
+
+    if isinstance(user_id, dict):
+        return user_id["message"]
+
+    cache = get_vault_cache()
+    cursor = _get_cursor(cache, user_id, SYNC_CURSOR_KEY)
+    deleted_cursor = _get_cursor(cache, user_id, SYNC_DELETED_CURSOR_KEY)
+
+    if cursor is None or deleted_cursor is None or not cache.is_populated(user_id):
+        return refresh_vault_cache(user_id)
+
+    started = time.time()
+    fetched = [
+        row
+        for page in Password.iter_passwords(
+            user_id, page_size, updated_after=cursor["floor"]
+        )
+        for row in page
+    ]
+    changed, cursor = _merge_delta(cursor, fetched, "updated_at", started)
+    deleted_ids, deleted_cursor = _deleted_ids_since(
+        user_id, deleted_cursor, page_size, started
+    )
+
+    # Deletions last: a row changed and then deleted must end up gone
+    cache.upsert(user_id, changed)
+    deleted = cache.delete(user_id, deleted_ids)
+
+    cache.set_meta(user_id, SYNC_CURSOR_KEY, json.dumps(cursor))
+    cache.set_meta(user_id, SYNC_DELETED_CURSOR_KEY, json.dumps(deleted_cursor))
+
+    return f"Synced {len(changed)} changed and {deleted} deleted passwords."
+
+
+def start_cache_refresh(user_id=None):
+    """Run sync_vault on a background daemon thread."""
+    thread = threading.Thread(
+        target=sync_vault,
+        args=(user_id,),
+        name="vault-cache-refresh",
+        daemon=True,
+    )
+    thread.start()
+    return thread
+
+
 def list_passwords():
-    """List all stored passwords from Supabase for the logged-in user."""
+    """
+    List all stored passwords for the logged-in user.
+
+    Served from the local cache; Supabase is only queried to fill it the
+    first time, so listing also works offline once the cache is populated.
+    Entries carry their id and ciphertext, so viewing one needs no request.
+    """
     user_id = get_user_id()
 
-    if not user_id:
+    if isinstance(user_id, dict):
         return "Error: No authenticated user found."
 
+    cache = get_vault_cache()
+
+    if not cache.is_populated(user_id):
+        try:
+            refresh_vault_cache(user_id)
+        except Exception as e:
+            return f"Error: Could not load passwords: {str(e)}"
+
+    return cache.list(user_id)
+
+
+def list_password_pages(page_size=LIST_PAGE_SIZE, after=None):
+    """
+    List the logged-in user's passwords one page at a time.
+
+    Returns a generator of row lists ordered by (service_name, id), or an
+    error message. `after` is the (service_name, id) of the last row already
+    seen, to resume a listing. Pages come from the local cache once it is
+    populated, after a delta sync; otherwise they are read from Supabase and
+    cached as they arrive.
+    """
+    user_id = get_user_id()
+
+    if isinstance(user_id, dict):
+        return "Error: No authenticated user found."
+
+    cache = get_vault_cache()
+
+    if cache.is_populated(user_id):
+        import httpx  # Imported with the client, on first use
+
+        try:
+            sync_vault(user_id, page_size)
+        except (httpx.HTTPError, OSError) as e:
+            # Offline: list what the cache has
+            logger.warning("Vault sync failed (%s); listing cached passwords", e)
+
+        return cache.iter_pages(user_id, page_size, after)
+
+    return _iter_remote_pages(user_id, page_size, after)
+
+
+def _iter_remote_pages(user_id, page_size, after):
+    started = time.time()
+    rows = []
+
+    for page in Password.iter_passwords(user_id, page_size, after):
+        if after is None:
+            rows.extend(page)
+        else:
+            _cache_rows(user_id, page)
+        yield page
+
+    # A complete listing replaces the cache, dropping rows deleted elsewhere
+    if after is None:
+        cache = get_vault_cache()
+        cache.replace_all(user_id, rows)
+        _save_sync_cursors(cache, user_id, rows, started)
+
+
+def get_password_entry(service_name, username=None, user_id=None):
+    """Return the encrypted row for a service, from the cache or Supabase."""
+    user_id = user_id or get_user_id()
+
+    if isinstance(user_id, dict):
+        return None
+
+    cache = get_vault_cache()
+    entry = cache.find(user_id, service_name, username)
+
+    if entry is not None or cache.is_populated(user_id):
+        return entry
+
+    # Cache miss on a cold cache: read through and remember the row
+    query = (
+        supabase.table("passwords")
+        .select(", ".join(CACHE_COLUMNS))
+        .eq("user_id", user_id)
+        .eq("service_name", service_name)
+    )
+    if username is not None:
+        query = query.eq("username", username)
+
+    response = query.limit(1).execute()
+
+    if not response.data:
+        return None
+
+    _cache_rows(user_id, response.data)
+    return response.data[0]
+
+
+@accounted("update")
+def update_password(user_id, entry_id, new_service, new_username, encrypted_password):
+    """Update an entry in Supabase and the local cache; returns updated rows."""
     response = (
         supabase.table("passwords")
-        .select("service_name, username")
+        .update(
+            {
+                "service_name": new_service,
+                "username": new_username,
+                "encrypted_password": encrypted_password,
+            }
+        )
         .eq("user_id", user_id)
+        .eq("id", entry_id)
         .execute()
     )
 
-    if response.data:
-        return response.data
-    else:
-        return []
+    _cache_rows(user_id, response.data)
+    return response.data
 
 
-def generate_password(length=16):
-    import random
-    import string
+@accounted("delete")
+def delete_password(user_id, entry_id):
+    """Delete an entry from Supabase and the local cache; returns deleted rows."""
+    response = (
+        supabase.table("passwords")
+        .delete()
+        .eq("user_id", user_id)
+        .eq("id", entry_id)
+        .execute()
+    )
 
-    characters = string.ascii_letters + string.digits + string.punctuation
-    return "".join(random.choice(characters) for i in range(0, length))
+    if response.data:
+        get_vault_cache().delete(user_id, [row["id"] for row in response.data])
+
+    return response.data
 
 
 def is_base64(s):
@@ -228,102 +1224,563 @@ def is_base64(s):
         return False
 
 
-def export_passwords(decrypt=None):
-    """Export passwords from Supabase to a local file."""
+def _iter_password_pages(
+    user_id, columns, page_size=EXPORT_PAGE_SIZE, updated_after=None
+):
+    """Yield pages of the user's passwords, using keyset pagination on id."""
+    last_id = None
+
+    while True:
+        query = (
+            supabase.table("passwords")
+            .select(columns)
+            .eq("user_id", user_id)
+            .order("id")
+            .limit(page_size)
+        )
+        if updated_after is not None:
+            query = query.gt("updated_at", updated_after)
+        if last_id is not None:
+            query = query.gt("id", last_id)
+
+        page = query.execute().data or []
+
+        if page:
+            yield page
+
+        if len(page) < page_size:
+            return
+
+        last_id = page[-1]["id"]
+
+
+def _prefetch(pages):
+    """Iterate pages while the next one is fetched on a background thread."""
+    pages = iter(pages)
+
+    with ThreadPoolExecutor(max_workers=1) as fetcher:
+        pending = fetcher.submit(next, pages, None)
+
+        while True:
+            page = pending.result()
+
+            if page is None:
+                return
+
+            pending = fetcher.submit(next, pages, None)
+            yield page
+
+
+def _load_export_state(backup_dir, user_id):
+    """Return the last export's base and cursors for user_id, or None."""
+    try:
+        with open(os.path.join(backup_dir, EXPORT_STATE_FILE), "r") as f:
+            return json.load(f).get(user_id)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_export_state(backup_dir, user_id, state):
+    """Record the base and cursors of the export that just finished."""
+    path = os.path.join(backup_dir, EXPORT_STATE_FILE)
+
+    try:
+        with open(path, "r") as f:
+            states = json.load(f)
+    except (OSError, ValueError):
+        states = {}
+
+    states[user_id] = state
+
+    with open(f"{path}.part", "w") as f:
+        json.dump(states, f)
+    os.replace(f"{path}.part", path)
+
+
+@accounted("export")
+def export_passwords(
+    decrypt=None, page_size=EXPORT_PAGE_SIZE, incremental=False, progress_callback=None
+):
+    """
+    Export passwords from Supabase to a local file.
+
+    Rows are fetched page by page, with the next page downloading while the
+    current one is decrypted and written, so memory stays flat for any vault
+    size. The backup uses the structured format from modules.backup; it is
+    written next to its final path and moved into place once complete.
+
+    With `incremental`, only rows changed since the last export, plus the
+    tombstones of rows deleted since, are written to a delta file on top of
+    the last full backup; recent stamps are read again for a while so late
+    commits are not missed (see _merge_delta). Without a usable previous
+    export or a tombstone table a full backup is made.
+    `progress_callback(exported)` is called after every page.
+    """
     user_id = get_user_id()
 
-    if not user_id:
+    if isinstance(user_id, dict):
         return "Error: No authenticated user found."
 
-    response = (
-        supabase.table("passwords")
-        .select("service_name, username, encrypted_password")
-        .eq("user_id", user_id)
-        .execute()
-    )
+    user_key = None
 
-    if not response.data:
-        return "No passwords found in Supabase."
+    if decrypt:
+        user_key = get_user_key(user_id)
+
+        if isinstance(user_key, dict):
+            return user_key["message"]
 
     backup_dir = os.path.join(os.getcwd(), "backup")
     os.makedirs(backup_dir, exist_ok=True)
 
-    today = datetime.datetime.now().strftime("%Y-%m-%d")
-    path = os.path.join(backup_dir, f"{today}.txt")
+    state = _load_export_state(backup_dir, user_id) if incremental else None
 
-    if decrypt:
+    # A delta must match its base's encryption mode and needs cursors
+    if state and (
+        state.get("encrypted") != (not decrypt)
+        or not state.get("cursor")
+        or not state.get("deleted_cursor")
+        or not os.path.exists(os.path.join(backup_dir, state["base"]))
+    ):
+        state = None
 
-        # Fetch user's encryption key
-        key_response = (
-            supabase.table("user_keys")
-            .select("encryption_salt")
-            .eq("user_id", user_id)
-            .single()
-            .execute()
-        )
-        user_key = key_response.data["encryption_salt"]
+    started = time.time()
+    deletions = []
 
+    if state:
         try:
-            with open(path, "w") as f:
-                for entry in response.data:
-                    decrypted_password = decrypt_password(
-                        entry["encrypted_password"], user_key
-                    )
+            deletions = [
+                row
+                for page in Password.iter_deletions(
+                    user_id, state["deleted_cursor"]["floor"], page_size
+                )
+                for row in page
+            ]
+        except Exception as e:
+            if getattr(e, "code", None) not in MISSING_TABLE_CODES:
+                return f"Error exporting passwords: {str(e)}"
 
-                    f.write(
-                        f"Service: {entry["service_name"]}, Username: {entry["username"]}, Password: {decrypted_password}\n"
-                    )
+            state = None  # Deletions cannot be seen without tombstones
 
-            return f"Passwords exported successfully to {path}"
-        except Exception as e:
-            return f"Error exporting passwords: {str(e)}"
+    now = datetime.datetime.now()
+
+    if state:
+        path = os.path.join(
+            backup_dir, f"{now:%Y-%m-%d-%H%M%S-%f}.delta{BACKUP_EXTENSION}"
+        )
+        header_fields = {
+            "kind": DELTA_BACKUP,
+            "base": state["base"],
+            "base_created_at": state["base_created_at"],
+            "since": state["cursor"]["floor"],
+        }
+        updated_after = state["cursor"]["floor"]
+        deletions, deleted_cursor = _merge_delta(
+            state["deleted_cursor"], deletions, "deleted_at", started
+        )
+    else:
+        path = os.path.join(backup_dir, f"{now:%Y-%m-%d-%H%M%S-%f}{BACKUP_EXTENSION}")
+        header_fields = {"kind": FULL_BACKUP}
+        updated_after = None
+
+    partial_path = f"{path}.part"
+
+    # One process pool for every page, only if there are cores to use
+    pool = (
+        create_decryption_pool()
+        if decrypt and (os.cpu_count() or 1) > 1
+        else contextlib.nullcontext()
+    )
+
+    exported = 0
+    deleted_ids = [row["id"] for row in deletions]
+    cursor = state["cursor"] if state else None
+    seen = {tuple(pair) for pair in cursor["seen"]} if cursor else set()
+    stamps = []  # Only ids and stamps are kept to move the cursor on
 
     try:
-        with open(path, "w") as f:
-            for entry in response.data:
-                f.write(
-                    f"Service: {entry["service_name"]}, Username: {entry["username"]}, Password: {entry["encrypted_password"]}\n"
+        with BackupWriter(
+            partial_path, encrypted=not decrypt, **header_fields
+        ) as writer, pool as executor:
+            pages = _iter_password_pages(
+                user_id,
+                "id, service_name, username, encrypted_password, updated_at",
+                page_size,
+                updated_after=updated_after,
+            )
+
+            for page in _prefetch(pages):
+                page = [
+                    row for row in page if (row["id"], row["updated_at"]) not in seen
+                ]
+                if not page:
+                    continue
+
+                passwords = [entry["encrypted_password"] for entry in page]
+
+                if decrypt:
+                    passwords = decrypt_many(passwords, user_key, executor=executor)
+
+                for entry, password in zip(page, passwords):
+                    writer.write({**entry, "password": password})
+
+                stamps.extend(
+                    {"id": entry["id"], "updated_at": entry["updated_at"]}
+                    for entry in page
                 )
+                exported += len(page)
+
+                if progress_callback:
+                    progress_callback(exported)
+
+            # Deletions last: a row changed and then deleted must end up gone
+            for entry_id in deleted_ids:
+                writer.write_deletion(entry_id)
+
+            base_created_at = writer.header["created_at"]
+
+        _, cursor = _merge_delta(cursor, stamps, "updated_at", started)
+
+        # A full backup holds no row deleted before the overlap of its newest
+        # change, so the first delta looks for tombstones from there
+        if not state:
+            deleted_cursor = {"floor": cursor["floor"] if cursor else None}
 
+        new_state = {
+            "base": state["base"] if state else os.path.basename(path),
+            "base_created_at": state["base_created_at"] if state else base_created_at,
+            "encrypted": not decrypt,
+            "cursor": cursor,
+            "deleted_cursor": deleted_cursor,
+        }
+
+        if not exported and not deleted_ids:
+            os.remove(partial_path)
+            if state:
+                # The cursors still move on, letting the re-read window close
+                _save_export_state(backup_dir, user_id, new_state)
+                return "No changes since the last export."
+            return "No passwords found in Supabase."
+
+        os.replace(partial_path, path)
+        _save_export_state(backup_dir, user_id, new_state)
+
+        if state:
+            return (
+                f"Incremental export saved to {path} "
+                f"({exported} changed, {len(deleted_ids)} deleted)"
+            )
         return f"Passwords exported successfully to {path}"
     except Exception as e:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
         return f"Error exporting passwords: {str(e)}"
 
 
-def import_passwords(path):
-    """Import passwords from a local file to Supabase."""
+def _prepare_batch(batch, user_id, user_key, errors):
+    """Decrypt and re-encrypt one batch of parsed entries into insertable rows."""
+    passwords = [entry["password"] for _, entry, _ in batch]
+
+    # Encrypted backups are decrypted in parallel, then re-encrypted in the
+    # current format (cheap, per-entry HKDF)
+    encrypted_indexes = [i for i, (_, _, encrypted) in enumerate(batch) if encrypted]
+    decrypted = decrypt_many([passwords[i] for i in encrypted_indexes], user_key)
+    for index, decrypted_password in zip(encrypted_indexes, decrypted):
+        passwords[index] = decrypted_password
+
+    rows = []
+    for (label, entry, _), password in zip(batch, passwords):
+        if isinstance(password, dict):
+            errors.append(f"{label}: {password['message']}")
+            continue
+
+        rows.append(
+            {
+                "user_id": user_id,
+                "service_name": entry["service_name"],
+                "username": entry["username"],
+                "encrypted_password": encrypt_password(password, user_key),
+            }
+        )
+
+    return rows
+
+
+def _import_entries(entries, user_id, user_key, batch_size, progress_callback):
+    """
+    Insert (label, entry, encrypted) triples in batches; returns counters.
+
+    Batches go through the async PasswordRepository, up to BULK_CONCURRENCY
+    of them in flight at once. Progress is reported after each such round.
+    """
+    import asyncio
+
+    from modules.repository import BULK_CONCURRENCY, PasswordRepository
+
+    imported = 0
+    processed = 0
+    errors = []
+    batch = []
+    prepared = []  # (label, rows) of batches waiting for the next round
+
+    loop = asyncio.new_event_loop()
+    repository = PasswordRepository()
+
+    def queue(batch):
+        rows = _prepare_batch(batch, user_id, user_key, errors)
+        if rows:
+            prepared.append((f"{batch[0][0]} - {batch[-1][0]}", rows))
+
+    def insert_prepared():
+        nonlocal imported
+
+        results = loop.run_until_complete(
+            repository.insert_rows(user_id, [rows for _, rows in prepared])
+        )
+        for (label, _), (inserted, error) in zip(prepared, results):
+            imported += inserted
+            if error:
+                errors.append(f"{label}: {error}")
+
+        prepared.clear()
+
+        if progress_callback:
+            progress_callback(imported, processed)
+
+    try:
+        for label, entry, encrypted in entries:
+            processed += 1
+
+            if entry is None:
+                errors.append(f"{label}: Invalid format")
+                continue
+
+            batch.append((label, entry, encrypted))
+
+            if len(batch) >= batch_size:
+                queue(batch)
+                batch = []
+
+                if len(prepared) >= BULK_CONCURRENCY:
+                    insert_prepared()
+
+        if batch:
+            queue(batch)
+
+        insert_prepared()
+    finally:
+        loop.run_until_complete(repository.aclose())
+        loop.close()
+
+    return imported, processed, errors
+
+
+def _import_summary(path, imported, processed, errors):
+    """Format the result message of an import or restore."""
+    if not errors:
+        return f"Successfully imported accounts from: {path}"
+
+    summary = "\n".join(errors[:IMPORT_ERRORS_SHOWN])
+    if len(errors) > IMPORT_ERRORS_SHOWN:
+        summary += f"\n... and {len(errors) - IMPORT_ERRORS_SHOWN} more"
+
+    return f"Imported {imported} of {processed} accounts from: {path}\n{summary}"
+
+
+@accounted("import")
+def import_passwords(path, batch_size=IMPORT_BATCH_SIZE, progress_callback=None):
+    """
+    Import passwords from a local file to Supabase.
+
+    Both structured backups (checksum verified first) and legacy text
+    backups are accepted. The file is streamed and inserted in batches of
+    `batch_size` rows, one request per batch, with several batches in flight
+    at once. Invalid lines and failed rows are reported in the result instead
+    of aborting the import. `progress_callback(imported, processed)` is
+    called after every round of concurrent batches.
+    """
     if not os.path.exists(path):
         return "Error: File not found."
 
+    user_id = get_user_id()
+
+    if isinstance(user_id, dict):
+        return user_id["message"]
+
+    user_key = get_user_key(user_id)
+
+    if isinstance(user_key, dict):
+        return user_key["message"]
+
     try:
-        with open(path, "r") as f:
-            lines = f.readlines()
-            for line in lines:
-                parts = line.strip().split(", ")
-                if len(parts) != 3:
-                    print(f"Skipping invalid line: {line.strip()}")
-                    continue
+        if is_structured_backup(path):
+            # The header says whether passwords are encrypted, no guessing
+            encrypted = verify_backup(path)["encrypted"]
+            entries = (
+                (f"Line {line_number}", entry, encrypted)
+                for line_number, entry in iter_backup(path)
+            )
+        else:
+            entries = (
+                (
+                    f"Line {line_number}",
+                    entry,
+                    entry is not None and is_encrypted(entry["password"]),
+                )
+                for line_number, entry in iter_legacy_backup(path)
+            )
+
+        imported, processed, errors = _import_entries(
+            entries, user_id, user_key, batch_size, progress_callback
+        )
+    except Exception as e:
+        return f"Error importing passwords: {str(e)}"
+
+    return _import_summary(path, imported, processed, errors)
 
-                service = parts[0].split(": ")[1]
-                username = parts[1].split(": ")[1]
-                password = parts[2].split(": ")[1]
 
-                if is_base64(password):
-                    user_id = get_user_id()
+@accounted("import")
+def restore_passwords(
+    base_path, delta_paths=None, batch_size=IMPORT_BATCH_SIZE, progress_callback=None
+):
+    """
+    Restore a full backup with its incremental deltas replayed on top.
+
+    When `delta_paths` is None, the deltas recorded against the base in the
+    same directory are used. Anything other than a structured full backup is
+    imported as-is.
+    """
+    if not os.path.exists(base_path):
+        return "Error: File not found."
+
+    if not is_structured_backup(base_path):
+        return import_passwords(base_path, batch_size, progress_callback)
+
+    user_id = get_user_id()
+
+    if isinstance(user_id, dict):
+        return user_id["message"]
+
+    user_key = get_user_key(user_id)
+
+    if isinstance(user_key, dict):
+        return user_key["message"]
+
+    try:
+        if delta_paths is None:
+            delta_paths = find_deltas(base_path)
+
+        header, entries = replay_backups(base_path, delta_paths)
+        imported, processed, errors = _import_entries(
+            (
+                (f"Entry {entry_id}", entry, header["encrypted"])
+                for entry_id, entry in entries.items()
+            ),
+            user_id,
+            user_key,
+            batch_size,
+            progress_callback,
+        )
+    except Exception as e:
+        return f"Error restoring passwords: {str(e)}"
+
+    return _import_summary(base_path, imported, processed, errors)
 
-                    # Fetch user's encryption key
-                    key_response = (
-                        supabase.table("user_keys")
-                        .select("encryption_salt")
-                        .eq("user_id", user_id)
-                        .single()
-                        .execute()
+
+def migrate_vault(progress_callback=None, page_size=MIGRATION_PAGE_SIZE):
+    """
+    Re-encrypt the logged-in user's older passwords in their current format.
+
+    That is v3 for users with stored KDF parameters and v2 for the others.
+    Only rows whose ciphertext lacks its version prefix are read, a page at
+    a time. Once a run leaves nothing to migrate the vault cache remembers
+    it, so later runs make no request at all.
+    """
+    user_id = get_user_id()
+
+    if isinstance(user_id, dict):
+        return user_id["message"]
+
+    user_key = get_user_key(user_id)
+
+    if isinstance(user_key, dict):
+        return user_key["message"]
+
+    cache = get_vault_cache()
+    version = ciphertext_version(user_key)
+
+    if cache.get_meta(user_id, MIGRATED_KEY) == version:
+        return "Vault already migrated."
+
+    migrated = failed = 0
+    last_id = None
+
+    try:
+        while True:
+            query = (
+                supabase.table("passwords")
+                .select("id, encrypted_password")
+                .eq("user_id", user_id)
+                .not_.like("encrypted_password", f"{version}:%")
+                .order("id")
+                .limit(page_size)
+            )
+            if last_id is not None:
+                query = query.gt("id", last_id)
+
+            page = query.execute().data or []
+
+            for entry in page:
+                decrypted_password = decrypt_password(
+                    entry["encrypted_password"], user_key
+                )
+
+                if isinstance(decrypted_password, dict):
+                    failed += 1
+                    if progress_callback:
+                        progress_callback(migrated + failed)
+                    continue
+
+                # Only replace the blob we read, so concurrent edits are not lost
+                update_response = (
+                    supabase.table("passwords")
+                    .update(
+                        {
+                            "encrypted_password": encrypt_password(
+                                decrypted_password, user_key
+                            )
+                        }
                     )
-                    user_key = key_response.data["encryption_salt"]
-                    password = decrypt_password(password, user_key)
+                    .eq("id", entry["id"])
+                    .eq("encrypted_password", entry["encrypted_password"])
+                    .execute()
+                )
+                _cache_rows(user_id, update_response.data)
+                migrated += 1
 
-                # Insert into Supabase
-                add_password(service, username, password)
-        return f"Successfully imported accounts from: {path}"
+                if progress_callback:
+                    progress_callback(migrated + failed)
+
+            if len(page) < page_size:
+                break
+
+            last_id = page[-1]["id"]
     except Exception as e:
-        return f"Error importing passwords: {str(e)}"
+        return f"Error migrating passwords: {str(e)}"
+
+    # Blobs that failed to decrypt are retried on the next run
+    if not failed:
+        cache.set_meta(user_id, MIGRATED_KEY, version)
+
+    return f"Migrated {migrated} of {migrated + failed} legacy passwords."
+
+
+def start_vault_migration(progress_callback=None):
+    """Run migrate_vault on a background daemon thread and return the thread."""
+    thread = threading.Thread(
+        target=migrate_vault,
+        args=(progress_callback,),
+        name="vault-migration",
+        daemon=True,
+    )
+    thread.start()
+    return thread
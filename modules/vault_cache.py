@@ -0,0 +1,291 @@
+import hashlib
+import hmac
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+# Local copy of the user's `passwords` rows. Every row is sealed with a key
+# derived from the user's vault key: only the id is stored in the clear, next
+# to an HMAC of the service name for lookups and an AES-GCM blob holding the
+# service name, username, updated_at and the (still encrypted) password.
+CACHE_PATH = Path(
+    os.getenv("PASSWORD_MANAGER_CACHE", Path.home() / ".password-manager" / "vault.db")
+)
+CACHE_COLUMNS = ("id", "service_name", "username", "encrypted_password", "updated_at")
+
+# Bumped when the layout changes; older caches are dropped and refilled
+SCHEMA_VERSION = 2
+NONCE_SIZE = 12
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS passwords (
+    id INTEGER NOT NULL,
+    user_id TEXT NOT NULL,
+    lookup BLOB NOT NULL,
+    entry BLOB NOT NULL,
+    PRIMARY KEY (user_id, id)
+);
+CREATE INDEX IF NOT EXISTS passwords_by_lookup
+    ON passwords (user_id, lookup);
+CREATE TABLE IF NOT EXISTS meta (
+    user_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT,
+    PRIMARY KEY (user_id, key)
+);
+"""
+
+# Returns the 32-byte key sealing a user's rows, or None while it is not
+# known; modules.utils installs one deriving it from the vault key
+_key_provider = None
+
+
+def set_key_provider(provider):
+    """Install the default `provider(user_id) -> bytes | None` for caches."""
+    global _key_provider
+    _key_provider = provider
+
+
+class _RowKeys:
+    """Subkeys of one user's cache key."""
+
+    def __init__(self, key):
+        self.aead = AESGCM(hmac.new(key, b"entry", hashlib.sha256).digest())
+        self.lookup_key = hmac.new(key, b"lookup", hashlib.sha256).digest()
+
+    def lookup(self, service_name):
+        return hmac.new(self.lookup_key, service_name.encode(), hashlib.sha256).digest()
+
+
+def _by_id(entry):
+    return entry["id"]
+
+
+class VaultCache:
+    """
+    SQLite store of the user's encrypted password rows.
+
+    Without a key for the user, reads find nothing and the cache counts as
+    unpopulated, and writes only mark it stale, so callers fall back to
+    Supabase.
+    """
+
+    def __init__(self, path=CACHE_PATH, key_provider=None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.key_provider = key_provider
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+
+        with self._lock, self._conn:
+            version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+
+            if version < SCHEMA_VERSION:
+                # Earlier caches kept service names and usernames in the clear
+                self._conn.executescript(
+                    "DROP TABLE IF EXISTS passwords; DROP TABLE IF EXISTS meta;"
+                )
+                self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+            self._conn.executescript(_SCHEMA)
+
+        try:
+            os.chmod(self.path, 0o600)  # Only the owner may read the cache
+        except OSError:
+            pass
+
+    def _keys(self, user_id):
+        provider = self.key_provider or _key_provider
+        key = provider(user_id) if provider else None
+        return _RowKeys(key) if key else None
+
+    @staticmethod
+    def _aad(user_id, entry_id):
+        # Binds each blob to its row, so rows cannot be swapped around
+        return f"{user_id}:{entry_id}".encode()
+
+    def _seal(self, keys, user_id, row):
+        entry_id = int(row["id"])
+        payload = json.dumps(
+            {column: row.get(column) for column in CACHE_COLUMNS[1:]},
+            separators=(",", ":"),
+        ).encode()
+        nonce = os.urandom(NONCE_SIZE)
+        blob = nonce + keys.aead.encrypt(nonce, payload, self._aad(user_id, entry_id))
+        return (entry_id, user_id, keys.lookup(row["service_name"]), blob)
+
+    def _open(self, keys, user_id, row):
+        """Decrypt a stored row, or None if it was sealed with another key."""
+        blob = row["entry"]
+
+        try:
+            payload = keys.aead.decrypt(
+                blob[:NONCE_SIZE], blob[NONCE_SIZE:], self._aad(user_id, row["id"])
+            )
+        except InvalidTag:
+            return None
+
+        return {"id": row["id"], **json.loads(payload)}
+
+    def _open_all(self, keys, user_id, rows):
+        entries = (self._open(keys, user_id, row) for row in rows)
+        return [entry for entry in entries if entry is not None]
+
+    def get_meta(self, user_id, key):
+        """Return a stored metadata value or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM meta WHERE user_id = ? AND key = ?",
+                (user_id, key),
+            ).fetchone()
+        return row["value"] if row else None
+
+    def set_meta(self, user_id, key, value):
+        """Store a metadata value for the user."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (user_id, key, value) VALUES (?, ?, ?)",
+                (user_id, key, value),
+            )
+
+    def is_populated(self, user_id):
+        """Checks if the cache has been filled for the user and can be read."""
+        return self.get_meta(user_id, "populated") == "1" and (
+            self._keys(user_id) is not None
+        )
+
+    def replace_all(self, user_id, rows):
+        """Replace every cached row of the user."""
+        keys = self._keys(user_id)
+
+        if keys is None:
+            self.set_meta(user_id, "populated", "0")
+            return
+
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM passwords WHERE user_id = ?", (user_id,))
+            self._insert(self._seal(keys, user_id, row) for row in rows)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (user_id, key, value) "
+                "VALUES (?, 'populated', '1')",
+                (user_id,),
+            )
+
+    def upsert(self, user_id, rows):
+        """Insert or update rows written to or read from Supabase."""
+        keys = self._keys(user_id)
+
+        if keys is None:
+            # The cache misses this write; refill it on the next listing
+            self.set_meta(user_id, "populated", "0")
+            return
+
+        with self._lock, self._conn:
+            self._insert(self._seal(keys, user_id, row) for row in rows)
+
+    def _insert(self, sealed):
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO passwords (id, user_id, lookup, entry) "
+            "VALUES (?, ?, ?, ?)",
+            sealed,
+        )
+
+    def delete(self, user_id, entry_ids):
+        """Remove rows by id and return how many were cached."""
+        with self._lock, self._conn:
+            return self._conn.executemany(
+                "DELETE FROM passwords WHERE user_id = ? AND id = ?",
+                [(user_id, int(entry_id)) for entry_id in entry_ids],
+            ).rowcount
+
+    def _entries(self, user_id):
+        """Every decryptable row of the user, ordered by (service_name, id)."""
+        keys = self._keys(user_id)
+
+        if keys is None:
+            return []
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, entry FROM passwords WHERE user_id = ?", (user_id,)
+            ).fetchall()
+
+        entries = self._open_all(keys, user_id, rows)
+        entries.sort(key=lambda entry: (entry["service_name"], entry["id"]))
+        return entries
+
+    def list(self, user_id):
+        """Return the user's cached rows ordered by service name."""
+        entries = self._entries(user_id)
+        entries.sort(key=lambda entry: (entry["service_name"], entry["username"]))
+        return entries
+
+    def iter_pages(self, user_id, page_size, after=None):
+        """
+        Yield the user's rows page by page, ordered by (service_name, id).
+
+        `after` is the (service_name, id) of the last row already seen. Rows
+        are decrypted and sorted once, when the first page is requested.
+        """
+        entries = self._entries(user_id)
+
+        if after is not None:
+            after = (after[0], int(after[1]))
+            entries = [
+                entry
+                for entry in entries
+                if (entry["service_name"], entry["id"]) > after
+            ]
+
+        for start in range(0, len(entries), page_size):
+            yield entries[start : start + page_size]
+
+    def find(self, user_id, service_name, username=None):
+        """Return the first cached row for a service (and username) or None."""
+        keys = self._keys(user_id)
+
+        if keys is None:
+            return None
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, entry FROM passwords WHERE user_id = ? AND lookup = ?",
+                (user_id, keys.lookup(service_name)),
+            ).fetchall()
+
+        for entry in sorted(self._open_all(keys, user_id, rows), key=_by_id):
+            if username is None or entry["username"] == username:
+                return entry
+        return None
+
+    def clear(self, user_id):
+        """Drop every cached row and metadata value of the user."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM passwords WHERE user_id = ?", (user_id,))
+            self._conn.execute("DELETE FROM meta WHERE user_id = ?", (user_id,))
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_vault_cache():
+    """Return the process-wide vault cache, opening it on first use."""
+    global _cache
+
+    with _cache_lock:
+        if _cache is None:
+            _cache = VaultCache()
+        return _cache
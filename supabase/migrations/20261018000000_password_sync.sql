@@ -0,0 +1,60 @@
+-- Columns and tables the delta sync (modules.utils.sync_vault) reads.
+
+-- Time of each row's last write, stamped by the server
+alter table passwords
+    add column if not exists updated_at timestamptz not null default now();
+
+create index if not exists passwords_user_id_updated_at_idx
+    on passwords (user_id, updated_at);
+
+create or replace function passwords_touch_updated_at()
+returns trigger
+language plpgsql
+as $$
+begin
+    new.updated_at := now();
+    return new;
+end;
+$$;
+
+drop trigger if exists passwords_touch_updated_at on passwords;
+create trigger passwords_touch_updated_at
+    before update on passwords
+    for each row execute function passwords_touch_updated_at();
+
+-- Ids of deleted passwords, so clients can drop them from their caches
+create table if not exists password_tombstones (
+    id bigint primary key,  -- same type as passwords.id
+    user_id uuid not null,
+    deleted_at timestamptz not null default now()
+);
+
+create index if not exists password_tombstones_user_id_deleted_at_idx
+    on password_tombstones (user_id, deleted_at);
+
+alter table password_tombstones enable row level security;
+
+drop policy if exists "Users read their own tombstones" on password_tombstones;
+create policy "Users read their own tombstones"
+    on password_tombstones for select
+    using (auth.uid() = user_id);
+
+-- Runs as the table owner: users have no insert policy on the tombstones
+create or replace function passwords_record_tombstone()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    insert into password_tombstones (id, user_id)
+    values (old.id, old.user_id)
+    on conflict (id) do update set deleted_at = excluded.deleted_at;
+    return old;
+end;
+$$;
+
+drop trigger if exists passwords_record_tombstone on passwords;
+create trigger passwords_record_tombstone
+    after delete on passwords
+    for each row execute function passwords_record_tombstone();
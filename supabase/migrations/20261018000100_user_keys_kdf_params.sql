@@ -0,0 +1,5 @@
+-- Key derivation parameters calibrated at sign-up (modules.utils.calibrate_kdf),
+-- e.g. {"algorithm": "argon2id", "iterations": 3, "memory_cost": 19456,
+-- "lanes": 1}. Rows without them keep PBKDF2 at the default iterations.
+alter table user_keys
+    add column if not exists kdf_params jsonb;
@@ -0,0 +1,16 @@
+-- Realtime only sends postgres_changes for tables in its publication; the
+-- GUI's live updates (modules.subscriptions.PasswordSubscription) listen for
+-- the `passwords` rows. RLS still limits each client to its own rows.
+do $$
+begin
+    if not exists (
+        select 1
+        from pg_publication_tables
+        where pubname = 'supabase_realtime'
+            and schemaname = 'public'
+            and tablename = 'passwords'
+    ) then
+        alter publication supabase_realtime add table passwords;
+    end if;
+end;
+$$;
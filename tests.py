@@ -1,13 +1,68 @@
 import base64
+import json
 import os
+import subprocess
+import sys
+import time
 import uuid
 from unittest.mock import MagicMock, patch
 
 import pytest
 
+from modules import utils
 from modules.auth import (get_current_user, is_logged_in, log_in, log_out,
                           request_password_reset, sign_up)
-from modules.utils import SALT_SIZE
+from modules.backup import (BackupFormatError, BackupWriter, iter_backup,
+                            read_entry, verify_backup)
+from modules.search import SearchIndex
+from modules.session import current_session
+from modules.utils import (SALT_SIZE, VERSION_PREFIX, decrypt_password,
+                           encrypt_password)
+from modules.vault_cache import VaultCache
+
+
+@pytest.fixture(autouse=True)
+def vault_cache(tmp_path):
+    # Keep the local vault cache inside the test's temporary directory, sealed
+    # with a fixed key, and stop log_in from refreshing it on a background
+    # thread. Operations going over their request budget fail the test.
+    cache = VaultCache(tmp_path / "vault.db", key_provider=lambda user_id: b"k" * 32)
+
+    with patch("modules.vault_cache._cache", cache):
+        with patch("modules.auth.start_cache_refresh"):
+            with patch("modules.accounting.BUDGET_MODE", "raise"):
+                yield cache
+
+    cache.close()
+
+
+@pytest.fixture
+def backend():
+    # Route Supabase to the in-process stand-in, and forget any session and
+    # key material the test leaves behind
+    from modules.fake_backend import FakeBackend
+    from modules.supabase_client import use_backend
+
+    fake = FakeBackend()
+    previous = use_backend(fake)
+    yield fake
+
+    use_backend(previous)
+    current_session.clear()
+    utils.clear_key_cache()
+
+
+@pytest.fixture
+def user(backend):
+    # A logged-in user with a random encryption key stored in the backend
+    from modules.fake_backend import fake_access_token
+
+    user_id = str(uuid.uuid4())
+    user_key = base64.b64encode(os.urandom(SALT_SIZE)).decode()
+    backend.server.load("user_keys", [{"user_id": user_id, "encryption_salt": user_key}])
+    current_session.start(user_id, "test@example.com", user_key)
+    current_session.set_identity(fake_access_token(user_id))
+    return user_id, user_key
 
 
 @pytest.mark.parametrize(
@@ -291,3 +346,1288 @@ def test_request_password_reset_failure():
         assert (
             result["message"] == "Error sending OTP: Entered email is not registered."
         )
+
+
+def _encrypt_legacy(plain_password, user_key):
+    # Build a blob in the pre-versioned format: one PBKDF2 run per entry
+    from Crypto.Cipher import AES
+
+    salt = os.urandom(SALT_SIZE)
+    cipher = AES.new(utils.derive_key(user_key, salt), AES.MODE_EAX)
+    ciphertext, tag = cipher.encrypt_and_digest(plain_password.encode())
+    return base64.b64encode(salt + cipher.nonce + tag + ciphertext).decode()
+
+
+def test_encrypt_decrypt_current_format():
+    user_key = base64.b64encode(os.urandom(SALT_SIZE)).decode()
+
+    # Act: Encrypt several entries with the same key
+    with patch("modules.utils.derive_key", wraps=utils.derive_key) as mock_derive:
+        utils.clear_key_cache()
+        blobs = [encrypt_password(f"secret-{i}", user_key) for i in range(5)]
+        decrypted = [decrypt_password(blob, user_key) for blob in blobs]
+
+    # Assert: Versioned blobs round-trip and PBKDF2 ran once for the vault
+    assert all(blob.startswith(VERSION_PREFIX) for blob in blobs)
+    assert decrypted == [f"secret-{i}" for i in range(5)]
+    assert mock_derive.call_count == 1
+
+
+def test_decrypt_legacy_format():
+    user_key = base64.b64encode(os.urandom(SALT_SIZE)).decode()
+    legacy_blob = _encrypt_legacy("old-secret", user_key)
+
+    # Act / Assert: Old blobs are still readable, wrong keys are rejected
+    assert decrypt_password(legacy_blob, user_key) == "old-secret"
+    assert decrypt_password(legacy_blob, "wrong-key")["success"] == False
+
+
+def test_legacy_key_cache_hits_and_log_out_zeroizes(backend):
+    user_key = base64.b64encode(os.urandom(SALT_SIZE)).decode()
+    legacy_blob = _encrypt_legacy("old-secret", user_key)
+    utils.clear_key_cache()
+    before = utils.key_cache_stats()
+
+    # Act: View the same legacy entry twice
+    with patch("modules.utils.derive_key", wraps=utils.derive_key) as mock_derive:
+        assert decrypt_password(legacy_blob, user_key) == "old-secret"
+        assert decrypt_password(legacy_blob, user_key) == "old-secret"
+
+    # Assert: The second view is served from the cache
+    stats = utils.key_cache_stats()
+    assert mock_derive.call_count == 1
+    assert stats["hits"] - before["hits"] == 1
+    assert stats["size"] == 1
+
+    log_out()
+    assert utils.key_cache_stats()["size"] == 0
+
+
+def test_derived_key_cache_bounds():
+    cache = utils.DerivedKeyCache(max_size=2, ttl=60)
+
+    cache.put("secret", b"salt-1", b"k" * 32)
+    cache.put("secret", b"salt-2", b"k" * 32)
+    cache.put("secret", b"salt-3", b"k" * 32)
+
+    # Assert: The least recently used key was evicted
+    assert cache.get("secret", b"salt-1") is None
+    assert cache.get("secret", b"salt-3") == b"k" * 32
+
+    expired = utils.DerivedKeyCache(ttl=0)
+    expired.put("secret", b"salt", b"k" * 32)
+    assert expired.get("secret", b"salt") is None
+
+
+def test_decrypt_many_preserves_order_and_reports_failures():
+    user_key = base64.b64encode(os.urandom(SALT_SIZE)).decode()
+    entries = [_encrypt_legacy(f"legacy-{i}", user_key) for i in range(8)]
+    entries.insert(3, encrypt_password("current", user_key))
+    entries.insert(5, "not-a-ciphertext")
+
+    # Act: Decrypt the batch over two worker processes
+    results = utils.decrypt_many(entries, user_key, workers=2)
+
+    # Assert: Order is preserved and the bad entry does not abort the batch
+    assert results[3] == "current"
+    assert results[5]["success"] == False
+    assert [r for i, r in enumerate(results) if i not in (3, 5)] == [
+        f"legacy-{i}" for i in range(8)
+    ]
+
+
+def test_decrypt_many_falls_back_serially_when_the_pool_breaks(caplog):
+    from concurrent.futures.process import BrokenProcessPool
+
+    user_key = base64.b64encode(os.urandom(SALT_SIZE)).decode()
+    entries = [_encrypt_legacy(f"legacy-{i}", user_key) for i in range(8)]
+    executor = MagicMock()
+    executor.map.side_effect = BrokenProcessPool("worker died")
+
+    # Act / Assert: A broken pool is logged and the batch still completes
+    results = utils.decrypt_many(entries, user_key, executor=executor)
+    assert results == [f"legacy-{i}" for i in range(8)]
+    assert "decrypting 8 entries serially" in caplog.text
+
+    # Other errors are bugs, not pool failures, and are not hidden
+    executor.map.side_effect = TypeError("bad argument")
+    with pytest.raises(TypeError):
+        utils.decrypt_many(entries, user_key, executor=executor)
+
+
+def test_log_in_starts_session_and_skips_user_keys_lookup(backend):
+    email, password = "test@example.com", "SecurePassword1"
+
+    with patch("modules.auth.calibrate_kdf", return_value=utils.MIN_KDF_PARAMS[utils.PBKDF2]):
+        assert sign_up(email, password)["success"]
+    [row] = backend.server.tables["user_keys"]
+
+    with patch("modules.auth._watch_auth_state"):
+        result = log_in(email, password)
+
+    # Act: Ask for the key after login
+    backend.network.reset()
+    user_key = utils.get_user_key()
+
+    # Assert: Served from the session without a request
+    assert user_key == row["encryption_salt"]
+    assert current_session.user_id == result["user"]["id"] == row["user_id"]
+    assert backend.requests == 0
+
+    log_out()
+    assert not current_session.is_active
+    assert backend.network.counts == {("AUTH", "sign_out"): 1}
+
+
+def test_cancelled_log_in_signs_out_before_starting_a_session(backend):
+    from gui.tasks import TaskCancelled
+
+    def cancelled():
+        raise TaskCancelled()
+
+    with patch("modules.auth.calibrate_kdf", return_value=utils.MIN_KDF_PARAMS[utils.PBKDF2]):
+        assert sign_up("a@example.com", "SecurePassword1")["success"]
+
+    # Act: The UI gives up while the key is being derived
+    with patch("modules.auth._watch_auth_state"):
+        result = log_in("a@example.com", "SecurePassword1", cancelled)
+
+    # Assert: No session was started and the auth session was ended
+    assert not result["success"]
+    assert not current_session.is_active
+    assert backend.network.counts[("AUTH", "sign_out")] == 1
+    assert backend.auth.get_session() is None
+
+
+def _make_jwt(claims):
+    def encode(part):
+        return base64.urlsafe_b64encode(json.dumps(part).encode()).rstrip(b"=").decode()
+
+    return f"{encode({'alg': 'HS256', 'typ': 'JWT'})}.{encode(claims)}.signature"
+
+
+def test_get_user_id_uses_cached_identity(backend):
+    user_id = str(uuid.uuid4())
+    token = _make_jwt({"sub": user_id, "exp": time.time() + 3600})
+    current_session.set_identity(token)
+
+    # Act: Resolve the user several times
+    results = [utils.get_user_id() for _ in range(3)]
+    logged_in = is_logged_in()
+
+    # Assert: No network call was made
+    assert results == [user_id] * 3
+    assert logged_in == True
+    assert backend.requests == 0
+
+
+def test_expired_token_is_not_cached():
+    token = _make_jwt({"sub": str(uuid.uuid4()), "exp": time.time() - 10})
+
+    # Assert: Expired or malformed tokens never populate the cache
+    assert current_session.set_identity(token) == False
+    assert current_session.set_identity("not-a-jwt") == False
+    assert current_session.cached_user_id() is None
+
+
+def test_import_passwords_inserts_in_batches(tmp_path, backend, user):
+    user_id, user_key = user
+    backup = tmp_path / "backup.txt"
+    backup.write_text(
+        "Service: mail, Username: alice, Password: plain-1\n"
+        f"Service: bank, Username: bob, Password: {encrypt_password('secret', user_key)}\n"
+        "this line is broken\n"
+        "Service: shop, Username: carol, Password: plain-2\n"
+        f"Service: wiki, Username: dave, Password: {encrypt_password('x', 'other-key')}\n"
+        "Service: blog, Username: erin, Password: plain-3\n"
+    )
+    progress = []
+
+    # Act: Import with two rows per request
+    result = utils.import_passwords(
+        str(backup), batch_size=2, progress_callback=lambda *done: progress.append(done)
+    )
+
+    # Assert: One insert per batch, bad rows reported but not inserted
+    rows = backend.server.tables["passwords"]
+    assert backend.network.counts[("POST", "passwords")] == 3
+    assert sorted(row["service_name"] for row in rows) == [
+        "bank",
+        "blog",
+        "mail",
+        "shop",
+    ]
+    [bank] = [row for row in rows if row["service_name"] == "bank"]
+    assert decrypt_password(bank["encrypted_password"], user_key) == "secret"
+    assert "Imported 4 of 6" in result
+    assert "Line 3: Invalid format" in result
+    assert "Line 5: Decryption failed" in result
+    assert progress[-1] == (4, 6)
+
+
+def test_export_passwords_pages_through_vault(tmp_path, monkeypatch, backend, user):
+    user_id, user_key = user
+    monkeypatch.chdir(tmp_path)
+    backend.server.load(
+        "passwords",
+        [
+            {
+                "user_id": user_id,
+                "service_name": f"service-{i}",
+                "username": "alice",
+                "encrypted_password": encrypt_password(f"secret-{i}", user_key),
+            }
+            for i in range(1, 4)
+        ],
+    )
+
+    # Act: Export with two rows per page
+    result = utils.export_passwords(decrypt=True, page_size=2)
+
+    # Assert: Two pages, the second continuing after the first
+    assert backend.network.counts == {("GET", "passwords"): 2}
+    path = result.split(" to ")[-1]
+    assert verify_backup(path)["encrypted"] == False
+    assert [entry["password"] for _, entry in iter_backup(path)] == [
+        f"secret-{i}" for i in range(1, 4)
+    ]
+    assert not os.path.exists(f"{path}.part")
+
+
+def test_cli_export_stays_encrypted_unless_asked(
+    tmp_path, monkeypatch, capsys, backend
+):
+    import cli
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr("getpass.getpass", lambda prompt: "SecurePassword1")
+
+    with patch("modules.auth.calibrate_kdf", return_value=utils.MIN_KDF_PARAMS[utils.PBKDF2]):
+        assert sign_up("test@example.com", "SecurePassword1")["success"]
+
+    def run(*args):
+        monkeypatch.setattr(sys, "argv", ["cli.py", "--email", "test@example.com", *args])
+        with patch("modules.auth._watch_auth_state"):
+            cli.main()
+        return capsys.readouterr().out.strip()
+
+    run("add", "gmail", "alice", "secret-1")
+    run("add", "bank", "alice", "secret-2")
+
+    # Act: Export without and with --decrypt
+    encrypted = run("export").split(" to ")[-1]
+    plain = run("export", "--decrypt").split(" to ")[-1]
+
+    # Assert: Only the explicit flag writes passwords in the clear
+    assert verify_backup(encrypted)["encrypted"] == True
+    assert b"secret-" not in open(encrypted, "rb").read()
+    assert verify_backup(plain)["encrypted"] == False
+    assert sorted(entry["password"] for _, entry in iter_backup(plain)) == [
+        "secret-1",
+        "secret-2",
+    ]
+
+
+def test_structured_backup_round_trip(tmp_path):
+    path = tmp_path / "backup.jsonl"
+    entries = [
+        {"id": 1, "service_name": "a, b: c", "username": "x", "password": "p, w: d"},
+        {"id": 2, "service_name": "mail", "username": "y", "password": "\n"},
+    ]
+
+    with BackupWriter(path, encrypted=False) as writer:
+        for entry in entries:
+            writer.write(entry)
+
+    # Assert: Commas, colons and newlines survive; single entries are seekable
+    assert verify_backup(path)["encrypted"] == False
+    assert [entry for _, entry in iter_backup(path)] == entries
+    assert read_entry(path, 1) == entries[1]
+
+    # Act: Corrupt one entry
+    path.write_bytes(path.read_bytes().replace(b'"mail"', b'"mall"'))
+
+    with pytest.raises(BackupFormatError):
+        verify_backup(path)
+
+
+def test_backup_index_is_written_in_chunks(tmp_path, monkeypatch):
+    path = tmp_path / "backup.jsonl"
+    entries = [
+        {"id": i, "service_name": f"s{i}" * i, "username": "u", "password": "p"}
+        for i in range(10)
+    ]
+    monkeypatch.setattr("modules.backup.INDEX_CHUNK_SIZE", 4)
+
+    with BackupWriter(path, encrypted=False) as writer:
+        for entry in entries:
+            writer.write(entry)
+
+    # Assert: Three index lines follow the entries; any entry is one seek away
+    lines = path.read_bytes().splitlines()
+    assert [json.loads(line).keys() for line in lines[11:14]] == [{"offsets"}] * 3
+    assert [read_entry(path, i) for i in range(10)] == entries
+    assert [entry for _, entry in iter_backup(path)] == entries
+    with pytest.raises(IndexError):
+        read_entry(path, 10)
+
+
+def test_incremental_export_and_restore(tmp_path, monkeypatch, backend, user):
+    import datetime
+
+    user_id, user_key = user
+    monkeypatch.chdir(tmp_path)
+
+    for i in range(1, 4):
+        utils.add_password(f"service-{i}", "alice", f"secret-{i}")
+    base = utils.export_passwords().split(" to ")[-1]
+
+    # Act: Change one entry, delete another, export the delta
+    rows = {row["service_name"]: row for row in backend.server.tables["passwords"]}
+    utils.update_password(
+        user_id,
+        rows["service-2"]["id"],
+        "service-2",
+        "alice",
+        encrypt_password("changed", user_key),
+    )
+    utils.delete_password(user_id, rows["service-3"]["id"])
+    backend.network.reset()
+    result = utils.export_passwords(incremental=True)
+
+    # Assert: One page of changes and one of tombstones, no id listing
+    assert "(1 changed, 1 deleted)" in result
+    assert backend.network.counts == {
+        ("GET", "passwords"): 1,
+        ("GET", "password_tombstones"): 1,
+    }
+    state = json.loads((tmp_path / "backup" / utils.EXPORT_STATE_FILE).read_text())
+    assert "ids" not in state[user_id]
+    assert (
+        utils.export_passwords(incremental=True)
+        == "No changes since the last export."
+    )
+
+    # A write whose transaction started before that export commits after it
+    backend.server._clock -= datetime.timedelta(seconds=1)
+    backend.server.load(
+        "passwords",
+        [
+            {
+                "user_id": user_id,
+                "service_name": "service-4",
+                "username": "alice",
+                "encrypted_password": encrypt_password("late", user_key),
+            }
+        ],
+    )
+    backend.server._clock += datetime.timedelta(seconds=1)
+    assert "(1 changed, 0 deleted)" in utils.export_passwords(incremental=True)
+    assert (
+        utils.export_passwords(incremental=True)
+        == "No changes since the last export."
+    )
+
+    # A second full export the same day gets a file of its own
+    assert utils.export_passwords().split(" to ")[-1] != base
+
+    # The base plus the delta reproduces the current vault
+    backend.server.tables["passwords"].clear()
+    assert utils.restore_passwords(base) == (
+        f"Successfully imported accounts from: {base}"
+    )
+    restored = backend.server.tables["passwords"]
+    assert [row["service_name"] for row in restored] == [
+        "service-1",
+        "service-2",
+        "service-4",
+    ]
+    assert decrypt_password(restored[1]["encrypted_password"], user_key) == "changed"
+
+
+def test_timestamps_are_compared_as_datetimes():
+    rows = [
+        {"updated_at": "2025-01-01T10:00:00+02:00"},
+        {"updated_at": "2025-01-01T09:00:00Z"},
+        {"updated_at": None},
+    ]
+
+    # 09:00Z is later than 10:00+02:00 though it sorts first as a string
+    assert utils._latest_timestamp(rows, "updated_at") == "2025-01-01T09:00:00Z"
+    assert (
+        utils._latest_timestamp(rows, "updated_at", "2025-01-01T09:30:00.5+00:00")
+        == "2025-01-01T09:30:00.5+00:00"
+    )
+
+
+def test_list_and_view_are_served_from_cache(vault_cache, backend, user):
+    user_id, user_key = user
+    backend.server.load(
+        "passwords",
+        [
+            {
+                "user_id": user_id,
+                "service_name": "mail",
+                "username": "alice",
+                "encrypted_password": encrypt_password("secret", user_key),
+            }
+        ],
+    )
+
+    # Act: List twice and view the entry
+    first = utils.list_passwords()
+    backend.network.reset()
+    second = utils.list_passwords()
+    retrieved = utils.retrieve_password("mail")
+
+    # Assert: Only the first listing made requests, to fill the cache
+    assert backend.requests == 0
+    assert first == second
+    assert [(entry["service_name"], entry["username"]) for entry in first] == [
+        ("mail", "alice")
+    ]
+    assert retrieved["password"] == "secret"
+
+    # Deleting writes through to the cache
+    assert utils.delete_password(user_id, first[0]["id"])
+    assert backend.server.tables["passwords"] == []
+    assert vault_cache.list(user_id) == []
+
+
+def test_vault_cache_is_sealed_with_the_session_key(tmp_path, backend):
+    import sqlite3
+
+    user_id = str(uuid.uuid4())
+    user_key = base64.b64encode(os.urandom(SALT_SIZE)).decode()
+    cache = VaultCache(tmp_path / "sealed.db")
+    row = {
+        "id": 12,
+        "service_name": "bank.example.com",
+        "username": "alice@example.com",
+        "encrypted_password": "v2:x",
+        "updated_at": "2025-01-01T00:00:00+00:00",
+    }
+
+    try:
+        # Act: Cache a row while logged in
+        current_session.start(user_id, "alice@example.com", user_key)
+        cache.replace_all(user_id, [row])
+
+        # Assert: Only the id is stored in the clear; lookups still work
+        dump = b"".join(
+            bytes(value) if isinstance(value, bytes) else str(value).encode()
+            for record in sqlite3.connect(tmp_path / "sealed.db").execute(
+                "SELECT * FROM passwords"
+            )
+            for value in record
+        )
+        assert b"bank" not in dump and b"alice" not in dump
+        assert cache.find(user_id, "bank.example.com", "alice@example.com") == row
+        assert next(cache.iter_pages(user_id, 10, after=("a", 1))) == [row]
+
+        # Without the user's key the cache reads as empty and unpopulated
+        current_session.clear()
+        assert not cache.is_populated(user_id)
+        assert cache.list(user_id) == []
+
+        # Logging out drops the user's rows
+        current_session.start(user_id, "alice@example.com", user_key)
+        with patch("modules.auth.get_vault_cache", return_value=cache):
+            log_out()
+        current_session.start(user_id, "alice@example.com", user_key)
+        assert cache.list(user_id) == []
+        assert cache.get_meta(user_id, "populated") is None
+    finally:
+        current_session.clear()
+        utils.clear_key_cache()
+        cache.close()
+
+
+def test_password_table_model_loads_rows_lazily():
+    from gui.components.password_table import (FETCH_BATCH_SIZE,
+                                               PasswordTableModel)
+
+    entries = [
+        {"service_name": f"service-{i}", "username": "user"}
+        for i in range(FETCH_BATCH_SIZE * 2 + 5)
+    ]
+    model = PasswordTableModel(entries + ["not an entry"])
+
+    # Act & Assert: Rows are exposed one batch at a time
+    assert model.rowCount() == FETCH_BATCH_SIZE
+    while model.canFetchMore():
+        model.fetchMore()
+    assert model.rowCount() == len(entries)
+
+    assert model.index(1, 0).data() == "service-1"
+    assert model.removeRows(0, 1)
+    assert model.rowCount() == len(entries) - 1
+    assert model.index(0, 0).data() == "service-1"
+
+    # Search results are looked up one batch at a time too
+    model = PasswordTableModel(entries)
+    model.set_search_index(SearchIndex(model.entries()))
+    model.set_filter("service-")
+    assert model.rowCount() == FETCH_BATCH_SIZE
+    while model.canFetchMore():
+        model.fetchMore()
+    assert model.rowCount() == len(entries)
+
+
+def test_run_task_reports_progress_and_honours_cancel():
+    from PyQt5.QtCore import QCoreApplication, QThreadPool
+
+    from gui.tasks import run_task
+
+    app = QCoreApplication.instance() or QCoreApplication([])
+    pool = QThreadPool()
+    events = []
+
+    def work(count, progress_callback):
+        for done in range(1, count + 1):
+            progress_callback(done, count)
+        return "finished"
+
+    # Act: Run one task to completion and cancel another before it starts
+    run_task(
+        work,
+        3,
+        on_finished=lambda result: events.append(result),
+        on_progress=lambda done, total: events.append((done, total)),
+        pool=pool,
+    )
+    pool.waitForDone()
+    app.processEvents()
+
+    pool.setMaxThreadCount(1)
+    blocker = run_task(time.sleep, 0.2, pool=pool)
+    cancelled = run_task(
+        work,
+        3,
+        on_finished=lambda result: events.append("not dropped"),
+        on_progress=lambda done, total: None,
+        on_cancelled=lambda: events.append("cancelled"),
+        pool=pool,
+    )
+    cancelled.cancel()
+    pool.waitForDone()
+    app.processEvents()
+
+    # Assert
+    assert events == [(1, 3), (2, 3), (3, 3), "finished", "cancelled"]
+    assert not blocker.is_cancelled
+
+
+def test_search_index_prefix_substring_and_fuzzy_matches():
+    entries = [
+        {"service_name": "GitHub", "username": "alice@example.com"},
+        {"service_name": "GitLab", "username": "bob"},
+        {"service_name": "Mail", "username": "alice"},
+        {"service_name": "Bank", "username": "carol@github.io"},
+    ]
+    index = SearchIndex(entries)
+
+    # Act & Assert: Word prefixes, substrings, narrowing and typos
+    assert index.search("") is None
+    assert index.search("g") == [0, 1, 3]
+    assert index.search("git") == [0, 1, 3]
+    assert index.search("github") == [0, 3]
+    assert index.search("alice") == [0, 2]
+    assert index.search("githbu") == [0, 3]
+
+    index.update(1, {"service_name": "Forge", "username": "bob"})
+    index.remove(3)
+    assert index.search("git") == [0]
+
+
+def test_search_index_returns_fuzzy_matches_in_id_order():
+    entries = [
+        {"service_name": "paypal", "username": "x"},
+        {"service_name": "aypla", "username": "x"},
+        {"service_name": "mail", "username": "x"},
+    ]
+    index = SearchIndex(entries)
+
+    # Act: A typo matches nothing exactly; entry 1 shares the most trigrams
+    result = index.search("paypla")
+
+    # Assert: Matches come back in id order, not ranked by similarity
+    assert result == [0, 1]
+
+
+def test_search_index_stops_at_the_limit_and_skips_common_trigrams(monkeypatch):
+    monkeypatch.setattr("modules.search.FUZZY_MAX_POSTINGS", 2)
+    entries = [
+        {"service_name": name, "username": "x"}
+        for name in ("mail.com", "shop.com", "bank.com", "paypal.com")
+    ]
+    index = SearchIndex(entries)
+
+    # Act & Assert: A limited scan stops early; narrowing it checks the rest
+    assert index.search(".com", limit=2) == [0, 1]
+    assert index.search(".com", limit=10) == [0, 1, 2, 3]
+    assert index.search("l.co", limit=1) == [0]
+    assert index.search("l.com") == [0, 3]
+
+    # ".co" and "com" find no candidates but still count toward the score
+    assert index.search("paypla.com") == [3]
+
+
+def test_predecrypt_passwords_caches_and_evicts_plaintexts(backend, user):
+    user_id, user_key = user
+    first, second = (encrypt_password(p, user_key) for p in ("one", "two"))
+
+    # Act: Pre-decrypt both rows, then scroll the first away
+    assert utils.predecrypt_passwords([first, second]) == 2
+    held = utils._plaintext_cache._entries[utils._plaintext_cache._cache_key(first)][0]
+
+    with patch("modules.utils.decrypt_password") as mock_decrypt:
+        assert utils.decrypt_password_cached(first, user_key) == "one"
+        mock_decrypt.assert_not_called()
+
+    utils.predecrypt_passwords([second])
+
+    # Assert: The evicted plaintext was overwritten, log_out wipes the rest
+    assert held == bytearray(3)
+    assert utils._plaintext_cache.get(first) is None
+    assert len(utils._plaintext_cache) == 1
+
+    log_out()
+    assert len(utils._plaintext_cache) == 0
+
+
+def test_repository_retries_and_runs_bulk_inserts_concurrently(monkeypatch, user):
+    import asyncio
+
+    import httpx
+
+    from modules import repository
+
+    monkeypatch.setattr(repository, "RETRY_BACKOFF", 0)
+    user_id, user_key = user
+    requests = []
+
+    def handler(request):
+        requests.append(request.method)
+
+        if request.method == "GET":
+            # The first read hits a gateway error and is retried
+            if requests.count("GET") == 1:
+                return httpx.Response(503)
+            return httpx.Response(
+                200,
+                json=[
+                    {
+                        "id": 1,
+                        "service_name": "mail",
+                        "username": "alice",
+                        "encrypted_password": encrypt_password("one", user_key),
+                        "updated_at": None,
+                    }
+                ],
+            )
+
+        # Inserts are not retried, even on a gateway error
+        if requests.count("POST") == 1:
+            return httpx.Response(503)
+
+        rows = json.loads(request.content)
+        return httpx.Response(
+            201, json=[{**row, "id": len(requests) * 10 + i} for i, row in enumerate(rows)]
+        )
+
+    async def run():
+        async with repository.PasswordRepository(
+            transport=httpx.MockTransport(handler)
+        ) as repo:
+            listed = await repo.list_passwords()
+            added = await repo.add_passwords(
+                [(f"service-{i}", "user", "secret") for i in range(5)], batch_size=2
+            )
+            return listed, added
+
+    listed, (inserted, errors) = asyncio.run(run())
+
+    # Assert: One retried read, three insert batches sent once each
+    assert requests == ["GET", "GET", "POST", "POST", "POST"]
+    assert [entry["service_name"] for entry in listed] == ["mail"]
+    assert inserted == 3 and len(errors) == 1
+
+
+def _import_times(*args):
+    """
+    Run `python -X importtime *args` three times; return each run's
+    {module: cumulative microseconds} and the total of its top-level imports.
+    """
+    # Compiled bytecode is cached as in an installed app; a first run writes it
+    env = {k: v for k, v in os.environ.items() if k != "PYTHONDONTWRITEBYTECODE"}
+    command = [sys.executable, "-X", "importtime", *args]
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    subprocess.run(command, cwd=cwd, env=env, capture_output=True)
+
+    runs = []
+    for _ in range(3):
+        result = subprocess.run(command, cwd=cwd, env=env, capture_output=True, text=True)
+        assert result.returncode == 0, result.stderr
+
+        imported = {}
+        total = 0
+        for line in result.stderr.splitlines():
+            if line.startswith("import time:") and "|" in line:
+                _, cumulative, name = line[len("import time:") :].split("|")
+                if cumulative.strip().isdigit():
+                    imported[name.strip()] = int(cumulative)
+                    if not name.startswith("  "):
+                        total += int(cumulative)
+        runs.append((imported, total))
+
+    return runs
+
+
+def test_startup_imports_skip_supabase_client_and_heavy_modules():
+    # Import time of the core modules, in microseconds, best of three runs
+    budget = 100_000
+
+    runs = _import_times("-c", "import modules.utils, modules.auth")
+
+    for imported, _ in runs:
+        for module in ("supabase", "gotrue", "postgrest", "qrcode", "Crypto.Cipher.AES"):
+            assert module not in imported
+
+    assert (
+        min(imported["modules.utils"] + imported.get("modules.auth", 0) for imported, _ in runs)
+        < budget
+    )
+
+    from modules.supabase_client import supabase
+
+    # Patching the proxy's attributes still reaches the client
+    with patch("modules.supabase_client.supabase.table") as table:
+        assert supabase.table is table
+
+
+def test_cli_generate_starts_without_the_vault_modules():
+    # Whole-process import time of `cli.py generate`, best of three runs
+    budget = 100_000
+
+    runs = _import_times("cli.py", "generate")
+
+    for imported, _ in runs:
+        for module in ("modules.utils", "modules.auth", "cryptography", "supabase"):
+            assert module not in imported
+
+    assert min(total for _, total in runs) < budget
+
+
+def test_list_password_pages_uses_a_keyset_cursor(
+    vault_cache, monkeypatch, backend, user
+):
+    import datetime
+
+    # Every row here is fresh; re-reading recent writes is covered elsewhere
+    monkeypatch.setattr(utils, "SYNC_OVERLAP", datetime.timedelta(0))
+    user_id, _ = user
+    backend.server.load(
+        "passwords",
+        [
+            {
+                "id": i,
+                "user_id": user_id,
+                "service_name": service,
+                "username": "user",
+                "encrypted_password": "v2:x",
+            }
+            for i, service in enumerate(["b", "a", "c", "a", "b"])
+        ],
+    )
+
+    # Act: First listing pages through Supabase, later ones the cache
+    remote = list(utils.list_password_pages(page_size=2))
+    cached = list(utils.list_password_pages(page_size=2))
+    resumed = list(utils.list_password_pages(page_size=2, after=("a", "3")))
+
+    # Assert: Pages follow (service_name, id) and end on a short page
+    assert [[row["id"] for row in page] for page in remote] == [[1, 3], [0, 4], [2]]
+
+    # Cached listings only ask for rows changed since, one page per table
+    assert backend.network.counts == {
+        ("GET", "passwords"): 3 + 2,
+        ("GET", "password_tombstones"): 2,
+    }
+    assert cached == remote
+    assert [row["id"] for page in resumed for row in page] == [0, 4, 2]
+
+
+def test_password_table_model_appends_pages():
+    from gui.components.password_table import PasswordTableModel
+
+    model = PasswordTableModel([{"service_name": "mail", "username": "alice"}])
+    model.set_search_index(SearchIndex(model.entries()))
+
+    # Act: Add a page, then filter and add another
+    model.append_entries([{"service_name": "bank", "username": "bob"}])
+    assert model.rowCount() == 2
+
+    model.set_filter("bank")
+    model.append_entries([{"service_name": "bankless", "username": "carol"}, None])
+
+    # Assert: Later pages are searchable as well
+    assert [model.index(row, 0).data() for row in range(model.rowCount())] == [
+        "bank",
+        "bankless",
+    ]
+    model.set_filter("")
+    assert model.rowCount() == 3
+
+
+def test_sync_vault_merges_changes_and_tombstones(vault_cache, backend, user):
+    import datetime
+
+    from modules.models import Password
+
+    user_id, _ = user
+
+    def row(service):
+        return {
+            "user_id": user_id,
+            "service_name": service,
+            "username": "user",
+            "encrypted_password": "v2:x",
+        }
+
+    backend.server.load("passwords", [row("mail"), row("bank")])
+    assert utils.refresh_vault_cache(user_id) == "Cached 2 passwords."
+    mail, bank = backend.server.tables["passwords"]
+
+    # Another device renames one entry, adds one and deletes one
+    backend.table("passwords").update({"service_name": "email"}).eq(
+        "id", mail["id"]
+    ).execute()
+    [shop] = backend.server.load("passwords", [row("shop")])
+    backend.table("passwords").delete().eq("id", bank["id"]).execute()
+
+    # Act
+    backend.network.reset()
+    result = utils.sync_vault(user_id)
+
+    # Assert: One page of changes and one of tombstones were merged
+    assert result == "Synced 2 changed and 1 deleted passwords."
+    assert backend.network.counts == {
+        ("GET", "passwords"): 1,
+        ("GET", "password_tombstones"): 1,
+    }
+    assert [entry["service_name"] for entry in vault_cache.list(user_id)] == [
+        "email",
+        "shop",
+    ]
+
+    # Each table advances its own cursor
+    [tombstone] = backend.server.tables["password_tombstones"]
+
+    def cursor(key):
+        return json.loads(vault_cache.get_meta(user_id, key))
+
+    assert cursor(utils.SYNC_CURSOR_KEY)["watermark"] == shop["updated_at"]
+    assert cursor(utils.SYNC_DELETED_CURSOR_KEY)["watermark"] == tombstone["deleted_at"]
+    assert utils.sync_vault(user_id) == "Synced 0 changed and 0 deleted passwords."
+
+    # A write whose transaction started before the last sync commits after it
+    backend.server._clock -= datetime.timedelta(seconds=1)
+    [late] = backend.server.load("passwords", [row("late")])
+    backend.server._clock += datetime.timedelta(seconds=1)
+    assert late["updated_at"] < shop["updated_at"]
+
+    assert utils.sync_vault(user_id) == "Synced 1 changed and 0 deleted passwords."
+    assert utils.sync_vault(user_id) == "Synced 0 changed and 0 deleted passwords."
+    assert vault_cache.find(user_id, "late")["id"] == late["id"]
+
+    # Once the overlap has passed, an idle sync stops re-reading recent rows
+    for overlaps in (1, 2):
+        later = time.time() + overlaps * utils.SYNC_OVERLAP.total_seconds()
+
+        with patch.object(utils.time, "time", return_value=later):
+            utils.sync_vault(user_id)
+
+    assert cursor(utils.SYNC_CURSOR_KEY)["floor"] == shop["updated_at"]
+    assert cursor(utils.SYNC_CURSOR_KEY)["seen"] == []
+
+    # A missing tombstone table falls back to diffing the ids
+    missing = Exception("relation does not exist")
+    missing.code = "42P01"
+    backend.table("passwords").delete().eq("id", shop["id"]).execute()
+
+    with patch.object(Password, "iter_deletions", side_effect=missing):
+        utils.sync_vault(user_id)
+
+    assert [entry["service_name"] for entry in vault_cache.list(user_id)] == [
+        "email",
+        "late",
+    ]
+
+
+def test_list_password_pages_lists_the_cache_when_offline(backend, user, caplog):
+    from postgrest.exceptions import APIError
+
+    user_id, _ = user
+    backend.server.load(
+        "passwords",
+        [
+            {
+                "user_id": user_id,
+                "service_name": "mail",
+                "username": "alice",
+                "encrypted_password": "v2:x",
+            }
+        ],
+    )
+    assert utils.refresh_vault_cache(user_id) == "Cached 1 passwords."
+
+    # Act: The sync cannot reach the server
+    backend.network.failure_rate = 1.0
+    pages = list(utils.list_password_pages())
+
+    # Assert: The cached rows are listed and the failure is logged
+    assert [entry["service_name"] for page in pages for entry in page] == ["mail"]
+    assert "Vault sync failed" in caplog.text
+
+    # Errors returned by the server are not mistaken for being offline
+    backend.network.failure_status = 500
+    with pytest.raises(APIError):
+        utils.list_password_pages()
+
+
+def test_realtime_changes_reach_the_cache_and_table_model(vault_cache):
+    from gui.components.password_table import PasswordTableModel
+    from modules.subscriptions import PasswordSubscription
+
+    user_id = str(uuid.uuid4())
+    changes = []
+    subscription = PasswordSubscription(user_id, lambda *change: changes.append(change))
+    record = {
+        "id": 5,
+        "user_id": user_id,
+        "service_name": "mail",
+        "username": "alice",
+        "encrypted_password": "v2:x",
+        "updated_at": "t1",
+    }
+
+    vault_cache.replace_all(user_id, [])
+
+    # Act: Payloads as delivered by the realtime client
+    subscription.handle_payload({"data": {"type": "INSERT", "record": record}})
+    subscription.handle_payload(
+        {"data": {"type": "UPDATE", "record": {**record, "username": "bob"}}}
+    )
+    subscription.handle_payload(
+        {"data": {"type": "INSERT", "record": {**record, "user_id": "someone"}}}
+    )
+    subscription.handle_payload({"data": {"type": "DELETE", "old_record": {"id": 5}}})
+    # Deletes of other users' rows reach every subscriber
+    subscription.handle_payload({"data": {"type": "DELETE", "old_record": {"id": 6}}})
+
+    # Assert: Changes are written through to the cache and reported
+    assert [event for event, _ in changes] == ["INSERT", "UPDATE", "DELETE"]
+    assert "user_id" not in changes[0][1]
+    assert vault_cache.list(user_id) == []
+
+    model = PasswordTableModel([{"id": 1, "service_name": "bank", "username": "x"}])
+    model.upsert_entry(changes[0][1])
+    model.upsert_entry(changes[1][1])
+    assert model.rowCount() == 2
+    assert model.index(1, 1).data() == "bob"
+
+    model.remove_entry(5)
+    model.remove_entry(42)
+    assert model.rowCount() == 1
+
+    # A removed id is gone for good: the same change again adds a new row
+    model.upsert_entry(changes[1][1])
+    assert model.rowCount() == 2
+    assert model.index(1, 1).data() == "bob"
+
+    # A dialog opened on id 3 applies its result by id after a realtime
+    # delete has moved the rows
+    model = PasswordTableModel(
+        [{"id": i, "service_name": f"s{i}", "username": "x"} for i in range(1, 5)]
+    )
+    model.remove_entry(1)
+    model.upsert_entry({"id": 4, "service_name": "s4", "username": "y"})
+    model.remove_entry(3)
+    assert [model.entry(row)["id"] for row in range(model.rowCount())] == [2, 4]
+    assert model.index(1, 1).data() == "y"
+
+
+def test_fake_backend_counts_requests_and_injects_failures(vault_cache, backend):
+    backend.network.latency = 0.05
+
+    # Arrange: Sign up and log in against the fake's auth
+    backend.auth.sign_up({"email": "a@example.com", "password": "pw"})
+    session = backend.auth.sign_in_with_password(
+        {"email": "a@example.com", "password": "pw"}
+    ).session
+    user_id = session.user.id
+    user_key = base64.b64encode(os.urandom(SALT_SIZE)).decode()
+    backend.server.load(
+        "user_keys", [{"user_id": user_id, "encryption_salt": user_key}]
+    )
+    current_session.start(user_id, "a@example.com", user_key)
+    current_session.set_identity(session.access_token)
+    assert utils.add_password("mail", "alice", "secret") == (
+        "Password added successfully"
+    )
+
+    # Act / Assert: A cold view costs one delayed request, a cached one none
+    vault_cache.clear(user_id)
+    backend.network.reset()
+    started = time.perf_counter()
+    assert utils.retrieve_password("mail")["password"] == "secret"
+    assert time.perf_counter() - started >= 0.05
+    assert backend.requests == 1
+    assert backend.network.counts == {("GET", "passwords"): 1}
+
+    for _ in utils.list_password_pages():
+        pass
+    backend.network.reset()
+    assert utils.retrieve_password("mail")["password"] == "secret"
+    assert backend.requests == 0
+
+    # Injected failures surface as ordinary database errors
+    backend.network.latency = 0
+    backend.network.failure_rate = 1.0
+    assert utils.add_password("shop", "bob", "pw").startswith("Database error")
+
+
+def test_tracing_writes_nested_otlp_spans_and_samples(tmp_path, backend):
+    from modules import tracing
+    from modules.supabase_client import supabase
+
+    trace_file = tmp_path / "trace.jsonl"
+
+    try:
+        # Disabled: nothing is wrapped or recorded
+        tracing.configure(None)
+        assert tracing.span("x") is tracing.span("y")
+        assert not isinstance(supabase.table("passwords"), tracing.TracedQuery)
+
+        # Act: One traced operation making a query and deriving a key
+        tracing.configure(trace_file)
+        with tracing.span("gui.view_password", row=3):
+            supabase.table("passwords").select("id").eq("user_id", "u").execute()
+            utils.derive_key("password", b"0" * SALT_SIZE)
+
+        # Assert: One export request holding the whole trace
+        [line] = trace_file.read_text().splitlines()
+        [resource] = json.loads(line)["resourceSpans"]
+        spans = {s["name"]: s for s in resource["scopeSpans"][0]["spans"]}
+        root = spans["gui.view_password"]
+
+        assert set(spans) == {
+            "gui.view_password",
+            "postgrest GET passwords",
+            "crypto.derive_key",
+        }
+        assert "parentSpanId" not in root
+        assert {"key": "row", "value": {"intValue": "3"}} in root["attributes"]
+        for name in ("postgrest GET passwords", "crypto.derive_key"):
+            assert spans[name]["traceId"] == root["traceId"]
+            assert spans[name]["parentSpanId"] == root["spanId"]
+        assert int(root["endTimeUnixNano"]) >= int(
+            spans["crypto.derive_key"]["endTimeUnixNano"]
+        )
+
+        # Unsampled traces leave no spans, not even their children's
+        tracing.configure(trace_file, sample_rate=0)
+        with tracing.span("dropped"):
+            utils.derive_key("password", b"0" * SALT_SIZE)
+        tracing.configure(None)
+        assert len(trace_file.read_text().splitlines()) == 1
+    finally:
+        tracing.configure(None)
+
+
+def test_operations_count_requests_against_their_budgets(
+    vault_cache, backend, user, caplog
+):
+    from modules import accounting
+
+    user_id, _ = user
+    accounting.clear_operation_stats()
+
+    # Act: A warm add, view, update and delete cost one request each
+    utils.add_password("mail", "alice", "secret")
+    entry = vault_cache.find(user_id, "mail", None)
+    utils.retrieve_password("mail")
+    utils.update_password(user_id, entry["id"], "mail", "bob", "v2:x")
+    utils.delete_password(user_id, entry["id"])
+
+    stats = accounting.operation_stats()
+    assert {name: s["max_requests"] for name, s in stats.items()} == {
+        "add": 1,
+        "view": 0,
+        "update": 1,
+        "delete": 1,
+    }
+
+    # Assert: Nested calls of one operation share its budget
+    with pytest.raises(accounting.RequestBudgetExceeded, match="2 x postgrest"):
+        with accounting.operation("add"):
+            utils.add_password("shop", "bob", "pw")
+            utils.add_password("bank", "bob", "pw")
+
+    accounting.set_budget_mode("warn")
+    with accounting.operation("view"):
+        utils.get_password_entry("bank", user_id=user_id)
+        utils.get_password_entry("shop", user_id=user_id)
+        vault_cache.clear(user_id)
+        utils.get_password_entry("bank", user_id=user_id)
+        utils.get_password_entry("shop", user_id=user_id)
+    assert "view made 2 Supabase requests, budget 1" in caplog.text
+    assert accounting.operation_stats()["view"]["over_budget"] == 1
+
+
+def test_auth_calls_count_toward_operations(backend):
+    from modules import accounting
+    from modules.auth import _on_auth_state_change
+
+    # Act: Sign up, log in, refresh the token and log out in one operation
+    with patch("modules.auth.calibrate_kdf", return_value=None):
+        with accounting.operation("session") as session_operation:
+            assert sign_up("a@example.com", "pw")["success"]
+            result = log_in("a@example.com", "pw")
+            _on_auth_state_change(
+                "TOKEN_REFRESHED", MagicMock(access_token="token")
+            )
+            log_out()
+
+    # Assert: Every auth request was counted
+    assert result["success"]
+    assert {
+        target: count
+        for (kind, target), count in session_operation.requests.items()
+        if kind == "auth"
+    } == {
+        "sign_up": 1,
+        "sign_in_with_password": 1,
+        "refresh_token": 1,
+        "sign_out": 1,
+    }
+
+
+def test_kdf_params_are_calibrated_stored_and_used_at_login(backend):
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+    from modules.auth import log_in, sign_up
+
+    # Calibration never goes below the minimum cost and scales up from it
+    for algorithm, minimum in utils.MIN_KDF_PARAMS.items():
+        assert utils.calibrate_kdf(algorithm, target_time=0.001) == minimum
+    scrypt = utils.calibrate_kdf(utils.SCRYPT, target_time=1000)
+    assert scrypt["n"] == utils.MAX_SCRYPT_N
+
+    salt = b"0" * SALT_SIZE
+    argon2id = utils.MIN_KDF_PARAMS[utils.ARGON2ID]
+    assert utils.derive_key("pw", salt) == utils.derive_key(
+        "pw", salt, utils.DEFAULT_KDF_PARAMS
+    )
+    assert utils.derive_key("pw", salt, argon2id) != utils.derive_key("pw", salt)
+
+    # Act: Sign up with calibrated parameters, then log in
+    with patch("modules.auth.calibrate_kdf", return_value=argon2id):
+        assert sign_up("a@example.com", "pw")["success"]
+    [row] = backend.server.tables["user_keys"]
+    user_key = row["encryption_salt"]
+    v2_blob = encrypt_password("older secret", user_key)
+
+    with patch("modules.auth._watch_auth_state"):
+        result = log_in("a@example.com", "pw")
+
+        # Assert: The stored parameters derive the login key
+        salt = base64.b64decode(user_key)
+        assert row["kdf_params"] == argon2id
+        assert result["user"]["encryption_key"] == utils.derive_key(
+            "pw", salt, argon2id
+        )
+
+        # They derive the vault key of v3 blobs; v2 blobs still decrypt
+        assert v2_blob.startswith(VERSION_PREFIX)
+        tuned = encrypt_password("secret", user_key)
+        assert tuned.startswith(utils.TUNED_VERSION_PREFIX)
+        assert decrypt_password(tuned, user_key) == "secret"
+        assert decrypt_password(v2_blob, user_key) == "older secret"
+        assert utils.get_cache_key(current_session.user_id) == HKDF(
+            algorithm=hashes.SHA256(),
+            length=utils.KEY_SIZE,
+            salt=None,
+            info=utils.CACHE_KEY_INFO,
+        ).derive(utils.get_vault_key(user_key, argon2id))
+
+        # A persisted login loads them along with the salt
+        user_id = current_session.user_id
+        current_session.clear()
+        assert isinstance(decrypt_password(tuned, user_key), dict)
+        assert utils.get_user_key(user_id) == user_key
+        assert current_session.kdf_params == argon2id
+        assert decrypt_password(tuned, user_key) == "secret"
+
+        # Users signed up before kdf_params existed keep PBKDF2 and v2
+        row["kdf_params"] = None
+        result = log_in("a@example.com", "pw")
+        assert result["user"]["encryption_key"] == utils.derive_key("pw", salt)
+        assert encrypt_password("secret", user_key).startswith(VERSION_PREFIX)
+
+
+def test_migrate_vault_pages_legacy_rows_and_remembers_completion(backend, user):
+    from modules.fake_backend import fake_access_token
+
+    user_id, user_key = user
+    backend.server.load(
+        "passwords",
+        [
+            {
+                "id": index,
+                "user_id": user_id,
+                "service_name": f"service-{index}",
+                "username": "alice",
+                "encrypted_password": (
+                    _encrypt_legacy(f"secret-{index}", user_key)
+                    if index % 2
+                    else encrypt_password(f"secret-{index}", user_key)
+                ),
+            }
+            for index in range(1, 8)
+        ],
+    )
+    progress = []
+
+    # Act: Migrate two rows per page
+    result = utils.migrate_vault(progress.append, page_size=2)
+
+    # Assert: Only the four legacy rows were read and rewritten
+    assert result == "Migrated 4 of 4 legacy passwords."
+    assert progress == [1, 2, 3, 4]
+    rows = backend.server.tables["passwords"]
+    assert all(row["encrypted_password"].startswith(VERSION_PREFIX) for row in rows)
+    assert [decrypt_password(row["encrypted_password"], user_key) for row in rows] == [
+        f"secret-{index}" for index in range(1, 8)
+    ]
+
+    # A finished migration is remembered and costs no further requests
+    backend.network.reset()
+    assert utils.migrate_vault() == "Vault already migrated."
+    assert backend.requests == 0
+
+    # Users with stored KDF parameters move on to v3
+    kdf_params = utils.MIN_KDF_PARAMS[utils.PBKDF2]
+    current_session.start(user_id, "a@example.com", user_key, kdf_params=kdf_params)
+    current_session.set_identity(fake_access_token(user_id))
+    assert utils.migrate_vault() == "Migrated 7 of 7 legacy passwords."
+    assert all(
+        row["encrypted_password"].startswith(utils.TUNED_VERSION_PREFIX)
+        for row in rows
+    )
+    assert [decrypt_password(row["encrypted_password"], user_key) for row in rows] == [
+        f"secret-{index}" for index in range(1, 8)
+    ]
+    assert utils.migrate_vault() == "Vault already migrated."